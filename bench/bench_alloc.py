@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Compares the memory & speed of signing 10k requests with oauth.OAuth1.init_request() (single pass
+serializer, precomputed Authorization header, SignedRequest) against the original dict copying version
+
+    python bench/bench_alloc.py [--number N]
+
+Python 2 has no tracemalloc (or allocation counters outside of debug builds) so memory is measured as:
+    retained = sys.getsizeof() of everything a signed request holds on to (strings included)
+    maxrss = The growth of the peak resident set while holding every signed request (each implementation
+             runs in its own process)
+The intermediate dicts & lists that are no longer built are freed right away... they show up in ops/sec.
+"""
+
+import os
+import gc
+import sys
+import json
+import base64
+import resource
+import argparse
+import subprocess
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+import oauth
+
+
+# The original implementation (without multipart)... kept here as the baseline
+def legacy_init_request(signer_oauth, method, url, query_vars=None, post_vars=None, headers=None):
+    method = method.upper()
+    signer, enc_auth_params = signer_oauth._get_signing_state()[:2]
+
+    enc_auth_header_params = dict(enc_auth_params)
+    enc_auth_header_params['oauth_nonce'] = oauth.percent_encode(signer_oauth.nonce_source.token(42))
+    enc_auth_header_params['oauth_timestamp'] = str(int(signer_oauth.clock()))
+
+    enc_query_vars = oauth.percent_encode_dict(query_vars)
+    enc_post_vars = oauth.percent_encode_dict(post_vars)
+
+    auth_signature_params = {}
+    auth_signature_params.update(enc_query_vars)
+    auth_signature_params.update(enc_post_vars)
+    auth_signature_params.update(enc_auth_header_params)
+
+    signature_str = '&'.join([
+        method,
+        oauth.percent_encode(url),
+        oauth.percent_encode(
+            '&'.join([name + '=' + auth_signature_params[name] for name in sorted(auth_signature_params.keys())])
+        )
+    ]).encode('utf-8')
+
+    signer = signer.copy()
+    signer.update(signature_str)
+    enc_auth_header_params['oauth_signature'] = oauth.percent_encode(base64.b64encode(signer.digest()))
+
+    auth_header = ', '.join(['{:}="{:}"'.format(name, enc_auth_header_params[name])
+                             for name in sorted(enc_auth_header_params.keys())])
+    if headers is None:
+        headers = {}
+    headers['Authorization'] = 'OAuth ' + auth_header
+
+    if query_vars:
+        url += '?' + '&'.join([name + '=' + val for name, val in enc_query_vars.iteritems()])
+    payload = '&'.join([name + '=' + val for name, val in enc_post_vars.iteritems()]) if post_vars else None
+    return method, url, payload, headers
+
+
+UPDATE_URL = 'https://api.twitter.com/1.1/statuses/update.json'
+UPDATE_VARS = {
+    'status': 'Just listed: vintage road bike, great shape! $250 obo http://sooshi.com/a/1234 #bikes @sooshicom',
+    'in_reply_to_status_id': '463440424141459456',
+    'lat': '28.669997',
+    'long': '-81.208120',
+    'display_coordinates': 'true',
+}
+SEARCH_URL = 'https://api.twitter.com/1.1/search/tweets.json'
+SEARCH_VARS = {'q': '"road bike" OR fixie -filter:retweets', 'count': 100, 'result_type': 'recent',
+               'since_id': '463440424141459456'}
+
+
+def make_oauth():
+    return oauth.OAuth1('xvz1evFS4wEEPTGEFPHBog', 'kAcSOqF21Fu85e7zjz7ZN2U4ZRhfV3WpwPAoE3Z7kBw',
+                        '370773112-GmHxMAgYyLbNEtIKZeRNFsMKPR9EyMZeS9weJAEb',
+                        'LswwdoUaIvS8ltyTt5jkRh4J50vUPVVHtR2YPi5kE',
+                        nonce_source=oauth.FixedNonce('kYjzVBB8Y0ZFabxSWbWovY3uYSQ2pTgmZeNu2VS4cg'),
+                        clock=lambda: 1318622958)
+
+
+def signers(signer_oauth):
+    """ name -> (the original, the current) functions signing the alternating update/search requests """
+    def legacy(n):
+        if n % 2:
+            return legacy_init_request(signer_oauth, 'GET', SEARCH_URL, query_vars=SEARCH_VARS)
+        return legacy_init_request(signer_oauth, 'POST', UPDATE_URL, post_vars=UPDATE_VARS)
+
+    def current(n):
+        if n % 2:
+            return signer_oauth.init_request('GET', SEARCH_URL, query_vars=SEARCH_VARS)
+        return signer_oauth.init_request('POST', UPDATE_URL, post_vars=UPDATE_VARS)
+
+    return {'legacy': legacy, 'current': current}
+
+
+def retained_size(signed):
+    """ The bytes a signed request holds on to... the strings it shares with the caller's vars aren't counted """
+    method, url, payload, headers = signed
+    size = sys.getsizeof(signed) + sys.getsizeof(headers)
+    for val in (url, payload) + tuple(headers.itervalues()):
+        if val is not None:
+            size += sys.getsizeof(val)
+    return size
+
+
+def maxrss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on linux
+
+
+def run(name, number):
+    """ Signs number requests with the named implementation & holds on to them... returns the measurements """
+    sign = signers(make_oauth())[name]
+    sign(0)  # warm up (builds the signing state)
+    gc.collect()
+    rss = maxrss_kb()
+
+    start = timer()
+    signed = [sign(n) for n in xrange(number)]
+    elapsed = timer() - start
+
+    return {
+        'ops_per_sec': number / elapsed,
+        'retained': sum(retained_size(request) for request in signed) / float(number),
+        'maxrss_kb': maxrss_kb() - rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=10000)
+    parser.add_argument('--run', choices=('legacy', 'current'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print json.dumps(run(args.run, args.number))
+        return
+
+    # Sanity check... both implementations must sign identically
+    functions = signers(make_oauth())
+    for n in (0, 1):
+        legacy, current = functions['legacy'](n), functions['current'](n)
+        assert legacy[0] == current[0] and legacy[2] == current[2] and legacy[3] == current[3]
+        assert sorted(legacy[1].split('&')) == sorted(current[1].split('&'))
+
+    results = {}
+    for name in ('legacy', 'current'):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--run', name,
+                                          '--number', str(args.number)])
+        results[name] = json.loads(output)
+
+    print '{:,d} signed requests (alternating statuses/update & search/tweets)'.format(args.number)
+    print '{:<10} {:>12} {:>18} {:>14}'.format('', 'ops/sec', 'retained B/req', 'maxrss KB')
+    for name in ('legacy', 'current'):
+        result = results[name]
+        print '{:<10} {:>12.0f} {:>18.1f} {:>14d}'.format(
+            name, result['ops_per_sec'], result['retained'], result['maxrss_kb'])
+    legacy, current = results['legacy'], results['current']
+    print '{:<10} {:>11.2f}x {:>17.1f}% {:>13.1f}%'.format(
+        'change', current['ops_per_sec'] / legacy['ops_per_sec'],
+        (current['retained'] / legacy['retained'] - 1) * 100,
+        (float(current['maxrss_kb']) / max(legacy['maxrss_kb'], 1) - 1) * 100)
+
+
+if __name__ == '__main__':
+    main()
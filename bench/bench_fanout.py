@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Measures Tweets.show() throughput against a local stub endpoint (with simulated latency):
+    sequential blocking calls vs Fanout with various in-flight limits (async='rpc' & async='ndb' when available)
+
+    python bench/bench_fanout.py [--requests N] [--latency SECONDS]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from fanout import Fanout
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+
+
+TWEET = '{"id_str": "463440424141459456", "text": "Just listed: vintage road bike", "user": {"id_str": "12"}}'
+
+
+def run(label, func, count):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print '{:<36} {:>10.0f} req/sec'.format(label, count / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    def show(request):
+        time.sleep(args.latency)
+        return 200, TWEET, {'Content-Type': 'application/json'}
+
+    server = StubServer().start()
+    server.add_response('GET', '/1.1/statuses/show.json', body=show)
+
+    ids = [str(i) for i in xrange(args.requests)]
+    tweets = Tweets('key', 'secret', 'token', 'token_secret',
+                    transport=PooledHttpTransport(max_per_host=100, max_workers=100))
+    tweets.api_base_url = server.url + '/1.1/'
+
+    def sequential():
+        for tweet_id in ids[:args.requests // 10]:
+            tweets.show(tweet_id)
+
+    run('sequential (blocking)', sequential, args.requests // 10)
+
+    for limit in (10, 50, 100):
+        def fanned_out():
+            for response in Fanout(max_in_flight=limit).map(tweets.show, ids):
+                assert response.status_code == 200
+        run('Fanout rpc max_in_flight={:d}'.format(limit), fanned_out, args.requests)
+
+    try:
+        from google.appengine.ext import ndb
+    except ImportError:
+        print 'ndb not available... skipped the async=\'ndb\' comparison'
+    else:
+        gae_tweets = Tweets('key', 'secret', 'token', 'token_secret')
+        gae_tweets.api_base_url = tweets.api_base_url
+
+        def ndb_futures():
+            for future in [gae_tweets.show(tweet_id, async='ndb') for tweet_id in ids]:
+                future.get_result()
+        run('ndb futures (unbounded)', ndb_futures, args.requests)
+
+        def ndb_fanout():
+            for response in Fanout(max_in_flight=50, async='ndb').map(gae_tweets.show, ids):
+                assert response.status_code == 200
+        run('Fanout ndb max_in_flight=50', ndb_fanout, args.requests)
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+The cold start cost of importing the package & its modules... each import is timed in a fresh interpreter
+(number times) and the modules it loaded are counted. The heavy ones that should only be imported on first
+use (httplib, ssl, App Engine's urlfetch & ndb) are listed when an import pulled them in.
+
+    python bench/bench_import.py [--number N] [--record FILE] [--compare FILE]
+
+Runs are recorded & compared like bench_suite.py's
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PY_DIR = os.path.normpath(os.path.join(BENCH_DIR, '..', 'py'))
+
+from bench_suite import git_commit, last_run
+
+
+# name -> the statement timed
+IMPORTS = [
+    ('package', 'import twittergae'),
+    ('oauth', 'from twittergae import oauth'),
+    ('OAuth1', 'from twittergae import OAuth1'),
+    ('twitterapi', 'from twittergae import twitterapi'),
+    ('Tweets', 'from twittergae import Tweets'),
+    ('transports', 'from twittergae import transports'),
+    ('publish', 'from twittergae import publish'),
+    ('everything', 'from twittergae import *'),
+]
+
+HEAVY = ('httplib', 'ssl', 'google.appengine.api.urlfetch', 'google.appengine.ext.ndb')
+
+# Run in the fresh interpreter... prints the seconds taken, the modules loaded & the heavy ones among them
+TIMER = '''
+import sys, time, json
+before = set(sys.modules)
+start = time.time()
+{statement}
+elapsed = time.time() - start
+loaded = [name for name in set(sys.modules) - before if sys.modules.get(name) is not None]
+print json.dumps([elapsed, len(loaded), [name for name in {heavy!r} if name in loaded]])
+'''
+
+
+def time_import(statement, number, path):
+    """
+    Returns {'p50': ..., 'p90': ... (ms), 'modules': ..., 'heavy': [...]} for number fresh imports
+    (None if the statement fails e.g. a name an older commit doesn't export)
+    """
+    code = TIMER.format(statement=statement, heavy=HEAVY)
+    env = dict(os.environ, PYTHONPATH=path)
+    times = []
+    for _ in xrange(number):
+        child = subprocess.Popen([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+        output = child.communicate()[0]
+        if child.returncode:
+            return None
+        elapsed, modules, heavy = json.loads(output)
+        times.append(elapsed)
+    times.sort()
+    return {
+        'p50': times[len(times) // 2] * 1000,
+        'p90': times[min(int(len(times) * 0.9), len(times) - 1)] * 1000,
+        'modules': modules,
+        'heavy': heavy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20)
+    parser.add_argument('--record', metavar='FILE', help='append the results to FILE (json lines)')
+    parser.add_argument('--compare', metavar='FILE', help='compare with the last run recorded in FILE')
+    args = parser.parse_args()
+
+    baseline = last_run(args.compare) if args.compare else None
+    if baseline is not None:
+        print 'comparing with {:} ({:})'.format(baseline.get('commit'), baseline.get('date'))
+
+    # The package is imported as twittergae (like an app vendoring it)... the .pyc files are compiled first
+    # so every run times a warm disk cache & compiled modules like an instance start would
+    path = tempfile.mkdtemp()
+    results = {}
+    try:
+        os.symlink(PY_DIR, os.path.join(path, 'twittergae'))
+        subprocess.check_call([sys.executable, '-m', 'compileall', '-q', PY_DIR])
+        for name, statement in IMPORTS:
+            result = time_import(statement, max(args.number, 1), path)
+            if result is None:
+                print '{:<12} fails'.format(name)
+                continue
+            results[name] = result
+            line = '{:<12} p50={:>7.2f}ms p90={:>7.2f}ms {:>4d} modules'.format(
+                name, result['p50'], result['p90'], result['modules'])
+            before = (baseline or {}).get('results', {}).get(name)
+            if before:
+                line += '   {:+.1f}%'.format((result['p50'] / before['p50'] - 1) * 100)
+            if result['heavy']:
+                line += '   loads ' + ', '.join(result['heavy'])
+            print line
+    finally:
+        shutil.rmtree(path)
+
+    if args.record:
+        with open(args.record, 'a') as f:
+            f.write(json.dumps({
+                'commit': git_commit(),
+                'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'number': args.number,
+                'results': results,
+            }, sort_keys=True) + '\n')
+        print 'recorded in {:}'.format(args.record)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Compares response decoding strategies on canned search/tweets (100 tweets) and statuses/update payloads:
+    eager json.loads (the old twitter_response), lazy twitter_response, field projection & the fastest decoder
+
+    python bench/bench_json.py [--number N]
+"""
+
+import os
+import sys
+import json
+import functools
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+import fixtures
+import twitterapi
+from transports import HttpResponse
+
+
+def bench(label, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=3))
+    print '{:<44} {:>10.0f} ops/sec'.format(label, number / best)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    payloads = [
+        ('search (100 tweets)', fixtures.search_tweets(100), lambda twitter: twitter['statuses'][0]['id_str']),
+        ('update (1 tweet)', fixtures.show(), lambda twitter: twitter['id_str']),
+    ]
+
+    twitterapi.set_json_decoder(None)
+    print 'fastest decoder available: {:}'.format(twitterapi._json_loads.__module__)
+
+    for name, content, read in payloads:
+        # A new response each time... twitter_response() keeps the decoded 'twitter' on the response it's given
+        response = functools.partial(HttpResponse, 200, content, {})
+        number = args.number if len(content) > 10000 else args.number * 50
+        print '{:} - {:d} bytes'.format(name, len(content))
+
+        bench('eager json.loads', lambda: read(json.loads(content)), number)
+        bench('lazy twitter_response (never read)', lambda: twitterapi.twitter_response(response()), number)
+
+        twitterapi.set_json_decoder(json.loads)
+        bench('lazy twitter_response (read, json)', lambda: read(twitterapi.twitter_response(response()).twitter),
+              number)
+        twitterapi.set_json_decoder(None)
+        bench('lazy twitter_response (read, fastest)', lambda: read(twitterapi.twitter_response(response()).twitter),
+              number)
+
+        fields = ('id_str', 'user.id_str', 'text')
+        bench('projection {:}'.format(','.join(fields)),
+              lambda: read(twitterapi.twitter_response(response(), fields=fields).twitter), number)
+
+
+if __name__ == '__main__':
+    main()
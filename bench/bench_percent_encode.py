@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Compares the table driven oauth.percent_encode() & percent_encode_dict()
+against the original per-byte lambda implementation on tweet-like payloads
+
+    python bench/bench_percent_encode.py [--number N]
+"""
+
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+import oauth
+
+
+# The original implementation... kept here as the baseline
+_legacy_dont_percent_encode = dict.fromkeys(bytearray(oauth.ASCII_DIGITS + '-._~'), True)
+
+def legacy_percent_encode(utf8_str):
+    if not utf8_str:
+        return utf8_str
+    byte_str = bytearray(utf8_str, 'utf-8')
+    return ''.join(map(lambda x: chr(x) if x in _legacy_dont_percent_encode else '%{:02X}'.format(x), byte_str))
+
+
+def legacy_percent_encode_dict(idict):
+    if not idict:
+        return {}
+    return { legacy_percent_encode(name): legacy_percent_encode(str(val)) for name, val in idict.iteritems() }
+
+
+# Realistic request params... what Tweets.update() & Tweets.search() end up signing
+PAYLOADS = {
+    'update': {
+        'status': 'Just listed: vintage road bike, great shape! $250 obo http://sooshi.com/a/1234 #bikes @sooshicom',
+        'in_reply_to_status_id': '463440424141459456',
+        'lat': '28.669997',
+        'long': '-81.208120',
+        'display_coordinates': 'true',
+        'trim_user': 'true',
+    },
+    'search': {
+        'q': '"road bike" OR fixie -filter:retweets near:Orlando',
+        'result_type': 'recent',
+        'count': 100,
+        'since_id': '463440424141459456',
+        'include_entities': 'false',
+    },
+    'oauth': {
+        'oauth_consumer_key': 'xvz1evFS4wEEPTGEFPHBog',
+        'oauth_nonce': 'kYjzVBB8Y0ZFabxSWbWovY3uYSQ2pTgmZeNu2VS4cg',
+        'oauth_signature_method': 'HMAC-SHA1',
+        'oauth_timestamp': '1318622958',
+        'oauth_token': '370773112-GmHxMAgYyLbNEtIKZeRNFsMKPR9EyMZeS9weJAEb',
+        'oauth_version': '1.0',
+    },
+}
+
+URLS = [
+    'https://api.twitter.com/1.1/statuses/update.json',
+    'https://api.twitter.com/1.1/search/tweets.json',
+]
+
+
+def bench(label, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=3))
+    print '{:<40} {:>10.0f} ops/sec'.format(label, number / best)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    # Sanity check... both implementations must agree
+    for params in PAYLOADS.itervalues():
+        assert legacy_percent_encode_dict(params) == oauth.percent_encode_dict(params)
+    for url in URLS:
+        assert legacy_percent_encode(url) == oauth.percent_encode(url)
+
+    for name, params in sorted(PAYLOADS.iteritems()):
+        old = bench('legacy percent_encode_dict({:})'.format(name),
+                    lambda: legacy_percent_encode_dict(params), args.number)
+        new = bench('percent_encode_dict({:})'.format(name),
+                    lambda: oauth.percent_encode_dict(params), args.number)
+        print '{:<40} {:>10.1f}x'.format('speedup', old / new)
+
+    for url in URLS:
+        old = bench('legacy percent_encode(url)', lambda: legacy_percent_encode(url), args.number)
+        new = bench('percent_encode(url)', lambda: oauth.percent_encode(url), args.number)
+        print '{:<40} {:>10.1f}x'.format('speedup', old / new)
+
+
+if __name__ == '__main__':
+    main()
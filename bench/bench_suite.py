@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+The offline benchmark suite... ops/sec & latency percentiles for the hot paths without api.twitter.com:
+    sign = OAuth1.init_request() of a statuses/update
+    preflight = Preflight().problems() of the same statuses/update
+    preflight.jobs = Preflight().check_jobs() of 1000 queued tweets (CJK text & a URL each)
+    sign.search / sign.prepared = A polling search/tweets signed from scratch vs with OAuth1.prepare()
+    multipart = OAuth1.init_request() of an update_with_media with a 100KB photo
+    decode = twitter_response(...).twitter of a 100 tweet search/tweets response
+    replay = Tweets.show() round trips through a stubbed urlfetch (no network) in each async mode
+    mock = Tweets.show() round trips over HTTP to a local mock twitter endpoint in each async mode
+
+async='ndb' (and urlfetch itself) needs the App Engine SDK on the path... those runs are skipped without it.
+Results can be appended to a file (one json line per run, tagged with the git commit) and compared:
+
+    python bench/bench_suite.py [--number N] [--only NAME...] [--record FILE] [--compare FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from timeit import default_timer as timer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'py'))
+
+import fixtures
+from oauth import OAuth1
+from preflight import Preflight
+from stubserver import StubServer
+from transports import HttpResponse, PooledHttpTransport
+from twitterapi import twitter_response
+from tweets import Tweets
+
+
+def measure(func, number):
+    """ Times number calls of func... returns {'ops_per_sec': ..., 'p50': ..., 'p90': ..., 'p99': ...} (ms) """
+    func()  # warm up
+    latencies = []
+    start = timer()
+    for _ in xrange(number):
+        op_start = timer()
+        func()
+        latencies.append(timer() - op_start)
+    elapsed = timer() - start
+    latencies.sort()
+
+    def percentile(percent):
+        return latencies[min(int(len(latencies) * percent / 100.0), len(latencies) - 1)] * 1000
+
+    return {
+        'ops_per_sec': number / elapsed,
+        'p50': percentile(50),
+        'p90': percentile(90),
+        'p99': percentile(99),
+    }
+
+
+def ndb_available():
+    try:
+        from google.appengine.ext import ndb
+    except ImportError:
+        return False
+    return True
+
+
+def activate_testbed():
+    """ Stubs the App Engine services ndb & urlfetch need (the SDK's urlfetch stub really fetches) """
+    from google.appengine.ext import testbed
+
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.init_datastore_v3_stub()
+    bed.init_memcache_stub()
+    bed.init_urlfetch_stub()
+    return bed
+
+
+def benchmarks(server_url, number):
+    """ Yields (name, func, number) """
+    signer = OAuth1('xvz1evFS4wEEPTGEFPHBog', 'kAcSOqF21Fu85e7zjz7ZN2U4ZRhfV3WpwPAoE3Z7kBw',
+                    '370773112-GmHxMAgYyLbNEtIKZeRNFsMKPR9EyMZeS9weJAEb', 'LswwdoUaIvS8ltyTt5jkRh4J50vUPVVHtR2YPi5kE')
+    update_vars = {
+        'status': 'Just listed: vintage road bike, great shape! $250 obo http://sooshi.com/a/1234 #bikes @sooshicom',
+        'in_reply_to_status_id': '463440424141459456',
+        'lat': '28.669997',
+        'long': '-81.208120',
+        'display_coordinates': 'true',
+    }
+    update_url = 'https://api.twitter.com/1.1/statuses/update.json'
+    yield 'sign', lambda: signer.init_request('POST', update_url, post_vars=update_vars), number
+
+    preflight = Preflight()
+    yield 'preflight', lambda: preflight.problems(update_vars), number
+    jobs = [{'status': u'\u3053\u3093\u306b\u3061\u306f #{:} http://sooshi.com/a/{:}'.format(i, i)}
+            for i in xrange(1000)]
+    yield 'preflight.jobs', lambda: preflight.check_jobs(jobs), number // 100
+
+    search_url = 'https://api.twitter.com/1.1/search/tweets.json'
+    search_vars = {'q': '"road bike" OR fixie -filter:retweets', 'count': 100, 'result_type': 'recent'}
+    since = {'since_id': '463440424141459456'}
+    yield 'sign.search', lambda: signer.init_request('GET', search_url, query_vars=dict(search_vars, **since)), number
+    prepared = signer.prepare('GET', search_url, query_vars=search_vars)
+    yield 'sign.prepared', lambda: prepared.sign(query_vars=since), number
+
+    media_vars = dict(update_vars, **{'media[]': {'data': os.urandom(100 * 1024), 'mimetype': 'image/jpeg'}})
+    media_url = 'https://api.twitter.com/1.1/statuses/update_with_media.json'
+    yield ('multipart', lambda: signer.init_request('POST', media_url, post_vars=media_vars, multipart=True),
+           number // 10)
+
+    search = fixtures.search_tweets(100)
+    # A fresh response each call... twitter_response() keeps the decode on the response it's given
+    yield 'decode', lambda: twitter_response(HttpResponse(200, search, {})).twitter['statuses'], number // 10
+
+    modes = [('sync', None), ('rpc', 'rpc')]
+    if ndb_available():
+        modes.append(('ndb', 'ndb'))
+
+    replay = Tweets('key', 'secret', 'token', 'token_secret', transport=fixtures.ReplayTransport())
+    for mode, async in modes:
+        yield 'replay.' + mode, round_trip(replay, async), number
+
+    mock = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport())
+    mock.api_base_url = server_url + '/1.1/'
+    for mode, async in modes:
+        if async == 'ndb':
+            # ndb needs urlfetch... through the SDK's urlfetch stub
+            mock = Tweets('key', 'secret', 'token', 'token_secret')
+            mock.api_base_url = server_url + '/1.1/'
+        yield 'mock.' + mode, round_trip(mock, async), number // 10
+
+
+def round_trip(tweets, async):
+    """ A Tweets.show() that waits for & decodes its response in the given async mode """
+    def show():
+        if async is None:
+            response = tweets.show('463440424141459456')
+        else:
+            response = twitter_response(tweets.show('463440424141459456', async=async).get_result())
+        assert response.twitter['id_str']
+    return show
+
+
+def git_commit():
+    """ The checked out commit (with a '+' if there are uncommitted changes)... None outside of git """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR).strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BENCH_DIR)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('+' if dirty.strip() else '')
+
+
+def last_run(path):
+    """ The last run recorded in path (None if there isn't one) """
+    run = None
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    run = json.loads(line)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='only run benchmarks starting with NAME')
+    parser.add_argument('--record', metavar='FILE', help='append the results to FILE (json lines)')
+    parser.add_argument('--compare', metavar='FILE', help='compare with the last run recorded in FILE')
+    args = parser.parse_args()
+
+    baseline = last_run(args.compare) if args.compare else None
+    if baseline is not None:
+        print 'comparing with {:} ({:})'.format(baseline.get('commit'), baseline.get('date'))
+
+    testbed = activate_testbed() if ndb_available() else None
+    if testbed is None:
+        print 'App Engine SDK not available... skipped the async=\'ndb\' runs'
+
+    server = fixtures.mock_twitter(StubServer().start())
+    results = {}
+    try:
+        for name, func, number in benchmarks(server.url, args.number):
+            if args.only and not any(name.startswith(only) for only in args.only):
+                continue
+            result = results[name] = measure(func, max(number, 1))
+            line = '{:<16} {:>10.0f} ops/sec   p50={:.3f}ms p90={:.3f}ms p99={:.3f}ms'.format(
+                name, result['ops_per_sec'], result['p50'], result['p90'], result['p99'])
+            before = (baseline or {}).get('results', {}).get(name)
+            if before:
+                line += '   {:+.1f}%'.format((result['ops_per_sec'] / before['ops_per_sec'] - 1) * 100)
+            print line
+    finally:
+        server.stop()
+        if testbed is not None:
+            testbed.deactivate()
+
+    if args.record:
+        with open(args.record, 'a') as f:
+            f.write(json.dumps({
+                'commit': git_commit(),
+                'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'number': args.number,
+                'results': results,
+            }, sort_keys=True) + '\n')
+        print 'recorded in {:}'.format(args.record)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Canned twitter v1.1 payloads (shaped like recorded responses) for the benchmarks & the mock endpoint
+"""
+
+import json
+
+from ratelimit import endpoint_resource
+from transports import HttpResponse, HttpRpc, ResponseHeaders
+
+
+def user(n):
+    return {
+        'id': 1000 + n,
+        'id_str': str(1000 + n),
+        'name': 'Sooshi Seller {:d}'.format(n),
+        'screen_name': 'seller{:d}'.format(n),
+        'location': 'Orlando, FL',
+        'description': 'Buying & selling locally since 2014. Bikes, boards and anything with wheels.',
+        'url': 'http://t.co/abc{:d}'.format(n),
+        'entities': {
+            'url': {'urls': [{'url': 'http://t.co/abc{:d}'.format(n), 'expanded_url': 'http://www.sooshi.com',
+                              'display_url': 'sooshi.com', 'indices': [0, 22]}]},
+            'description': {'urls': []},
+        },
+        'protected': False,
+        'followers_count': 1200 + n,
+        'friends_count': 300,
+        'listed_count': 12,
+        'created_at': 'Wed Apr 02 17:03:52 +0000 2014',
+        'favourites_count': 40,
+        'utc_offset': -14400,
+        'time_zone': 'Eastern Time (US & Canada)',
+        'geo_enabled': True,
+        'verified': False,
+        'statuses_count': 5120,
+        'lang': 'en',
+        'profile_background_color': 'C0DEED',
+        'profile_image_url': 'http://pbs.twimg.com/profile_images/{:d}/a_normal.png'.format(n),
+        'profile_image_url_https': 'https://pbs.twimg.com/profile_images/{:d}/a_normal.png'.format(n),
+        'default_profile': False,
+        'following': None,
+        'follow_request_sent': None,
+        'notifications': None,
+    }
+
+
+def tweet(n, reply_to=None):
+    tweet_id = 463440424141459456 + n
+    return {
+        'created_at': 'Mon May 05 21:17:04 +0000 2014',
+        'id': tweet_id,
+        'id_str': str(tweet_id),
+        'text': u'Just listed: vintage road bike #{:d}, great shape! $250 obo http://t.co/xyz{:d} #bikes @sooshicom \u2605'
+                .format(n, n),
+        'source': '<a href="http://www.sooshi.com" rel="nofollow">Sooshi</a>',
+        'truncated': False,
+        'in_reply_to_status_id': reply_to,
+        'in_reply_to_status_id_str': str(reply_to) if reply_to else None,
+        'in_reply_to_user_id': None,
+        'in_reply_to_user_id_str': None,
+        'in_reply_to_screen_name': None,
+        'user': user(n % 20),
+        'geo': {'type': 'Point', 'coordinates': [28.669997, -81.20812]},
+        'coordinates': {'type': 'Point', 'coordinates': [-81.20812, 28.669997]},
+        'place': None,
+        'contributors': None,
+        'retweet_count': n % 7,
+        'favorite_count': n % 11,
+        'entities': {
+            'hashtags': [{'text': 'bikes', 'indices': [78, 84]}],
+            'symbols': [],
+            'urls': [{'url': 'http://t.co/xyz{:d}'.format(n), 'expanded_url': 'https://www.sooshi.com/a/{:d}'.format(n),
+                      'display_url': 'sooshi.com/a/{:d}'.format(n), 'indices': [55, 77]}],
+            'user_mentions': [{'screen_name': 'sooshicom', 'name': 'Sooshi', 'id': 2432417010,
+                               'id_str': '2432417010', 'indices': [85, 95]}],
+        },
+        'favorited': False,
+        'retweeted': False,
+        'possibly_sensitive': False,
+        'lang': 'en',
+        'metadata': {'iso_language_code': 'en', 'result_type': 'recent'},
+    }
+
+
+def search_tweets(count=100, start=0):
+    """ A search/tweets response body """
+    statuses = [tweet(start + n) for n in xrange(count)]
+    return json.dumps({
+        'statuses': statuses,
+        'search_metadata': {
+            'completed_in': 0.027,
+            'max_id': statuses[0]['id'] if statuses else 0,
+            'max_id_str': statuses[0]['id_str'] if statuses else '0',
+            'query': 'bikes',
+            'refresh_url': '?since_id={:}&q=bikes&include_entities=1'.format(statuses[0]['id_str'] if statuses else 0),
+            'count': count,
+            'since_id': 0,
+            'since_id_str': '0',
+        },
+    })
+
+
+def lookup(ids, map=False):
+    """ A statuses/lookup response body """
+    tweets = dict((str(id), tweet(int(id) - 463440424141459456)) for id in ids)
+    if map:
+        return json.dumps({'id': tweets})
+    return json.dumps(tweets.values())
+
+
+def show(n=0):
+    """ A statuses/show (or statuses/update) response body """
+    return json.dumps(tweet(n))
+
+
+# Headers twitter sends with every rate limited response
+RATE_LIMIT_HEADERS = {
+    'Content-Type': 'application/json;charset=utf-8',
+    'x-rate-limit-limit': '180',
+    'x-rate-limit-remaining': '179',
+    'x-rate-limit-reset': '1399328000',
+}
+
+
+def mock_twitter(server):
+    """
+    Registers canned v1.1 responses (with rate limit headers) on a stubserver.StubServer:
+        statuses/show, statuses/lookup, search/tweets, statuses/update & statuses/update_with_media
+    """
+    def show_tweet(request):
+        return 200, show(int(request.query.get('id', 0)) % 1000), RATE_LIMIT_HEADERS
+
+    def lookup_tweets(request):
+        ids = [id for id in request.query.get('id', '').split(',') if id]
+        return 200, lookup(ids, map=request.query.get('map') == 'true'), RATE_LIMIT_HEADERS
+
+    server.add_response('GET', '/1.1/statuses/show.json', body=show_tweet)
+    server.add_response('GET', '/1.1/statuses/lookup.json', body=lookup_tweets)
+    server.add_response('GET', '/1.1/search/tweets.json', 200, search_tweets(100), RATE_LIMIT_HEADERS)
+    server.add_response('POST', '/1.1/statuses/update.json', 200, show(1), RATE_LIMIT_HEADERS)
+    server.add_response('POST', '/1.1/statuses/update_with_media.json', 200, show(2), RATE_LIMIT_HEADERS)
+    return server
+
+
+class ReplayTransport(object):
+    """
+    A transport that never touches the network... every request gets a canned response (a stubbed urlfetch)
+    Measures everything but the network: signing, body building, dispatch & decoding
+    """
+    streams = False
+
+    def __init__(self):
+        headers = ResponseHeaders((name.lower(), val) for name, val in RATE_LIMIT_HEADERS.iteritems())
+        self._responses = {
+            'statuses/show': HttpResponse(200, show(0), headers),
+            'search/tweets': HttpResponse(200, search_tweets(100), headers),
+            'statuses/update': HttpResponse(200, show(1), headers),
+            'statuses/update_with_media': HttpResponse(200, show(2), headers),
+        }
+
+    def send_request(self, method, url, payload=None, headers=None, **kwargs):
+        return self._responses[endpoint_resource(url)]
+
+    def send_request_async(self, method, url, payload=None, headers=None, **kwargs):
+        rpc = HttpRpc()
+        rpc._set_result(self.send_request(method, url, payload, headers))
+        return rpc
+
+    def send_request_ndb(self, method, url, payload=None, headers=None, **kwargs):
+        from google.appengine.ext import ndb
+
+        future = ndb.Future()
+        future.set_result(self.send_request(method, url, payload, headers))
+        return future
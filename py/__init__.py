@@ -6,3 +6,66 @@
 # MIT License
 # http://opensource.org/licenses/MIT
 #
+"""
+The public names of every module are available from the package itself
+
+    from twittergae import Tweets, OAuth1
+
+A module is only imported when one of its names is first used... importing the package costs next to
+nothing and code that only signs requests never imports the transports (httplib, ssl) or App Engine APIs
+"""
+
+import sys
+import types
+
+# name -> the module (its __all__) that defines it
+_EXPORTS = {}
+for _module, _names in (
+        ('batching', ('LookupFuture', 'LookupBatcher')),
+        ('cache', ('DEFAULT_TTLS', 'MemoryCache', 'FakeMemcache', 'ResponseCache')),
+        ('credentials', ('CredentialPool',)),
+        ('entities', ('Tweet', 'User', 'EntityStore')),
+        ('fanout', ('CancelledError', 'FanoutFuture', 'Fanout')),
+        ('instrument', ('Instrumentation', 'StatsRecorder')),
+        ('media', ('MediaUploadError', 'UploadState', 'MediaUploader')),
+        ('multipart', ('MultipartEncoder',)),
+        ('oauth', ('NonceSource', 'NoncePool', 'FixedNonce', 'random_token', 'percent_encode',
+                   'percent_encode_dict', 'SignedRequest', 'OAuth1', 'PreparedRequest')),
+        ('outbox', ('OutboxStore', 'SqliteStore', 'JournalStore', 'Outbox')),
+        ('pagination', ('iter_items', 'search_next_params', 'cursor_next_params')),
+        ('poller', ('SinceIdStore', 'MemoryStore', 'JsonFileStore', 'BackendStore', 'Poller')),
+        ('preflight', ('PreflightError', 'weighted_length', 'Preflight')),
+        ('publish', ('PublishJob', 'PublishResult', 'BulkPublisher')),
+        ('ratelimit', ('endpoint_resource', 'RateLimiter', 'RateLimitedRpc')),
+        ('streaming', ('FILTER_URL', 'USER_URL', 'StreamError', 'DelimitedParser', 'TwitterStream')),
+        ('transports', ('UrlfetchTransport', 'PooledHttpTransport', 'HttpResponse', 'HttpRpc', 'not_sent',
+                        'rpc_done', 'RpcWrapper', 'WorkerPool')),
+        ('tweets', ('Tweets',)),
+        ('twitterapi', ('TwitterError', 'TwitterResponse', 'set_json_decoder', 'json_decoder', 'tbool',
+                        'twitter_response', 'PreparedCall', 'TwitterApi')),
+):
+    for _name in _names:
+        _EXPORTS[_name] = _module
+del _module, _names, _name
+
+
+class _LazyPackage(types.ModuleType):
+    """ The package module... imports the module defining a name on its first use (no module __getattr__ in 2.7) """
+    def __getattr__(self, name):
+        module = _EXPORTS.get(name)
+        if module is None:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(self.__name__, name))
+        import importlib
+        val = getattr(importlib.import_module('.' + module, self.__name__), name)
+        setattr(self, name, val)  # found directly from now on
+        return val
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_EXPORTS))
+
+
+_package = _LazyPackage(__name__, __doc__)
+_package.__dict__.update(sys.modules[__name__].__dict__)
+_package.__all__ = sorted(_EXPORTS)
+_package._original = sys.modules[__name__]  # keeps this module's globals alive (python 2 clears them otherwise)
+sys.modules[__name__] = _package
@@ -0,0 +1,181 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Coalesces single tweet fetches into statuses/lookup calls (like a DataLoader)
+
+    batcher = LookupBatcher(tweets)
+    futures = [batcher.load(tweet_id) for tweet_id in tweet_ids]  # nothing sent yet
+    tweet = futures[0].get_result()  # sends statuses/lookup with up to 100 ids per request
+"""
+
+from collections import OrderedDict
+
+from twitterapi import TwitterError, twitter_response
+
+__all__ = [
+    'LookupFuture',
+    'LookupBatcher',
+]
+
+
+def _lookup_map(response):
+    """
+    Returns the {id_str: tweet or None} dict of a statuses/lookup map=true response
+    Raises TwitterError if the lookup failed
+    """
+    response = twitter_response(response)
+    if response.status_code != 200 or not isinstance(response.twitter, dict) or 'id' not in response.twitter:
+        raise TwitterError('statuses/lookup failed with status {:}'.format(response.status_code), response)
+    return response.twitter['id']
+
+
+class _Batch(object):
+    """
+    One statuses/lookup request and the futures waiting on it
+    """
+    def __init__(self, rpc, futures):
+        self.rpc = rpc
+        self.futures = futures  # [(id, LookupFuture)]
+
+    def resolve(self):
+        if self.rpc is None:
+            return
+        rpc, self.rpc = self.rpc, None
+        try:
+            tweets = _lookup_map(rpc.get_result())
+        except Exception as e:
+            for _, future in self.futures:
+                future._set(exception=e)
+        else:
+            for tweet_id, future in self.futures:
+                future._set(tweets.get(tweet_id))
+
+
+class LookupFuture(object):
+    """
+    The eventual tweet (a decoded dict... None if it doesn't exist or isn't visible) for one id
+    get_result() sends the queued batch if it hasn't been sent yet
+    """
+    def __init__(self, batcher):
+        self._batcher = batcher
+        self._batch = None
+        self._done = False
+        self._result = None
+        self._exception = None
+
+    def _set(self, result=None, exception=None):
+        self._result = result
+        self._exception = exception
+        self._done = True
+        self._batch = None
+
+    def done(self):
+        return self._done
+
+    def get_result(self):
+        if not self._done and self._batch is None:
+            self._batcher.dispatch()
+        if not self._done:  # dispatch() resolves it if the request couldn't be sent
+            self._batch.resolve()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class LookupBatcher(object):
+    """
+    Queues tweet ids from load() and fetches them with as few statuses/lookup (map=true) requests as possible
+
+    Initialization requires:
+        tweets = A Tweets instance
+
+    Optional:
+        max_batch = The most ids per statuses/lookup request (twitter's limit is 100)
+        async = 'rpc' (load() returns LookupFutures) or 'ndb' (load() returns ndb Futures)
+        include_entities, trim_user = Passed along to Tweets.lookup()
+
+    A batch is sent as soon as max_batch ids are queued and otherwise...
+        'rpc' = when the first of its futures' get_result() is called (or dispatch() is)
+        'ndb' = when the ndb event loop goes idle (every tasklet has queued its ids for this tick)
+
+    The same id loaded twice while queued shares one future
+    """
+    def __init__(self, tweets, max_batch=100, async='rpc', include_entities=None, trim_user=None):
+        self.tweets = tweets
+        self.max_batch = min(max_batch, 100)
+        self.async = async
+        self.include_entities = include_entities
+        self.trim_user = trim_user
+        self._queue = OrderedDict()  # id_str -> future
+        self._idle_scheduled = False
+
+    def load(self, id):
+        """ Queues a tweet id... returns the future of its tweet """
+        id = str(id)
+        future = self._queue.get(id)
+        if future is None:
+            if self.async == 'ndb':
+                from google.appengine.ext import ndb
+                future = ndb.Future()
+                if not self._idle_scheduled:
+                    self._idle_scheduled = True
+                    ndb.eventloop.add_idle(self._on_idle)
+            else:
+                future = LookupFuture(self)
+            self._queue[id] = future
+            if len(self._queue) >= self.max_batch:
+                self.dispatch()
+        return future
+
+    def load_many(self, ids):
+        """ Queues every id... returns a list of futures (in the same order) """
+        return [self.load(id) for id in ids]
+
+    def dispatch(self):
+        """ Sends every queued id now """
+        while self._queue:
+            batch = []
+            while self._queue and len(batch) < self.max_batch:
+                batch.append(self._queue.popitem(last=False))
+            self._send(batch)
+
+    def _on_idle(self):
+        self._idle_scheduled = False
+        self.dispatch()
+        return None  # run once
+
+    def _send(self, batch):
+        try:
+            rpc = self.tweets.lookup(','.join([id for id, _ in batch]),
+                                     include_entities=self.include_entities,
+                                     trim_user=self.trim_user,
+                                     map=True,
+                                     async='ndb' if self.async == 'ndb' else 'rpc')
+        except Exception as e:
+            # Nothing was sent (e.g. the rate limiter or transport raised)... every future in the batch gets it
+            for _, future in batch:
+                if self.async == 'ndb':
+                    future.set_exception(e)
+                else:
+                    future._set(exception=e)
+            return
+        if self.async == 'ndb':
+            rpc.add_callback(self._resolve_ndb, rpc, batch)
+        else:
+            pending = _Batch(rpc, batch)
+            for _, future in batch:
+                future._batch = pending
+
+    def _resolve_ndb(self, rpc, batch):
+        try:
+            tweets = _lookup_map(rpc.get_result())
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for tweet_id, future in batch:
+                future.set_result(tweets.get(tweet_id))
@@ -0,0 +1,429 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+An opt-in response cache for the idempotent (GET) twitter API endpoints
+
+    tweets = Tweets(..., response_cache=ResponseCache())  # in-process LRU
+    tweets = Tweets(..., response_cache=ResponseCache(backend=memcache))  # GAE memcache (or any memcache client)
+
+Entries are keyed on the method, url, sorted query_vars & access token and expire after a per-endpoint TTL.
+POSTs (update, retweet, destroy...) invalidate the entries they affect.
+"""
+
+import cPickle as pickle
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from oauth import percent_encode_dict
+from ratelimit import endpoint_resource
+from transports import HttpResponse, ResponseHeaders, RpcWrapper
+
+__all__ = [
+    'DEFAULT_TTLS',
+    'MemoryCache',
+    'FakeMemcache',
+    'ResponseCache',
+]
+
+
+# Seconds each endpoint's responses are cached for... endpoints that aren't listed aren't cached
+DEFAULT_TTLS = {
+    'statuses/show': 60,
+    'statuses/lookup': 60,
+    'statuses/retweets/:id': 30,
+    'statuses/retweeters/ids': 30,
+    'search/tweets': 15,
+}
+
+
+class MemoryCache(object):
+    """
+    An in-process LRU cache with memcache's interface (get, set, delete, incr, get_multi)
+
+    Optional:
+        max_bytes = The most bytes of values kept (least recently used entries are evicted first)
+        clock = A time.time replacement (for tests)
+
+    Values are stored as is... their size is len() for a str or the 'size' passed to set()
+    """
+    def __init__(self, max_bytes=8 << 20, clock=None):
+        self.max_bytes = max_bytes
+        self.clock = clock or time.time
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (expires, value, size)
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] and entry[0] <= now:
+            self._delete(key)
+            return None
+        # Most recently used goes to the end
+        del self._entries[key]
+        self._entries[key] = entry
+        return entry[1]
+
+    def _delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key, self.clock())
+
+    def get_multi(self, keys):
+        now = self.clock()
+        with self._lock:
+            values = ((key, self._get(key, now)) for key in keys)
+            return dict((key, val) for key, val in values if val is not None)
+
+    def set(self, key, value, time=0, size=None):
+        """ Caches value for "time" seconds (0 = until evicted) """
+        if size is None:
+            size = len(value) if isinstance(value, str) else 64
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            self._delete(key)
+            self._entries[key] = (self.clock() + time if time else 0, value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._delete(next(iter(self._entries)))
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._delete(key)
+
+    def incr(self, key, delta=1, initial_value=None):
+        with self._lock:
+            val = self._get(key, self.clock())
+            if val is None:
+                if initial_value is None:
+                    return None
+                val = initial_value
+            val += delta
+            self._delete(key)
+            self._entries[key] = (0, val, 64)
+            self.bytes += 64
+            return val
+
+
+class FakeMemcache(MemoryCache):
+    """
+    A local stand-in for a memcache client... values are pickled like memcache does so anything that
+    wouldn't survive memcache won't survive this either. Enforces memcache's key & value size limits.
+    """
+    MAX_KEY_LENGTH = 250
+    MAX_VALUE_SIZE = 1 << 20
+
+    def get(self, key):
+        val = MemoryCache.get(self, key)
+        return pickle.loads(val) if isinstance(val, str) else val
+
+    def get_multi(self, keys):
+        return dict((key, pickle.loads(val) if isinstance(val, str) else val)
+                    for key, val in MemoryCache.get_multi(self, keys).iteritems())
+
+    def set(self, key, value, time=0, size=None):
+        if len(key) > self.MAX_KEY_LENGTH:
+            raise ValueError('memcache keys are limited to {:d} bytes'.format(self.MAX_KEY_LENGTH))
+        if isinstance(value, (int, long)):
+            return MemoryCache.set(self, key, value, time)  # so incr() works
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(value) > self.MAX_VALUE_SIZE:
+            return False
+        return MemoryCache.set(self, key, value, time)
+
+
+class _Flight(object):
+    """
+    A request in flight that identical requests share (single-flight)
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.exception = None
+
+
+class _CachedRpc(RpcWrapper):
+    """
+    An rpc-like object for a cached (or shared in-flight) async='rpc' response
+        get_response = Returns the response
+        rpc = The in-flight rpc get_response() waits for (None if there's none... or it's unknown)
+        response = The cached response (get_response isn't called)
+    """
+    def __init__(self, get_response, rpc=None, response=None):
+        self._get_response = get_response
+        self._rpc = rpc
+        self._response = response
+
+    def done(self):
+        if self._response is not None:
+            return True
+        return RpcWrapper.done(self) if self._rpc is not None else None
+
+    def wait(self):
+        self.get_result()
+
+    def get_result(self):
+        if self._response is None:
+            self._response = self._get_response()
+        return self._response
+
+
+class _RpcFlight(_CachedRpc):
+    """
+    An async='rpc' request in flight that identical requests share... it's registered before it's sent so
+    they wait on sent (sent_rpc is then the rpc... None if the send failed)
+    """
+    def __init__(self):
+        _CachedRpc.__init__(self, None)
+        self.sent = threading.Event()
+        self.sent_rpc = None
+
+
+def _copy_response(response):
+    """ A plain (picklable) copy of a urlfetch-like response """
+    headers = getattr(response, 'headers', None) or {}
+    return HttpResponse(response.status_code, response.content,
+                        ResponseHeaders((name.lower(), val) for name, val in headers.items()),
+                        final_url=getattr(response, 'final_url', None))
+
+
+class ResponseCache(object):
+    """
+    Caches the responses of GET requests
+
+    Optional:
+        backend = A memcache-style client... get(), set(key, value, time), get_multi(), incr() (default: a MemoryCache)
+        ttls = A dict of endpoint resource ('statuses/show', 'search/tweets'...) -> seconds (default: DEFAULT_TTLS)
+            Only the endpoints listed are cached
+        namespace = Prefix for every key in the backend
+
+    Invalidation:
+        Every entry is tagged with its endpoint and the tweet ids it's about. Keys include each tag's generation
+        number so invalidating a tag (bumping its generation) orphans every entry with that tag... no key
+        enumeration is needed so this works with memcache.
+            statuses/update & update_with_media = search/tweets & the replied-to tweet
+            statuses/retweet/:id & statuses/destroy/:id = the tweet & search/tweets
+
+    Concurrent identical requests share one request (single-flight)
+    """
+    def __init__(self, backend=None, ttls=None, namespace='twittergae'):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.namespace = namespace
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _tags(self, resource, url, vars):
+        tags = [resource]
+        if resource.endswith('/:id'):
+            tags.append('id:' + url.rsplit('/', 1)[-1].split('.', 1)[0])
+        ids = (vars or {}).get('id')
+        if ids is not None:
+            tags.extend('id:' + id for id in str(ids).split(',') if id)
+        return tags
+
+    def _generations(self, tags):
+        gen_keys = [self.namespace + ':gen:' + tag for tag in tags]
+        gens = self.backend.get_multi(gen_keys)
+        return [str(gens.get(key, 0)) for key in gen_keys]
+
+    def key(self, method, url, query_vars=None, token=None):
+        """
+        Returns (key, ttl) for a request... (None, None) if it isn't cacheable
+            token = The access token the request is signed with... responses can depend on the account (protected
+                tweets, include_my_retweet) so each account's are cached apart
+        """
+        if method.upper() != 'GET':
+            return None, None
+        resource = endpoint_resource(url)
+        ttl = self.ttls.get(resource)
+        if not ttl:
+            return None, None
+        encoded = percent_encode_dict(query_vars)  # utf-8... unicode values are fine
+        query = '&'.join([name + '=' + encoded[name] for name in sorted(encoded)])
+        generations = ','.join(self._generations(self._tags(resource, url, query_vars)))
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        if isinstance(token, unicode):
+            token = token.encode('utf-8')
+        digest = hashlib.sha1('\n'.join(['GET', url, query, generations, token or ''])).hexdigest()
+        return self.namespace + ':' + digest, ttl
+
+    def invalidate(self, method, url, query_vars=None, post_vars=None):
+        """ Invalidates the entries a (non-GET) request affects """
+        if method.upper() == 'GET':
+            return
+        resource = endpoint_resource(url)
+        tags = []
+        if resource in ('statuses/update', 'statuses/update_with_media'):
+            tags.append('search/tweets')
+            reply_to = (post_vars or {}).get('in_reply_to_status_id')
+            if reply_to is not None:
+                tags.append('id:{:}'.format(reply_to))
+        elif resource in ('statuses/retweet/:id', 'statuses/destroy/:id'):
+            tags.extend(self._tags(resource, url, None)[1:])
+            tags.append('search/tweets')
+        for tag in tags:
+            self.backend.incr(self.namespace + ':gen:' + tag, initial_value=0)
+
+    def get(self, key):
+        response = self.backend.get(key)
+        if response is not None and isinstance(self.backend, MemoryCache):
+            # Every hit gets its own copy... twitter_response() decodes in place
+            response = _copy_response(response)
+        return response
+
+    def put(self, key, ttl, response):
+        """ Caches a successful response """
+        if response.status_code == 200:
+            response = _copy_response(response)
+            if isinstance(self.backend, MemoryCache):
+                self.backend.set(key, response, time=ttl, size=len(response.content or '') + 256)
+            else:
+                self.backend.set(key, response, time=ttl)
+
+    def fetch(self, key, ttl, send):
+        """
+        Returns the cached response for key... or calls send() (once for every concurrent caller of the same key)
+        and caches its response
+        """
+        response = self.get(key)
+        if response is not None:
+            return response
+
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = not isinstance(flight, (_Flight, _RpcFlight))
+                if leader:
+                    flight = self._flights[key] = _Flight()
+            if not isinstance(flight, _RpcFlight):
+                break
+            # An async='rpc' request is already in flight
+            flight.sent.wait()
+            if flight.sent_rpc is not None:
+                return _copy_response(flight.get_result())
+            # ...its send failed, try again
+
+        if not leader:
+            flight.done.wait()
+            if flight.exception is not None:
+                raise flight.exception
+            return _copy_response(flight.response)
+
+        try:
+            flight.response = send()
+            self.put(key, ttl, flight.response)
+            return flight.response
+        except Exception as e:
+            flight.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _land(self, key, flight):
+        """ Forgets an async='rpc' flight... its rpc completed """
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _prune(self):
+        """ Forgets the completed async='rpc' flights nobody called get_result() on (called with self._lock held) """
+        landed = [key for key, flight in self._flights.iteritems()
+                  if isinstance(flight, _RpcFlight) and flight.done() is True]
+        for key in landed:
+            del self._flights[key]
+
+    def fetch_rpc(self, key, ttl, send_async):
+        """ Like fetch() for async='rpc'... returns an rpc-like object """
+        response = self.get(key)
+        if response is not None:
+            return _CachedRpc(None, response=response)
+
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = not isinstance(flight, (_Flight, _RpcFlight))
+                if leader:
+                    # Registered before it's sent... send_async() can wait on the rate limiter so it's called
+                    # without the lock held
+                    self._prune()
+                    flight = self._flights[key] = _RpcFlight()
+            if leader:
+                return self._send_flight(key, ttl, flight, send_async)
+            if isinstance(flight, _Flight):
+                # A blocking request is already in flight
+                return _CachedRpc(lambda: self.fetch(key, ttl, lambda: send_async().get_result()))
+            flight.sent.wait()
+            if flight.sent_rpc is not None:
+                return _CachedRpc(lambda: _copy_response(flight.get_result()), flight)
+            # ...its send failed, try again
+
+    def _send_flight(self, key, ttl, flight, send_async):
+        """ Sends the leader's request of an _RpcFlight... identical requests wait on flight.sent to join it """
+        try:
+            rpc = send_async()
+        except Exception:
+            self._land(key, flight)
+            flight.sent.set()
+            raise
+
+        def complete():
+            try:
+                result = rpc.get_result()
+                self.put(key, ttl, result)
+                return result
+            finally:
+                self._land(key, flight)
+
+        flight._get_response = complete
+        flight._rpc = flight.sent_rpc = rpc
+        flight.sent.set()
+        if hasattr(rpc, 'add_done_callback'):
+            # Forgotten once it completes even if get_result() is never called (otherwise see _prune())
+            rpc.add_done_callback(lambda rpc: self._land(key, flight))
+        return flight
+
+    def fetch_ndb(self, key, ttl, send_ndb):
+        """ Like fetch() for async='ndb'... returns an ndb Future """
+        from google.appengine.ext import ndb
+
+        response = self.get(key)
+        if response is not None:
+            future = ndb.Future()
+            future.set_result(response)
+            return future
+
+        # ndb tasklets all run on one thread so no lock is needed between them
+        future = self._flights.get(key)
+        if isinstance(future, ndb.Future):
+            @ndb.tasklet
+            def copy():
+                response = yield future
+                raise ndb.Return(_copy_response(response))
+            return copy()
+
+        future = self._flights[key] = send_ndb()
+
+        def complete(future):
+            if self._flights.get(key) is future:
+                del self._flights[key]
+            if future.get_exception() is None:
+                self.put(key, ttl, future.get_result())
+        future.add_callback(complete, future)
+        return future
@@ -0,0 +1,242 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Spreads requests across several sets of twitter credentials
+
+    pool = CredentialPool([
+        OAuth1(API_KEY, API_SECRET_KEY, ACCESS_TOKEN_1, ACCESS_SECRET_TOKEN_1),
+        OAuth1(API_KEY, API_SECRET_KEY, ACCESS_TOKEN_2, ACCESS_SECRET_TOKEN_2),
+    ])
+    tweets = Tweets(credential_pool=pool)
+
+Only reads (GETs) are spread across the pool... writes (update, retweet, destroy...) are signed with the
+pool's primary credentials (the first) unless pool_writes is set
+"""
+
+import re
+import threading
+import time
+
+from oauth import PreparedRequest
+from ratelimit import endpoint_resource, RateLimiter
+from transports import RpcWrapper
+
+__all__ = [
+    'CredentialPool',
+]
+
+
+_OAUTH_TOKEN_RE = re.compile(r'oauth_token="([^"]*)"')
+
+
+class _Credential(object):
+    """ One OAuth1 credential set and what's known about its rate limits """
+    def __init__(self, oauth, clock):
+        self.oauth = oauth
+        self.limiter = RateLimiter(max_retries=0, clock=clock)
+        self.dropped_until = 0
+
+
+class _ObservedRpc(RpcWrapper):
+    """ Reports an async='rpc' response to the pool once get_result() has it """
+    def __init__(self, pool, url, headers, rpc):
+        self._pool = pool
+        self._url = url
+        self._headers = headers
+        self._rpc = rpc
+        self._observed = False
+
+    def wait(self):
+        self._rpc.wait()
+
+    def get_result(self):
+        response = self._rpc.get_result()
+        if not self._observed:
+            self._observed = True
+            self._pool.observe(self._url, self._headers, response)
+        return response
+
+
+class _PoolTransport(object):
+    """ Wraps a transport so every response is reported to the pool """
+    def __init__(self, pool, transport):
+        self.pool = pool
+        self.transport = transport
+        self.streams = getattr(transport, 'streams', False)
+
+    def send_request(self, method, url, payload=None, headers=None, **kwargs):
+        response = self.transport.send_request(method, url, payload, headers, **kwargs)
+        self.pool.observe(url, headers, response)
+        return response
+
+    def send_request_async(self, method, url, payload=None, headers=None, **kwargs):
+        return _ObservedRpc(self.pool, url, headers,
+                            self.transport.send_request_async(method, url, payload, headers, **kwargs))
+
+    def send_request_ndb(self, method, url, payload=None, headers=None, **kwargs):
+        future = self.transport.send_request_ndb(method, url, payload, headers, **kwargs)
+
+        def observe():
+            if future.get_exception() is None:
+                self.pool.observe(url, headers, future.get_result())
+        future.add_callback(observe)
+        return future
+
+
+class _PooledPreparedRequest(PreparedRequest):
+    """ A PreparedRequest for each credential set... each sign() picks the credentials first """
+    def __init__(self, pool, method, url, query_vars=None, post_vars=None):
+        PreparedRequest.__init__(self, pool, method, url, query_vars, post_vars)
+        self._resource = endpoint_resource(url)
+        self._prepared = {}  # OAuth1 -> PreparedRequest
+
+    def sign(self, query_vars=None, post_vars=None, oauth=None):
+        """ oauth = The pool's credentials to sign with (default: the best for the endpoint) """
+        if oauth is None:
+            oauth = self.oauth.choose(self._resource)
+        else:
+            self.oauth.count(oauth, self._resource)
+        prepared = self._prepared.get(oauth)
+        if prepared is None:
+            prepared = self._prepared[oauth] = oauth.prepare(self.method, self.url, self.query_vars, self.post_vars)
+        return prepared.sign(query_vars, post_vars)
+
+
+class _PinnedSigner(object):
+    """ Signs every request with the same credentials of a pool (see CredentialPool.pin()) """
+    def __init__(self, pool, oauth):
+        self.pool = pool
+        self.oauth = oauth
+
+    def init_request(self, method, url, **kwargs):
+        self.pool.count(self.oauth, endpoint_resource(url))
+        return self.oauth.init_request(method, url, **kwargs)
+
+
+class CredentialPool(object):
+    """
+    Signs each GET with the credentials that have the most requests remaining for its endpoint
+    (Pass it to TwitterApi as credential_pool... TwitterApi.oauth is then its primary)
+
+    Initialization requires:
+        oauths = A list of OAuth1 instances... each keeps its own pre-keyed signing state
+
+    Optional:
+        primary = The OAuth1 that signs writes (POSTs) & streams (default: the first of oauths)
+        pool_writes = Spread writes across the pool too... only for pools of interchangeable accounts, a
+            write otherwise posts (or deletes) as whichever account has the most quota
+        cooldown = Seconds a credential set is left out after a 401 (or a 429 without a known window reset)
+        clock = A time.time replacement (for tests)
+
+    A credential set that gets a 429 is left out until its endpoint's window resets
+    """
+    def __init__(self, oauths, primary=None, pool_writes=False, cooldown=60.0, clock=None):
+        self.primary = primary if primary is not None else oauths[0]
+        self.pool_writes = pool_writes
+        self.cooldown = cooldown
+        self.clock = clock or time.time
+        self._credentials = [_Credential(oauth, self.clock) for oauth in oauths]
+        self._lock = threading.Lock()
+        self._rotation = 0
+
+    def _by_token(self, headers):
+        match = _OAUTH_TOKEN_RE.search((headers or {}).get('Authorization', ''))
+        if match:
+            token = match.group(1)
+            for credential in self._credentials:
+                if credential.oauth._get_signing_state()[1].get('oauth_token') == token:
+                    return credential
+        return None
+
+    def _best(self, resource):
+        now = self.clock()
+        with self._lock:
+            # Round robin between equally good credentials
+            self._rotation = (self._rotation + 1) % len(self._credentials)
+            ordered = self._credentials[self._rotation:] + self._credentials[:self._rotation]
+
+            best, best_remaining = None, None
+            for credential in ordered:
+                if credential.dropped_until > now:
+                    continue
+                budget = credential.limiter.budget(resource)
+                if budget is None:
+                    remaining = float('inf')  # never used for this endpoint
+                elif budget['reset'] <= now:
+                    remaining = budget['limit']
+                else:
+                    remaining = budget['remaining']
+                if best is None or remaining > best_remaining:
+                    best, best_remaining = credential, remaining
+
+            if best is None or best_remaining <= 0:
+                # Everything's dropped or exhausted... use whichever comes back first
+                def available_at(credential):
+                    budget = credential.limiter.budget(resource)
+                    reset = budget['reset'] if budget and budget['remaining'] <= 0 else 0
+                    return max(credential.dropped_until, reset)
+                best = min(ordered, key=available_at)
+        return best
+
+    def choose(self, resource):
+        """ Returns the OAuth1 to sign the next request to resource with """
+        best = self._best(resource)
+        best.limiter.delay(resource)  # count the request against its budget
+        return best.oauth
+
+    def pin(self, resource):
+        """
+        Returns a signer for requests to resource that signs them all with the credentials choose() would pick
+        (its oauth... a request the pool prepared is signed with sign(oauth=)). Nothing is counted against their
+        budget until a request is signed. For keying a cached GET on the access token that will sign it.
+        """
+        return _PinnedSigner(self, self._best(resource).oauth)
+
+    def count(self, oauth, resource):
+        """ Counts a request to resource signed with oauth (one of the pool's) against its budget """
+        for credential in self._credentials:
+            if credential.oauth is oauth:
+                credential.limiter.delay(resource)
+                return
+
+    def _pooled(self, method):
+        return self.pool_writes or method.upper() == 'GET'
+
+    def init_request(self, method, url, **kwargs):
+        """ OAuth1.init_request() with the best credentials for the url's endpoint (the primary's for writes) """
+        if not self._pooled(method):
+            return self.primary.init_request(method, url, **kwargs)
+        return self.choose(endpoint_resource(url)).init_request(method, url, **kwargs)
+
+    def prepare(self, method, url, query_vars=None, post_vars=None):
+        """ OAuth1.prepare() that signs each request with the best credentials for the url's endpoint """
+        if not self._pooled(method):
+            return self.primary.prepare(method, url, query_vars, post_vars)
+        return _PooledPreparedRequest(self, method, url, query_vars, post_vars)
+
+    def observe(self, url, headers, response):
+        """ Updates the budget of the credentials that signed a request from its response """
+        credential = self._by_token(headers)
+        if credential is None:
+            return
+        resource = endpoint_resource(url)
+        credential.limiter.update(resource, response)
+        if response.status_code == 401:
+            credential.dropped_until = self.clock() + self.cooldown
+        elif response.status_code == 429:
+            budget = credential.limiter.budget(resource)
+            if budget is None or budget['reset'] <= self.clock():
+                # No window reset to wait for... leave it out for a while instead
+                credential.dropped_until = self.clock() + self.cooldown
+
+    def budget(self, resource=None):
+        """ Returns a list of every credential set's budget (see RateLimiter.budget()) in pool order """
+        return [credential.limiter.budget(resource) for credential in self._credentials]
+
+    def wrap_transport(self, transport):
+        """ Returns a transport that reports every response to the pool """
+        return _PoolTransport(self, transport)
@@ -0,0 +1,292 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+A local store of the tweets & users seen in responses... so they aren't fetched again
+
+    store = EntityStore(max_tweets=100000, max_age=300)
+    store.ingest(tweets.search('road bike'))  # any response with tweets or users in it
+    found = store.lookup(tweets, tweet_ids)  # only the ids that aren't stored (or are stale) are fetched
+    replies = store.replies_to(tweet_id)
+
+Only the commonly used fields are kept (in __slots__ objects) rather than the decoded json. Tweets are
+indexed by id, by user & by the tweet they reply to. The least recently used entities are evicted once
+there are more than max_tweets / max_users.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from batching import LookupBatcher
+
+__all__ = [
+    'Tweet',
+    'User',
+    'EntityStore',
+]
+
+
+def _id_str(twitter, name):
+    """ The (name)_str of a decoded twitter object... its id as a str (None if it's null) """
+    val = twitter.get(name + '_str')
+    if val is None:
+        val = twitter.get(name)
+        if val is not None:
+            val = str(val)
+    return val
+
+
+class Tweet(object):
+    """
+    The stored fields of a tweet... user_id, in_reply_to_status_id etc. are id strs (or None)
+        fetched = When it was stored (time.time())
+    """
+    __slots__ = ('id', 'text', 'created_at', 'user_id', 'in_reply_to_status_id', 'in_reply_to_user_id',
+                 'retweeted_status_id', 'quoted_status_id', 'retweet_count', 'favorite_count', 'lang', 'fetched')
+
+    def __init__(self, twitter, fetched):
+        self.id = _id_str(twitter, 'id')
+        self.text = twitter.get('full_text') or twitter.get('text')
+        self.created_at = twitter.get('created_at')
+        self.user_id = _id_str(twitter.get('user') or {}, 'id')
+        self.in_reply_to_status_id = _id_str(twitter, 'in_reply_to_status_id')
+        self.in_reply_to_user_id = _id_str(twitter, 'in_reply_to_user_id')
+        self.retweeted_status_id = _id_str(twitter.get('retweeted_status') or {}, 'id')
+        self.quoted_status_id = _id_str(twitter, 'quoted_status_id')
+        self.retweet_count = twitter.get('retweet_count')
+        self.favorite_count = twitter.get('favorite_count')
+        self.lang = twitter.get('lang')
+        self.fetched = fetched
+
+    def __repr__(self):
+        return 'Tweet({!r})'.format(self.id)
+
+
+class User(object):
+    """
+    The stored fields of a user
+        fetched = When it was stored (time.time())
+    """
+    __slots__ = ('id', 'screen_name', 'name', 'followers_count', 'friends_count', 'statuses_count', 'verified',
+                 'protected', 'profile_image_url_https', 'fetched')
+
+    def __init__(self, twitter, fetched):
+        self.id = _id_str(twitter, 'id')
+        self.screen_name = twitter.get('screen_name')
+        self.name = twitter.get('name')
+        self.followers_count = twitter.get('followers_count')
+        self.friends_count = twitter.get('friends_count')
+        self.statuses_count = twitter.get('statuses_count')
+        self.verified = twitter.get('verified')
+        self.protected = twitter.get('protected')
+        self.profile_image_url_https = twitter.get('profile_image_url_https')
+        self.fetched = fetched
+
+    def __repr__(self):
+        return 'User({!r}, {!r})'.format(self.id, self.screen_name)
+
+
+def _index_add(index, key, id):
+    if key is not None:
+        ids = index.get(key)
+        if ids is None:
+            ids = index[key] = set()
+        ids.add(id)
+
+
+def _index_discard(index, key, id):
+    if key is not None:
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(id)
+            if not ids:
+                del index[key]
+
+
+class EntityStore(object):
+    """
+    Stores the tweets & users of decoded responses
+
+    Optional:
+        max_tweets, max_users = The most kept... the least recently used are evicted first
+        max_age = Seconds an entity is fresh for (None = until evicted)... stale entities are misses
+            Each read can pass its own max_age instead
+        clock = A time.time replacement (for tests)
+
+    Safe to share between threads
+    """
+    def __init__(self, max_tweets=100000, max_users=50000, max_age=None, clock=None):
+        self.max_tweets = max_tweets
+        self.max_users = max_users
+        self.max_age = max_age
+        self.clock = clock or time.time
+        self.hits = 0
+        self.misses = 0
+        self._tweets = OrderedDict()  # id -> Tweet (least recently used first)
+        self._users = OrderedDict()  # id -> User
+        self._by_user = {}  # user id -> set of tweet ids
+        self._replies = {}  # in_reply_to_status_id -> set of tweet ids
+        self._screen_names = {}  # lowercase screen_name -> user id
+        self._lock = threading.Lock()
+
+    def ingest(self, twitter):
+        """
+        Stores every tweet & user in twitter... a response (its decoded json is used if it's a 200) or
+        decoded json: a tweet, user, list of either, search results or a statuses/lookup map=true dict.
+        Retweeted & quoted tweets are stored too. Returns how many entities were stored.
+        """
+        if hasattr(twitter, 'status_code'):
+            if twitter.status_code != 200:
+                return 0
+            twitter = twitter.twitter
+        now = self.clock()
+        with self._lock:
+            return self._ingest(twitter, now)
+
+    def _ingest(self, twitter, now):
+        if isinstance(twitter, list):
+            return sum(self._ingest(item, now) for item in twitter)
+        if not isinstance(twitter, dict):
+            return 0
+        if 'statuses' in twitter:
+            return self._ingest(twitter['statuses'], now)
+        if isinstance(twitter.get('id'), dict):
+            return self._ingest(twitter['id'].values(), now)  # lookup map=true... missing tweets are None
+        if 'text' in twitter or 'full_text' in twitter:
+            count = self._put_tweet(Tweet(twitter, now))
+            user = twitter.get('user')
+            if user and 'screen_name' in user:  # not trimmed
+                count += self._put_user(User(user, now))
+            for name in ('retweeted_status', 'quoted_status'):
+                if twitter.get(name):
+                    count += self._ingest(twitter[name], now)
+            return count
+        if 'screen_name' in twitter:
+            count = self._put_user(User(twitter, now))
+            if twitter.get('status'):
+                status = dict(twitter['status'], user={'id_str': _id_str(twitter, 'id')})
+                count += self._put_tweet(Tweet(status, now))
+            return count
+        return 0
+
+    def _put_tweet(self, tweet):
+        if tweet.id is None:
+            return 0
+        self._delete_tweet(tweet.id)
+        self._tweets[tweet.id] = tweet
+        _index_add(self._by_user, tweet.user_id, tweet.id)
+        _index_add(self._replies, tweet.in_reply_to_status_id, tweet.id)
+        while len(self._tweets) > self.max_tweets:
+            self._delete_tweet(next(iter(self._tweets)))
+        return 1
+
+    def _delete_tweet(self, id):
+        tweet = self._tweets.pop(id, None)
+        if tweet is not None:
+            _index_discard(self._by_user, tweet.user_id, id)
+            _index_discard(self._replies, tweet.in_reply_to_status_id, id)
+
+    def _put_user(self, user):
+        if user.id is None:
+            return 0
+        self._delete_user(user.id)
+        self._users[user.id] = user
+        if user.screen_name:
+            self._screen_names[user.screen_name.lower()] = user.id
+        while len(self._users) > self.max_users:
+            self._delete_user(next(iter(self._users)))
+        return 1
+
+    def _delete_user(self, id):
+        user = self._users.pop(id, None)
+        if user is not None and user.screen_name and self._screen_names.get(user.screen_name.lower()) == id:
+            del self._screen_names[user.screen_name.lower()]
+
+    def _fresh(self, entities, id, max_age, now):
+        """ The entity if it's stored & fresh (it becomes the most recently used)... otherwise None """
+        entity = entities.get(id)
+        if entity is None:
+            return None
+        if max_age is None:
+            max_age = self.max_age
+        if max_age is not None and entity.fetched + max_age <= now:
+            return None
+        del entities[id]
+        entities[id] = entity
+        return entity
+
+    def tweet(self, id, max_age=None):
+        """ The stored Tweet with id (None if it isn't stored or it's stale) """
+        with self._lock:
+            return self._fresh(self._tweets, str(id), max_age, self.clock())
+
+    def user(self, id, max_age=None):
+        """ The stored User with id (None if it isn't stored or it's stale) """
+        with self._lock:
+            return self._fresh(self._users, str(id), max_age, self.clock())
+
+    def user_by_screen_name(self, screen_name, max_age=None):
+        """ The stored User with screen_name (case insensitive) """
+        with self._lock:
+            id = self._screen_names.get(screen_name.lower())
+            return self._fresh(self._users, id, max_age, self.clock()) if id is not None else None
+
+    def _indexed(self, index, key, max_age):
+        now = self.clock()
+        with self._lock:
+            tweets = [self._fresh(self._tweets, id, max_age, now) for id in index.get(str(key), ())]
+        tweets = [tweet for tweet in tweets if tweet is not None]
+        tweets.sort(key=lambda tweet: int(tweet.id), reverse=True)
+        return tweets
+
+    def tweets_by_user(self, user_id, max_age=None):
+        """ The user's stored (fresh) Tweets, newest first """
+        return self._indexed(self._by_user, user_id, max_age)
+
+    def replies_to(self, status_id, max_age=None):
+        """ The stored (fresh) Tweets replying to status_id, newest first """
+        return self._indexed(self._replies, status_id, max_age)
+
+    def lookup(self, tweets, ids, max_age=None, **batcher_args):
+        """
+        Returns a dict of id -> Tweet (None if it doesn't exist or isn't visible) for every id... the stored
+        fresh tweets are used and only the rest are fetched (statuses/lookup, 100 ids per request) & stored
+            tweets = A Tweets instance
+            batcher_args = LookupBatcher args e.g. include_entities
+        """
+        found = {}
+        misses = []
+        now = self.clock()
+        with self._lock:
+            for id in ids:
+                id = str(id)
+                if id in found:
+                    continue  # a repeated id is one hit (or miss)
+                tweet = self._fresh(self._tweets, id, max_age, now)
+                if tweet is None:
+                    misses.append(id)
+                found[id] = tweet
+            self.hits += len(found) - len(misses)
+            self.misses += len(misses)
+
+        if misses:
+            batcher = LookupBatcher(tweets, **batcher_args)
+            futures = batcher.load_many(misses)
+            batcher.dispatch()
+            fetched = [future.get_result() for future in futures]
+            now = self.clock()
+            with self._lock:
+                for id, twitter in zip(misses, fetched):
+                    if twitter is not None:
+                        self._ingest(twitter, now)
+                        found[id] = self._tweets.get(id)
+        return found
+
+    def counts(self):
+        """ Returns {'tweets': ..., 'users': ...}... how many are stored """
+        with self._lock:
+            return {'tweets': len(self._tweets), 'users': len(self._users)}
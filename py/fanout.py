@@ -0,0 +1,206 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Fans out many twitter API calls with a bounded number of requests in flight
+
+    fanout = Fanout(max_in_flight=50)
+    futures = [fanout.submit(tweets.show, tweet_id) for tweet_id in tweet_ids]
+    for future in futures:
+        response = future.get_result()  # a twitter_response()
+"""
+
+from collections import deque
+from itertools import islice
+import threading
+
+from transports import rpc_done
+from twitterapi import twitter_response
+
+__all__ = [
+    'CancelledError',
+    'FanoutFuture',
+    'Fanout',
+]
+
+
+class CancelledError(Exception):
+    """ Raised by FanoutFuture.get_result() when the call was cancelled """
+    pass
+
+
+class FanoutFuture(object):
+    """
+    The eventual twitter_response() of a call submitted to a Fanout
+    """
+    def __init__(self, fanout, func, args, kwargs):
+        self._fanout = fanout
+        self._call = (func, args, kwargs)
+        self._rpc = None
+        self._response = None
+        self._exception = None
+        self._done = False
+        self._cancelled = False
+
+    def done(self):
+        return self._done
+
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """
+        Cancels the call... returns False if it already completed
+        A call that hasn't been sent yet never will be. A call that's already in flight can't be aborted so its
+        response is discarded (it keeps its slot until it completes).
+        """
+        if self._done:
+            return False
+        self._cancelled = True
+        self._fanout._cancel(self)
+        return True
+
+    def get_result(self):
+        """ Waits for and returns the twitter_response()... or raises the call's exception """
+        while not self._done:
+            self._fanout._wait(self)
+        if self._cancelled:
+            raise CancelledError()
+        if self._exception is not None:
+            raise self._exception
+        return self._response
+
+
+def _wait_any(rpcs, event):
+    """
+    Blocks until at least one of the rpcs / futures has completed (the rpc wrappers are waited on like the
+    rpcs they wrap... see transports.RpcWrapper)
+    event is set whenever an rpc with add_done_callback() completes (see Fanout._start)
+    Returns the rpc it waited on when it could only wait on the first one (None otherwise)
+    """
+    first = rpcs[0]
+    if all(hasattr(rpc, 'add_done_callback') for rpc in rpcs):
+        event.wait()  # transports.HttpRpc
+    elif hasattr(first, 'wait_any'):
+        first.wait_any(rpcs)  # ndb Futures
+    elif all(hasattr(rpc, 'state') for rpc in rpcs):
+        from google.appengine.api import apiproxy_stub_map
+        apiproxy_stub_map.UserRPC.wait_any([getattr(rpc, 'unwrapped', rpc) for rpc in rpcs])  # urlfetch rpcs
+    else:
+        if hasattr(first, 'wait'):
+            first.wait()
+        else:
+            first.get_result()
+        return first
+    return None
+
+
+class Fanout(object):
+    """
+    Runs calls like tweets.show(id, async='rpc') with at most max_in_flight of them in flight at once
+
+    Optional:
+        max_in_flight = The most requests in flight at once (calls beyond that are queued)
+        async = The async mode each call is made with... 'rpc' or 'ndb'
+
+    Calls are sent in the order they were submitted. Like ndb, progress is made whenever a
+    FanoutFuture.get_result() (or wait_all()) call waits... so not from other threads.
+    """
+    def __init__(self, max_in_flight=10, async='rpc'):
+        self.max_in_flight = max_in_flight
+        self.async = async
+        self._pending = deque()
+        self._in_flight = []
+        self._any_done = threading.Event()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queues func(*args, async=..., **kwargs)... func is a TwitterApi request method such as tweets.show
+        Returns a FanoutFuture
+        """
+        future = FanoutFuture(self, func, args, kwargs)
+        self._pending.append(future)
+        self._start()
+        return future
+
+    def map(self, func, iterable):
+        """
+        Submits func(item) for every item and yields the twitter_response()s in order
+        Items are taken from the iterable as responses are yielded... enough are queued to keep max_in_flight
+        calls in flight but a long (or endless) iterable isn't read all at once
+        """
+        window = 2 * max(self.max_in_flight, 1)
+        items = iter(iterable)
+        futures = deque(self.submit(func, item) for item in islice(items, window))
+        while futures:
+            response = futures.popleft().get_result()
+            futures.extend(self.submit(func, item) for item in islice(items, window - len(futures)))
+            yield response
+
+    def wait_all(self):
+        """ Waits for every submitted call to complete """
+        while self._pending or self._in_flight:
+            self._wait(None)
+
+    def cancel_all(self):
+        """ Cancels every call that hasn't completed """
+        for future in list(self._pending) + list(self._in_flight):
+            future.cancel()
+
+    def _start(self):
+        while self._pending and len(self._in_flight) < self.max_in_flight:
+            future = self._pending.popleft()
+            func, args, kwargs = future._call
+            kwargs = dict(kwargs, async=self.async)
+            try:
+                future._rpc = func(*args, **kwargs)
+            except Exception as e:
+                future._exception = e
+                future._done = True
+            else:
+                self._in_flight.append(future)
+                add_done_callback = getattr(future._rpc, 'add_done_callback', None)
+                if add_done_callback is not None:
+                    add_done_callback(self._signal)
+
+    def _signal(self, rpc):
+        self._any_done.set()
+
+    def _cancel(self, future):
+        try:
+            self._pending.remove(future)
+        except ValueError:
+            return  # in flight... the response is discarded once it arrives
+        future._done = True
+
+    def _complete(self, future):
+        self._in_flight.remove(future)
+        try:
+            response = future._rpc.get_result()
+            if not future._cancelled:
+                future._response = twitter_response(response)
+        except Exception as e:
+            future._exception = e
+        future._rpc = None
+        future._done = True
+
+    def _wait(self, future):
+        """ Makes progress... completes at least one in-flight call and starts queued calls """
+        if future is not None and future in self._pending:
+            # Nothing sent yet... this call jumps the queue (a slot frees up below)
+            self._pending.remove(future)
+            self._pending.appendleft(future)
+
+        if self._in_flight:
+            self._any_done.clear()  # before the check... a call completing after it sets it again
+            finished = [f for f in self._in_flight if rpc_done(f._rpc) is True]
+            if not finished:
+                waited = _wait_any([f._rpc for f in self._in_flight], self._any_done)
+                finished = [f for f in self._in_flight if f._rpc is waited or rpc_done(f._rpc) is True]
+            for f in finished:
+                self._complete(f)
+
+        self._start()
@@ -6,10 +6,10 @@ MIT License
 http://opensource.org/licenses/MIT
 
 Three simple functions to send HTTP requests from a GAE App
-"""
 
-from google.appengine.api import urlfetch
-from google.appengine.ext import ndb
+urlfetch & ndb are imported by the first request that needs them... ndb (and the datastore code it pulls in)
+is never imported by apps that don't use async='ndb'
+"""
 
 __all__ = [
     'send_request',
@@ -25,6 +25,8 @@ def send_request(method, url, payload=None, headers=None, **kwargs):
         To get the urlfetch Response object with the twitter json response data initialized:
             response = twitter_response(response)
     """
+    from google.appengine.api import urlfetch
+
     if headers is None:
         headers = {}
 
@@ -41,6 +43,8 @@ def send_request_async(method, url, payload=None, headers=None, **kwargs):
                 response = twitter_response(rpc.get_result())
     """
 
+    from google.appengine.api import urlfetch
+
     if headers is None:
         headers = {}
 
@@ -48,19 +52,18 @@ def send_request_async(method, url, payload=None, headers=None, **kwargs):
     return urlfetch.make_fetch_call(rpc, url=url, method=method, payload=payload, headers=headers, **kwargs)
 
 
-@ndb.tasklet
 def send_request_ndb(method, url, payload=None, headers=None, **kwargs):
     """
         Sends a request asynchronously via ndb's tasklet friendly urlfetch()
-        Returns an ndb Future
+        Returns an ndb Future (the context's urlfetch() future itself... no tasklet wrapping it)
             To get the urlfetch Response object:
                 response = future.get_result()
             To get the urlfetch Response object with the twitter json response data initialized:
                 response = twitter_response(future.get_result())
     """
+    from google.appengine.ext import ndb
+
     if headers is None:
         headers = {}
 
-    ctx = ndb.get_context()
-    result = yield ctx.urlfetch(url=url, method=method, payload=payload, headers=headers, **kwargs)
-    raise ndb.Return(result)
+    return ndb.get_context().urlfetch(url=url, method=method, payload=payload, headers=headers, **kwargs)
@@ -0,0 +1,252 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Timing hooks for the stages of a twitter API request
+
+    stats = StatsRecorder()
+    tweets = Tweets(..., stats=stats)
+    ...
+    print stats.dump()
+
+Stages:
+    sign = OAuth1.init_request()... percent encoding, the signature base string & hmac
+    body = Building a multipart body (timed on its own when it isn't streamed)
+    send = The transport... from sending the request until its response is available
+    decode = Decoding the json of a twitter_response() from a blocking call
+"""
+
+import random
+import threading
+from timeit import default_timer as timer
+
+from ratelimit import endpoint_resource
+from transports import RpcWrapper
+
+__all__ = [
+    'Instrumentation',
+    'StatsRecorder',
+]
+
+
+class Instrumentation(object):
+    """
+    Receives the timings & counts of twitter API requests... subclass it to export them elsewhere
+    Nothing is measured unless a TwitterApi has one (stats=...) so there's no cost when disabled
+    """
+    def timing(self, stage, resource, seconds):
+        """ A request to resource ('statuses/show'...) spent seconds in stage ('sign', 'body', 'send', 'decode') """
+        pass
+
+    def request(self, resource, status_code, bytes_sent, bytes_received):
+        """ A request to resource completed... status_code is None if it raised """
+        pass
+
+    def wrap_transport(self, transport):
+        """ Returns a transport that reports the 'send' stage and the request counts """
+        return _InstrumentedTransport(self, transport)
+
+
+class _Samples(object):
+    """ count, total & max plus a uniform sample of up to max_samples values (reservoir sampling) """
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, value, max_samples):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if len(self.samples) < max_samples:
+            self.samples.append(value)
+        else:
+            i = random.randint(0, self.count - 1)
+            if i < max_samples:
+                self.samples[i] = value
+
+
+def _percentile(ordered, percent):
+    """ Nearest rank percentile of a sorted list """
+    if not ordered:
+        return None
+    rank = int(round(percent / 100.0 * len(ordered) + 0.5)) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+class StatsRecorder(Instrumentation):
+    """
+    Records per-stage timings and per-endpoint counters in memory and reports percentiles
+
+    Optional:
+        max_samples = The most timings kept per stage & endpoint for percentiles (a uniform sample of them all)
+        percentiles = The percentiles reported by report() & dump()
+
+    Every timing is also recorded under the resource '*' (every endpoint)
+    """
+    def __init__(self, max_samples=1024, percentiles=(50, 90, 99)):
+        self.max_samples = max_samples
+        self.percentiles = percentiles
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Forgets everything recorded so far """
+        with self._lock:
+            self._timings = {}  # (stage, resource) -> _Samples
+            self._endpoints = {}  # resource -> counters
+
+    def timing(self, stage, resource, seconds):
+        with self._lock:
+            for key in ((stage, resource), (stage, '*')):
+                samples = self._timings.get(key)
+                if samples is None:
+                    samples = self._timings[key] = _Samples()
+                samples.add(seconds, self.max_samples)
+
+    def request(self, resource, status_code, bytes_sent, bytes_received):
+        with self._lock:
+            counters = self._endpoints.get(resource)
+            if counters is None:
+                counters = self._endpoints[resource] = {
+                    'requests': 0,
+                    'bytes_sent': 0,
+                    'bytes_received': 0,
+                    'statuses': {},
+                }
+            counters['requests'] += 1
+            counters['bytes_sent'] += bytes_sent
+            counters['bytes_received'] += bytes_received
+            status = 'error' if status_code is None else status_code
+            counters['statuses'][status] = counters['statuses'].get(status, 0) + 1
+
+    def report(self):
+        """
+        Returns {'timings': {stage: {resource: {...}}}, 'endpoints': {resource: {...}}}
+            timings = count, mean, max & 'p50', 'p90'... in seconds
+            endpoints = requests, bytes_sent, bytes_received & statuses ({status_code: count})
+        """
+        with self._lock:
+            timings = {}
+            for (stage, resource), samples in self._timings.iteritems():
+                ordered = sorted(samples.samples)
+                timing = {
+                    'count': samples.count,
+                    'mean': samples.total / samples.count,
+                    'max': samples.max,
+                }
+                for percent in self.percentiles:
+                    timing['p{:}'.format(percent)] = _percentile(ordered, percent)
+                timings.setdefault(stage, {})[resource] = timing
+            endpoints = dict((resource, dict(counters, statuses=dict(counters['statuses'])))
+                             for resource, counters in self._endpoints.iteritems())
+        return {'timings': timings, 'endpoints': endpoints}
+
+    def dump(self):
+        """ Returns the report() as text... timings in milliseconds """
+        report = self.report()
+        lines = []
+        for stage in ('sign', 'body', 'send', 'decode'):
+            for resource, timing in sorted(report['timings'].get(stage, {}).iteritems()):
+                lines.append('{:<7}{:<28}n={:<8d}mean={:.3f}ms {:} max={:.3f}ms'.format(
+                    stage, resource, timing['count'], timing['mean'] * 1000,
+                    ' '.join('p{:}={:.3f}ms'.format(percent, timing['p{:}'.format(percent)] * 1000)
+                             for percent in self.percentiles),
+                    timing['max'] * 1000))
+        for resource, counters in sorted(report['endpoints'].iteritems()):
+            lines.append('{:<35}requests={:d} sent={:d}B received={:d}B statuses={:}'.format(
+                resource, counters['requests'], counters['bytes_sent'], counters['bytes_received'],
+                ' '.join('{:}:{:d}'.format(status, count)
+                         for status, count in sorted(counters['statuses'].iteritems()))))
+        return '\n'.join(lines)
+
+
+class _InstrumentedRpc(RpcWrapper):
+    """ Reports an async='rpc' request once its response is available """
+    def __init__(self, instrumentation, resource, bytes_sent, start, rpc):
+        self._instrumentation = instrumentation
+        self._resource = resource
+        self._bytes_sent = bytes_sent
+        self._start = start
+        self._rpc = rpc
+        self._elapsed = None
+        self._reported = False
+        add_done_callback = getattr(rpc, 'add_done_callback', None)
+        if add_done_callback is not None:
+            add_done_callback(self._on_done)  # times the send precisely (transports.HttpRpc)
+
+    def _on_done(self, rpc):
+        self._elapsed = timer() - self._start
+
+    def wait(self):
+        self._rpc.wait()
+
+    def get_result(self):
+        try:
+            response = self._rpc.get_result()
+        except Exception:
+            self._report(None)
+            raise
+        self._report(response)
+        return response
+
+    def _report(self, response):
+        if self._reported:
+            return
+        self._reported = True
+        elapsed = self._elapsed if self._elapsed is not None else timer() - self._start
+        self._instrumentation.timing('send', self._resource, elapsed)
+        _count(self._instrumentation, self._resource, self._bytes_sent, response)
+
+
+def _count(instrumentation, resource, bytes_sent, response):
+    if response is None:
+        instrumentation.request(resource, None, bytes_sent, 0)
+    else:
+        instrumentation.request(resource, response.status_code, bytes_sent, len(response.content or ''))
+
+
+class _InstrumentedTransport(object):
+    """ Wraps a transport to time the 'send' stage and count requests, bytes & statuses """
+    def __init__(self, instrumentation, transport):
+        self.instrumentation = instrumentation
+        self.transport = transport
+        self.streams = getattr(transport, 'streams', False)
+
+    def send_request(self, method, url, payload=None, headers=None, **kwargs):
+        resource = endpoint_resource(url)
+        bytes_sent = len(payload) if payload is not None else 0
+        start = timer()
+        response = None
+        try:
+            response = self.transport.send_request(method, url, payload, headers, **kwargs)
+            return response
+        finally:
+            self.instrumentation.timing('send', resource, timer() - start)
+            _count(self.instrumentation, resource, bytes_sent, response)
+
+    def send_request_async(self, method, url, payload=None, headers=None, **kwargs):
+        start = timer()
+        rpc = self.transport.send_request_async(method, url, payload, headers, **kwargs)
+        return _InstrumentedRpc(self.instrumentation, endpoint_resource(url),
+                                len(payload) if payload is not None else 0, start, rpc)
+
+    def send_request_ndb(self, method, url, payload=None, headers=None, **kwargs):
+        resource = endpoint_resource(url)
+        bytes_sent = len(payload) if payload is not None else 0
+        start = timer()
+        future = self.transport.send_request_ndb(method, url, payload, headers, **kwargs)
+
+        def report():
+            self.instrumentation.timing('send', resource, timer() - start)
+            _count(self.instrumentation, resource, bytes_sent,
+                   future.get_result() if future.get_exception() is None else None)
+        future.add_callback(report)
+        return future
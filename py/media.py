@@ -0,0 +1,274 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Uploads large media (video, animated GIFs, big images) in segments via media/upload INIT/APPEND/FINALIZE
+
+    with open('clip.mp4', 'rb') as clip:
+        media_id = tweets.upload_media(clip, 'video/mp4', media_category='tweet_video')
+    tweets.update('Just listed... see it in action', media_ids=[media_id])
+
+Segments are read from the file (or sliced from a str/memoryview) as they're sent... the whole media is
+never loaded. Failed segments are retried on their own and a failed upload can be resumed.
+"""
+
+import os
+import random
+import threading
+import time
+
+from fanout import Fanout
+from twitterapi import TwitterError, twitter_response
+
+__all__ = [
+    'MediaUploadError',
+    'UploadState',
+    'MediaUploader',
+]
+
+
+class MediaUploadError(TwitterError):
+    """
+    A media upload failed
+        state = The UploadState to resume it with (None if it failed before INIT completed)
+    """
+    def __init__(self, message, response=None, state=None):
+        TwitterError.__init__(self, message, response)
+        self.state = state
+
+
+class UploadState(object):
+    """
+    How far an upload got... pass it back to MediaUploader.upload() to resume (it's picklable)
+        media_id = The media_id_string from INIT
+        done = The indexes of the segments already appended
+        start = The file position the media started at (None for a str, bytearray or memoryview)... a resume
+            seeks back to it
+    """
+    def __init__(self, media_id, total_bytes, segment_size, start=None):
+        self.media_id = media_id
+        self.total_bytes = total_bytes
+        self.segment_size = segment_size
+        self.start = start
+        self.done = set()
+        self.finalized = False
+
+    @property
+    def segments(self):
+        return max((self.total_bytes + self.segment_size - 1) // self.segment_size, 1)
+
+
+class _FileSegment(object):
+    """
+    A file-like view of size bytes of a file from offset... segments of the same file can be read from
+    different threads at once (each read seeks under the file's lock)
+    """
+    def __init__(self, file, offset, size, lock):
+        self._file = file
+        self._offset = offset
+        self._size = size
+        self._lock = lock
+        self._pos = 0
+
+    def __len__(self):
+        return self._size
+
+    def read(self, size=-1):
+        remaining = self._size - self._pos
+        if size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return ''
+        with self._lock:
+            self._file.seek(self._offset + self._pos)
+            data = self._file.read(size)
+        self._pos += len(data)
+        return data
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            pos += self._pos
+        elif whence == os.SEEK_END:
+            pos += self._size
+        self._pos = pos
+
+
+def _media_size(media):
+    """ The number of bytes to upload from media (a str, bytearray, memoryview or file-like object) """
+    if isinstance(media, (str, bytearray)):
+        return len(media)
+    if isinstance(media, memoryview):
+        return len(media) * media.itemsize
+    try:
+        return os.fstat(media.fileno()).st_size - media.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        pass
+    start = media.tell()
+    media.seek(0, os.SEEK_END)
+    end = media.tell()
+    media.seek(start)
+    return end - start
+
+
+class MediaUploader(object):
+    """
+    Uploads media in segments
+
+    Initialization requires:
+        api = A TwitterApi (e.g. a Tweets instance)... requests go through its transport, rate limiter etc.
+
+    Optional:
+        segment_size = Bytes per APPEND (twitter allows up to 5MB)
+        max_in_flight = The most APPENDs in flight at once
+        max_retries = How many times a failed segment is retried (each round of retries backs off)
+        backoff_base = The first retry round's backoff in seconds... doubled for each round (with jitter)
+        async = How the APPENDs are sent... 'rpc' or 'ndb'
+        sleep = A time.sleep replacement (for tests)
+    """
+    def __init__(self, api, segment_size=1 << 20, max_in_flight=4, max_retries=3, backoff_base=1.0, async='rpc',
+                 sleep=None):
+        self.api = api
+        self.segment_size = segment_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.async = async
+        self.sleep = sleep or time.sleep
+
+    @property
+    def url(self):
+        return self.api.upload_base_url + 'media/upload.json'
+
+    def upload(self, media, media_type, media_category=None, state=None):
+        """
+        Uploads media (a str, bytearray, memoryview of bytes or seekable file-like object from its position)
+            media_type = e.g. 'video/mp4', 'image/gif'
+            media_category = e.g. 'tweet_video', 'tweet_gif'... needed for video processing
+            state = The UploadState of an earlier attempt (MediaUploadError.state) to resume it
+        Returns the media_id_string for Tweets.update(media_ids=...)
+        Raises MediaUploadError
+        """
+        start = None if isinstance(media, (str, bytearray, memoryview)) else media.tell()
+        if state is not None and start is not None and getattr(state, 'start', None) is not None:
+            start = state.start
+            media.seek(start)  # wherever the failed attempt left it
+        total_bytes = _media_size(media)
+        if state is None:
+            state = self._init(total_bytes, media_type, media_category, start)
+        elif state.total_bytes != total_bytes:
+            raise ValueError('The media is {:d} bytes but the upload being resumed was {:d}'.format(
+                total_bytes, state.total_bytes))
+
+        self._append(media, state)
+        if not state.finalized:
+            self._finalize(state)
+        return state.media_id
+
+    def _check(self, response, message, state=None):
+        response = twitter_response(response)
+        if not 200 <= response.status_code < 300:
+            raise MediaUploadError('{:} failed ({:d})'.format(message, response.status_code), response, state)
+        return response
+
+    def _init(self, total_bytes, media_type, media_category, start):
+        api_vars = {
+            'command': 'INIT',
+            'total_bytes': total_bytes,
+            'media_type': media_type,
+        }
+        if media_category is not None:
+            api_vars['media_category'] = media_category
+        response = self._check(self.api.send_request('POST', self.url, post_vars=api_vars), 'INIT')
+        media_id = (response.twitter or {}).get('media_id_string')
+        if not media_id:
+            raise MediaUploadError('INIT returned no media_id', response)
+        return UploadState(media_id, total_bytes, self.segment_size, start)
+
+    def _append(self, media, state):
+        if isinstance(media, (str, bytearray, memoryview)):
+            view = memoryview(media)
+            start = None
+        else:
+            start = media.tell()
+            lock = threading.Lock()
+
+        def segment(index):
+            offset = index * state.segment_size
+            size = min(state.segment_size, state.total_bytes - offset)
+            if start is None:
+                return view[offset:offset + size]  # no copy
+            return _FileSegment(media, start + offset, size, lock)
+
+        try:
+            pending = [index for index in xrange(state.segments) if index not in state.done]
+            attempt = 0
+            while pending:
+                fanout = Fanout(max_in_flight=self.max_in_flight, async=self.async)
+                futures = []
+                for index in pending:
+                    data = segment(index)
+                    api_vars = {
+                        'command': 'APPEND',
+                        'media_id': state.media_id,
+                        'segment_index': index,
+                        'media': {'data': data, 'size': len(data), 'mimetype': 'application/octet-stream'},
+                    }
+                    futures.append((index, fanout.submit(self.api.send_request, 'POST', self.url,
+                                                         post_vars=api_vars, multipart=True)))
+
+                failed = []
+                failure = None
+                for index, future in futures:
+                    try:
+                        response = future.get_result()
+                    except Exception as e:
+                        failed.append(index)
+                        failure = (str(e), None)
+                        continue
+                    if 200 <= response.status_code < 300:
+                        state.done.add(index)
+                    else:
+                        failed.append(index)
+                        failure = ('status {:d}'.format(response.status_code), response)
+
+                if failed and attempt >= self.max_retries:
+                    raise MediaUploadError('APPEND of segment(s) {:} failed: {:}'.format(
+                        ','.join(str(index) for index in failed), failure[0]), failure[1], state)
+                if failed:
+                    backoff = self.backoff_base * (2 ** attempt)
+                    self.sleep(backoff / 2 + random.uniform(0, backoff / 2))
+                    attempt += 1
+                pending = failed
+        except Exception:
+            if start is not None:
+                media.seek(start)  # the segments moved it... a resume starts from here again
+            raise
+
+        if start is not None:
+            media.seek(start + state.total_bytes)  # consumed... like a read() of the whole file
+
+    def _finalize(self, state):
+        response = self._check(self.api.send_request('POST', self.url, post_vars={
+            'command': 'FINALIZE',
+            'media_id': state.media_id,
+        }), 'FINALIZE', state)
+        state.finalized = True
+
+        # Video & GIFs are processed asynchronously... wait until it's done
+        processing = (response.twitter or {}).get('processing_info')
+        while processing and processing.get('state') in ('pending', 'in_progress'):
+            self.sleep(processing.get('check_after_secs', 1))
+            response = self._check(self.api.send_request('GET', self.url, query_vars={
+                'command': 'STATUS',
+                'media_id': state.media_id,
+            }), 'STATUS', state)
+            processing = (response.twitter or {}).get('processing_info')
+        if processing and processing.get('state') == 'failed':
+            raise MediaUploadError('Processing failed: {:}'.format(processing.get('error', {}).get('message')),
+                                   response, state)
@@ -0,0 +1,253 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Builds multipart/form-data request bodies without copying the (potentially large) data parts
+"""
+
+import os
+
+__all__ = [
+    'replayable',
+    'MultipartEncoder',
+]
+
+
+def _is_chunks(data):
+    """ True if data is a chunk iterator (rather than in-memory or file-like data) """
+    return not isinstance(data, (str, bytearray, memoryview)) and not hasattr(data, 'read')
+
+
+def replayable(fields):
+    """
+    True if the fields can be encoded more than once (e.g. to resend them)... a chunk iterator is consumed by
+    the first encoding
+    """
+    return not any(isinstance(val, dict) and _is_chunks(val.get('data')) for val in fields.itervalues())
+
+
+def _data_size(data, size=None):
+    """
+    Returns the number of bytes that will be read from a data part
+    Raises ValueError if the size of a chunk iterator can't be known in advance
+    """
+    if isinstance(data, (str, bytearray)):
+        return len(data)
+    if isinstance(data, memoryview):
+        return len(data) * data.itemsize
+    if size is not None:
+        return size
+    if hasattr(data, 'read'):
+        try:
+            return os.fstat(data.fileno()).st_size - data.tell()
+        except (AttributeError, IOError, OSError, ValueError):
+            pass
+        start = data.tell()
+        data.seek(0, os.SEEK_END)
+        end = data.tell()
+        data.seek(start)
+        return end - start
+    raise ValueError('a "size" is required for chunk iterator data')
+
+
+class MultipartEncoder(object):
+    """
+    A multipart/form-data request body
+
+    Initialization requires:
+        fields = A dict of form fields
+            Ordinary parameters are str, unicode (sent as utf-8) or anything str() can convert
+            Data parameters are dicts containing:
+                'data' = A str, bytearray, memoryview, file-like object (with read()) or an iterable of chunks
+                    (not unicode... a TypeError is raised rather than guessing how to encode it)
+                'filename' = Optional file name (default: '')
+                'mimetype' = Optional content type (default: 'image/jpeg')
+                'encoding' = Optional transfer encoding (default: 'binary')
+                'size' = The number of bytes to send... required for chunk iterables, optional for file-like
+                    objects (default: the rest of the file)
+        boundary = The multipart boundary (without the leading '--')
+
+    The data is never copied until the body is sent (or getvalue() / to_buffer() is called)
+    len(encoder) is the Content-Length of the body
+    File-like data is left at the position it started at so the same media can be encoded again (e.g. on a retry)
+    Chunk iterator data can't be replayed (replayable is False)... a second iter_chunks() / getvalue() / to_buffer()
+    raises ValueError before anything's read & requests with it aren't retried
+    """
+    def __init__(self, fields, boundary):
+        self.boundary = boundary
+        self.content_type = 'multipart/form-data; boundary=' + boundary
+
+        boundary_str = '--' + boundary
+        param_template = boundary_str + '\r\nContent-Disposition: form-data; name="{:}"\r\n\r\n{:}\r\n'
+        data_template = ''.join([
+            boundary_str,
+            '\r\nContent-Disposition: form-data; name="{:}"; filename="{:}"\r\n',
+            'Content-Type: {:}\r\n',
+            'Content-Transfer-Encoding: {:}\r\n\r\n',
+        ])
+
+        # A list of (part, size) where part is either a str or a data object
+        self._parts = []
+        pending = []  # consecutive headers & ordinary parameters are merged into one str part
+
+        for name, val in fields.iteritems():
+            if isinstance(name, unicode):
+                name = name.encode('utf-8')
+
+            # If an ordinary parameter...
+            if not isinstance(val, dict):
+                if isinstance(val, unicode):
+                    val = val.encode('utf-8')
+                elif not isinstance(val, str):
+                    val = str(val)
+                pending.append(param_template.format(name, val))
+            # If a data parameter...
+            else:
+                fname = val.get('filename', '')
+                if isinstance(fname, unicode):
+                    fname = fname.encode('utf-8')
+
+                # The multipart header
+                pending.append(data_template.format(name, fname,
+                                                    val.get('mimetype', 'image/jpeg'),
+                                                    val.get('encoding', 'binary')))
+
+                data = val['data']
+                if isinstance(data, unicode):
+                    # Most likely a file read in text mode... media data is bytes
+                    raise TypeError('data part "{:}" is unicode... encode it (or read it in binary mode)'
+                                    .format(name))
+                size = val.get('size')
+                if _is_chunks(data) and size is None:
+                    # A chunk iterator of unknown size can only be measured by buffering it
+                    data = ''.join(data)
+
+                # The data is kept as its own part so it's never copied into the surrounding headers
+                self._add_str(pending)
+                self._parts.append((data, _data_size(data, size)))
+                pending = ['\r\n']
+
+        pending.append(boundary_str + '--')
+        self._add_str(pending)
+
+        self._length = sum(size for _, size in self._parts)
+
+        # Where each file-like part starts... so the body can be sent again (e.g. on a retry)
+        self._offsets = dict((id(part), part.tell()) for part, _ in self._parts
+                             if hasattr(part, 'read') and hasattr(part, 'tell'))
+
+        self.replayable = not any(_is_chunks(part) for part, _ in self._parts)
+        self._spent = False  # True once a chunk iterator part has been read
+
+        self._reader = None  # the chunk iterator used by read()
+
+    def _add_str(self, strs):
+        if strs:
+            part = strs[0] if len(strs) == 1 else ''.join(strs)
+            self._parts.append((part, len(part)))
+
+    def __len__(self):
+        return self._length
+
+    def _spend(self):
+        """ Marks the chunk iterator parts read... raises ValueError if they already were """
+        if not self.replayable:
+            if self._spent:
+                raise ValueError('chunk iterator data can only be encoded once')
+            self._spent = True
+
+    def _rewind(self, part):
+        offset = self._offsets.get(id(part))
+        if offset is not None:
+            part.seek(offset)
+
+    def _iter_part(self, part, size, chunk_size):
+        if isinstance(part, (str, bytearray, memoryview)):
+            if size <= chunk_size:
+                yield part
+            else:
+                view = part if isinstance(part, memoryview) else memoryview(part)
+                for start in xrange(0, size, chunk_size):
+                    yield view[start:start + chunk_size]
+        elif hasattr(part, 'read'):
+            self._rewind(part)
+            remaining = size
+            while remaining > 0:
+                chunk = part.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise ValueError('file-like data ended {:d} bytes early'.format(remaining))
+                remaining -= len(chunk)
+                yield chunk
+            self._rewind(part)
+        else:
+            remaining = size
+            for chunk in part:
+                remaining -= len(chunk)
+                yield chunk
+            if remaining != 0:
+                raise ValueError('chunk iterator data didn\'t match its "size"')
+
+    def iter_chunks(self, chunk_size=65536):
+        """
+        Yields the body as a sequence of str / bytearray / memoryview chunks of at most "chunk_size" bytes
+        In-memory data is sliced via memoryview so no data is copied
+        """
+        self._spend()
+        return self._iter_chunks(chunk_size)
+
+    def _iter_chunks(self, chunk_size):
+        for part, size in self._parts:
+            for chunk in self._iter_part(part, size, chunk_size):
+                yield chunk
+
+    def read(self, size=65536):
+        """
+        File-like read() so the body can be streamed (e.g. httplib's send() reads blocks from a file-like body)
+        """
+        if size is None or size < 0:
+            return self.getvalue()
+        if self._reader is None:
+            self._reader = self.iter_chunks(max(size, 1))
+        chunk = next(self._reader, None)
+        if chunk is None:
+            self._reader = None
+            return ''
+        if isinstance(chunk, memoryview):
+            return chunk.tobytes()
+        return chunk if isinstance(chunk, str) else str(chunk)
+
+    def to_buffer(self):
+        """
+        Returns the body in a single preallocated bytearray of exactly len(self) bytes
+        """
+        self._spend()
+        buf = bytearray(self._length)
+        view = memoryview(buf)
+        pos = 0
+        for part, size in self._parts:
+            if hasattr(part, 'readinto') and not isinstance(part, (str, bytearray, memoryview)):
+                self._rewind(part)
+                end = pos + size
+                while pos < end:
+                    count = part.readinto(view[pos:end])
+                    if not count:
+                        raise ValueError('file-like data ended {:d} bytes early'.format(end - pos))
+                    pos += count
+                self._rewind(part)
+            else:
+                for chunk in self._iter_part(part, size, 1 << 20):
+                    view[pos:pos + len(chunk)] = chunk
+                    pos += len(chunk)
+        return buf
+
+    def getvalue(self):
+        """
+        Returns the body as a single str (what urlfetch requires)
+        When the data parts are str objects they're copied exactly once
+        """
+        if all(isinstance(part, str) for part, _ in self._parts):
+            return ''.join([part for part, _ in self._parts])
+        return str(self.to_buffer())
@@ -15,35 +15,115 @@ import hashlib
 import hmac
 import base64
 import time
+import os
+import threading
 
 import string
-import random
+
+from multipart import MultipartEncoder
 
 __all__ = [
+    'NonceSource',
+    'NoncePool',
+    'FixedNonce',
     'random_token',
     'percent_encode',
     'percent_encode_dict',
+    'SignedRequest',
     'OAuth1',
+    'PreparedRequest',
 ]
 
 
 ASCII_DIGITS = string.ascii_letters + string.digits
 
-rand = random.SystemRandom()
+# Maps a random byte to an alphanumeric char... bytes >= 248 (62 * 4) are dropped so the mapping isn't biased
+_TOKEN_TABLE = ''.join([ASCII_DIGITS[i % len(ASCII_DIGITS)] for i in range(256)])
+_TOKEN_REJECT = ''.join([chr(i) for i in range(256 - 256 % len(ASCII_DIGITS), 256)])
+
+
+class NonceSource(object):
+    """
+    Interface for the source of the random tokens used as OAuth nonces & multipart boundaries
+    Subclasses implement token(length) which returns an alphanumeric string of "length" chars
+    """
+    def token(self, length):
+        raise NotImplementedError
+
+
+class NoncePool(NonceSource):
+    """
+    Serves random alphanumeric tokens from a pool that's refilled by a single large os.urandom() read
+    The random bytes are mapped to alphanumerics in bulk via str.translate()
+
+    Safe to share between threads and ndb tasklets (the lock is never held across a yield)
+    """
+    def __init__(self, block_size=4096):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._pool = ''
+        self._pos = 0
+        self._pid = None
+
+    def _refill(self):
+        self._pool = os.urandom(self.block_size).translate(_TOKEN_TABLE, _TOKEN_REJECT)
+        self._pos = 0
+        self._pid = os.getpid()
+
+    def token(self, length):
+        """ Returns a random alphanumeric string of "length" chars """
+        with self._lock:
+            # Never hand out the same pool in both the parent & a forked child
+            if self._pid != os.getpid():
+                self._refill()
+
+            chunks = []
+            while length > 0:
+                if self._pos >= len(self._pool):
+                    self._refill()
+                chunk = self._pool[self._pos:self._pos + length]
+                self._pos += len(chunk)
+                length -= len(chunk)
+                chunks.append(chunk)
+            return ''.join(chunks)
+
+
+class FixedNonce(NonceSource):
+    """
+    Always returns the same token... for tests that need a deterministic OAuth signature
+    """
+    def __init__(self, nonce):
+        self.nonce = nonce
+
+    def token(self, length):
+        return self.nonce
+
+
+# The default nonce source shared by all OAuth1 instances
+nonce_pool = NoncePool()
 
 def random_token(length):
     """ Returns a random alphanumeric string of "length" chars """
-    return ''.join([rand.choice(ASCII_DIGITS) for _ in range(length)])
+    return nonce_pool.token(length)
 
 
-dont_percent_encode = dict.fromkeys(bytearray(ASCII_DIGITS + '-._~'), True)
+# Characters that are never percent encoded (RFC 3986 unreserved)
+UNRESERVED_CHARS = ASCII_DIGITS + '-._~'
+
+# Precomputed escape table... maps every byte (as a 1 char str) to its encoded form
+PERCENT_ENCODE_TABLE = dict((chr(i), chr(i) if chr(i) in UNRESERVED_CHARS else '%{:02X}'.format(i))
+                            for i in range(256))
 
 def percent_encode(utf8_str):
     """ Percent (URL) encodes everything except alphanumeric, dash, period, underscore, and tilde """
     if not utf8_str:
         return utf8_str
-    byte_str = bytearray(utf8_str, 'utf-8')
-    return ''.join(map(lambda x: chr(x) if x in dont_percent_encode else '%{:02X}'.format(x), byte_str))
+    if isinstance(utf8_str, unicode):
+        utf8_str = utf8_str.encode('utf-8')
+    # Fast path... nothing left after deleting the unreserved chars means there's nothing to encode
+    if not utf8_str.translate(None, UNRESERVED_CHARS):
+        return utf8_str
+    return ''.join(map(PERCENT_ENCODE_TABLE.__getitem__, utf8_str))
 
 
 def percent_encode_dict(idict):
@@ -52,7 +132,90 @@ def percent_encode_dict(idict):
     if not idict:
         return {}
 
-    return { percent_encode(name): percent_encode(str(val)) for name, val in idict.iteritems() }
+    table_lookup = PERCENT_ENCODE_TABLE.__getitem__
+    odict = {}
+    # One pass over the dict with percent_encode() inlined
+    for name, val in idict.iteritems():
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        if isinstance(val, unicode):
+            val = val.encode('utf-8')
+        elif not isinstance(val, str):
+            val = str(val)
+        if name.translate(None, UNRESERVED_CHARS):
+            name = ''.join(map(table_lookup, name))
+        if val.translate(None, UNRESERVED_CHARS):
+            val = ''.join(map(table_lookup, val))
+        odict[name] = val
+    return odict
+
+
+def _encoded_pairs(enc_vars):
+    """ (name, percent encoded 'name=val') pairs... a pair's share of the encoded signature param string """
+    # An encoded name & val only hold unreserved chars & '%'... so only the '%' & '=' need encoding again
+    return [(name, (name + '=' + val).replace('%', '%25').replace('=', '%3D'))
+            for name, val in enc_vars.iteritems()]
+
+
+def _serialize(ivars, pairs):
+    """
+    Percent encodes ivars into a 'name=val&...' query string/payload in one pass... appending each var's
+    (name, doubly encoded 'name=val') share of the signature base string to pairs along the way
+    """
+    table_lookup = PERCENT_ENCODE_TABLE.__getitem__
+    params = []
+    for name, val in ivars.iteritems():
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        if isinstance(val, unicode):
+            val = val.encode('utf-8')
+        elif not isinstance(val, str):
+            val = str(val)
+        if name.translate(None, UNRESERVED_CHARS):
+            name = ''.join(map(table_lookup, name))
+        if val.translate(None, UNRESERVED_CHARS):
+            val = ''.join(map(table_lookup, val))
+        param = name + '=' + val
+        params.append(param)
+        pairs.append((name, param.replace('%', '%25').replace('=', '%3D')))
+    return '&'.join(params)
+
+
+def _auth_header(fragments, nonce, signature, timestamp):
+    """ The Authorization header from the signing state's fragments... joined at its exact size in one copy """
+    return ''.join([fragments[0], nonce, fragments[1], signature, fragments[2], timestamp, fragments[3]])
+
+
+class SignedRequest(object):
+    """
+    A signed request ready for a transport... unpacks & indexes like a (method, url, payload, headers) tuple
+    but as a __slots__ object there's no per-request tuple or instance dict
+        post_vars = The (unencoded) post vars when TwitterApi signed it... send_signed() invalidates the
+            cache entries they affect
+    """
+    __slots__ = ('method', 'url', 'payload', 'headers', 'post_vars')
+
+    def __init__(self, method, url, payload, headers, post_vars=None):
+        self.method = method
+        self.url = url
+        self.payload = payload
+        self.headers = headers
+        self.post_vars = post_vars
+
+    def __iter__(self):
+        yield self.method
+        yield self.url
+        yield self.payload
+        yield self.headers
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        return (self.method, self.url, self.payload, self.headers)[index]
+
+    def __repr__(self):
+        return 'SignedRequest({!r}, {!r})'.format(self.method, self.url)
 
 
 class OAuth1(object):
@@ -70,8 +233,14 @@ class OAuth1(object):
             Access tokens granted to the application by a user of an OAuth1 service.
             The user may be the application/developer itself or the application may be granted
             access tokens (with a certain level of privilege) by another user
+
+    Optional:
+        nonce_source = A NonceSource for the oauth_nonce & multipart boundaries (default: the shared NoncePool)
+        clock = A function returning the current time in seconds for the oauth_timestamp (default: time.time)
+            Pass FixedNonce('...') and lambda: 1318622958 for deterministic signatures in tests
     """
-    def __init__(self, consumer_key=None, consumer_secret_key=None, access_token=None, access_secret_token=None):
+    def __init__(self, consumer_key=None, consumer_secret_key=None, access_token=None, access_secret_token=None,
+                 nonce_source=None, clock=None):
         self.consumer_key = None
         self.consumer_secret_key = None
         self.access_token = None
@@ -80,6 +249,12 @@ class OAuth1(object):
         self.oauth_version = '1.0'
         self.signature_method = 'HMAC-SHA1'
 
+        self.nonce_source = nonce_source or nonce_pool
+        self.clock = clock or time.time
+
+        # Pre-keyed hmac & percent encoded constant auth params... see _get_signing_state()
+        self._signing_state = None
+
         self.__call__(consumer_key=consumer_key,
                       consumer_secret_key=consumer_secret_key,
                       access_token=access_token,
@@ -95,8 +270,47 @@ class OAuth1(object):
         if access_secret_token is not None:
             self.access_secret_token = access_secret_token
 
+        # The credentials may have changed so the signing state must be rebuilt
+        self._signing_state = None
 
-    def init_request(self, method, url, query_vars=None, post_vars=None, headers=None, multipart=False):
+    def _get_signing_state(self):
+        """
+        Returns the signing state for the current credential set:
+            signer = An hmac object already keyed with the signing key... copy() it before use
+            enc_auth_params = The percent encoded auth params that don't change from request to request
+            auth_pairs = Their sorted (name, doubly encoded 'name=val') shares of the signature base string
+            auth_header = The Authorization header split around the nonce, signature & timestamp (see
+                          _auth_header())
+
+        Built on first use and cached until the credentials are changed via __call__()
+        """
+        if self._signing_state is None:
+            signing_key = '&'.join([
+                percent_encode(self.consumer_secret_key or ''),
+                percent_encode(self.access_secret_token or '')
+            ])
+            enc_auth_params = percent_encode_dict({
+                'oauth_consumer_key': self.consumer_key,
+                'oauth_signature_method': self.signature_method,
+                'oauth_version': self.oauth_version,
+                'oauth_token': self.access_token,
+            })
+            auth_pairs = sorted(_encoded_pairs(enc_auth_params))
+
+            # Every header param but the nonce, signature & timestamp is known... the fragments between them are
+            # joined with those once they are (sorted by name they always come in that order)
+            header_params = dict(enc_auth_params)
+            for name in ('oauth_nonce', 'oauth_signature', 'oauth_timestamp'):
+                header_params[name] = '\0'
+            auth_header = tuple(('OAuth ' + ', '.join(['{:}="{:}"'.format(name, header_params[name])
+                                                       for name in sorted(header_params.keys())])).split('\0'))
+
+            self._signing_state = (hmac.new(signing_key, digestmod=hashlib.sha1), enc_auth_params, auth_pairs,
+                                   auth_header)
+        return self._signing_state
+
+    def init_request(self, method, url, query_vars=None, post_vars=None, headers=None, multipart=False,
+                     stream=False):
         """
         Initializes an OAuth1 HTTP request given:
             method = HTTP method
@@ -104,8 +318,11 @@ class OAuth1(object):
             query_vars = A dict of query string variables (name/value pairs not percent encoded... just the raw values)
             post_vars = A dict of post variables (name/value pairs not percent encoded... just the raw values)
             headers = Optional HTTP headers... the OAuth 'Authorization' header WILL be inserted after making this call
+            multipart = True to POST the post_vars as multipart/form-data (see MultipartEncoder for data parameters)
+            stream = Multipart only... True to return the MultipartEncoder itself as the payload (for transports
+                     that can stream the body) instead of a str
 
-        Returns:
+        Returns a SignedRequest... it unpacks as (method, url, payload, headers):
             method = HTTP method
             url = The request URL with percent encoded query string params
             payload = The POST payload (percent encoded and ready to POST), None if not a POST request
@@ -113,110 +330,147 @@ class OAuth1(object):
         """
         method = method.upper()  # ensure uppercase
 
-        # All the auth params except the signature
-        auth_header_params = {
-            'oauth_consumer_key': self.consumer_key,
-            'oauth_nonce': random_token(42),
-            'oauth_timestamp': str(int(time.time())),
-            'oauth_signature_method': self.signature_method,
-            'oauth_version': self.oauth_version,
-            'oauth_token': self.access_token,
-        }
-        if hasattr(self, 'test_nonce'):
-            auth_header_params['oauth_nonce'] = self.test_nonce
-        if hasattr(self, 'test_timestamp'):
-            auth_header_params['oauth_timestamp'] = self.test_timestamp
-
-        # Percent encoded copies of the request params
-        enc_query_vars = percent_encode_dict(query_vars)
-        if not multipart:
-            enc_post_vars = percent_encode_dict(post_vars)
-        else:
-            enc_post_vars = post_vars  # no encoding with multipart
-        enc_auth_header_params = percent_encode_dict(auth_header_params)
-
-        auth_signature_params = {}
-        auth_signature_params.update(enc_query_vars)
-        if not multipart:
-            auth_signature_params.update(enc_post_vars)
-        auth_signature_params.update(enc_auth_header_params)
-
-        signature_str = '&'.join([
-            method,
-            percent_encode(url),
-            percent_encode(
-                '&'.join([name + '=' + auth_signature_params[name] for name in sorted(auth_signature_params.keys())])
-            )
-        ]).encode('utf-8')
+        signer, _, auth_pairs, auth_header = self._get_signing_state()
+        nonce = percent_encode(self.nonce_source.token(42))
+        timestamp = str(int(self.clock()))
 
-        signing_key = '&'.join([
-            percent_encode(self.consumer_secret_key or ''),
-            percent_encode(self.access_secret_token or '')
-        ])
+        # The signature base string params... the constant auth params are already encoded & sorted
+        pairs = list(auth_pairs)
+        pairs.append(('oauth_nonce', 'oauth_nonce%3D' + nonce))
+        pairs.append(('oauth_timestamp', 'oauth_timestamp%3D' + timestamp))
 
-        oauth_signature = base64.b64encode(hmac.new(signing_key, signature_str, hashlib.sha1).digest())
-
-        auth_header_params['oauth_signature'] = percent_encode(oauth_signature)
+        # Each var is encoded once into the query string/payload and its share of the signature at the same time
+        query = _serialize(query_vars, pairs) if query_vars else None
+        if post_vars and not multipart:
+            payload = _serialize(post_vars, pairs)
+        else:
+            payload = None  # multipart post vars aren't signed
 
-        auth_header = ', '.join(['{:}="{:}"'.format(name, auth_header_params[name])
-                                 for name in sorted(auth_header_params.keys())])
+        pairs.sort()
+        signer = signer.copy()
+        signer.update('&'.join([method, percent_encode(url), '%26'.join([pair[1] for pair in pairs])]))
+        oauth_signature = percent_encode(base64.b64encode(signer.digest()))
 
         if headers is None:
             headers = {}
-        headers['Authorization'] = 'OAuth ' + auth_header
+        headers['Authorization'] = _auth_header(auth_header, nonce, oauth_signature, timestamp)
 
-        if query_vars:
-            url += '?' + '&'.join([name + '=' + val for name, val in enc_query_vars.iteritems()])
+        if query:
+            url += '?' + query
 
-        if post_vars:
-            if not multipart:
-                payload = '&'.join([name + '=' + val for name, val in enc_post_vars.iteritems()])
+        if post_vars and multipart:
+            encoder = MultipartEncoder(post_vars, '=====' + self.nonce_source.token(42) + '=====')
+            headers['Content-Type'] = encoder.content_type
+            if stream:
+                headers['Content-Length'] = str(len(encoder))
+                payload = encoder
             else:
-                boundary_str = '=====' + random_token(42) + '====='
-                headers['Content-Type'] = 'multipart/form-data; boundary=' + boundary_str
-
-                boundary_str = '--' + boundary_str
-                param_template = boundary_str + '\r\nContent-Disposition: form-data; name="{:}"\r\n\r\n{:}\r\n'
-                data_template = ''.join([
-                    boundary_str,
-                    '\r\nContent-Disposition: form-data; name="{:}"; filename="{:}"\r\n',
-                    'Content-Type: {:}\r\n',
-                    'Content-Transfer-Encoding: {:}\r\n\r\n',
-                ])
-                payload_data = []
-
-                for name, val in enc_post_vars.iteritems():
-                    # If an ordinary parameter...
-                    if not isinstance(val, dict):
-                        payload_data.append(param_template.format(name, val))
-                    # If a data parameter...
-                    else:
-                        if 'filename' in val:
-                            fname = val['filename']
-                        else:
-                            fname = ''
-
-                        if 'mimetype' in val:
-                            mimetype = val['mimetype']
-                        else:
-                            mimetype = 'image/jpeg'
-
-                        if 'encoding' in val:
-                            encoding = val['encoding']
-                        else:
-                            encoding = 'binary'
-
-                        # The multipart header
-                        payload_data.append(data_template.format(name, fname, mimetype, encoding))
-
-                        # Append the data
-                        payload_data.append(val['data'])
-                        payload_data.append('\r\n')
-
-                payload_data.append(boundary_str + '--')
-                payload = ''.join(payload_data)
+                payload = encoder.getvalue()
+
+        return SignedRequest(method, url, payload, headers)
 
+    def prepare(self, method, url, query_vars=None, post_vars=None):
+        """
+        Returns a PreparedRequest... the fixed parts of a request that's signed over and over (polling)
+        are encoded once and each sign() only encodes the vars that change (not for multipart)
+        """
+        return PreparedRequest(self, method, url, query_vars, post_vars)
+
+
+class PreparedRequest(object):
+    """
+    A request with fixed vars... see OAuth1.prepare()
+
+    The method, encoded url, the sorted & (doubly) encoded fixed params of the signature base string, the
+    query string, payload and an Authorization header template are built once. sign() encodes the vars that
+    change (plus the nonce & timestamp), merges them into the sorted params and signs.
+    A var passed to sign() replaces a fixed var of the same name.
+    """
+    def __init__(self, oauth, method, url, query_vars=None, post_vars=None):
+        self.oauth = oauth
+        self.method = method.upper()
+        self.url = url
+        self.query_vars = dict(query_vars or {})
+        self.post_vars = dict(post_vars or {})
+        self._signing_state = None
+
+    def _prepare(self):
+        signing_state = self.oauth._get_signing_state()
+
+        self._enc_query_vars = percent_encode_dict(self.query_vars)
+        self._enc_post_vars = percent_encode_dict(self.post_vars)
+        self._pairs = sorted(signing_state[2] + _encoded_pairs(self._enc_query_vars) +
+                             _encoded_pairs(self._enc_post_vars))
+        self._names = frozenset(self._enc_query_vars) | frozenset(self._enc_post_vars)
+
+        self._base_prefix = self.method + '&' + percent_encode(self.url) + '&'
+        self._query = '&'.join([name + '=' + val for name, val in self._enc_query_vars.iteritems()])
+        self._payload = '&'.join([name + '=' + val for name, val in self._enc_post_vars.iteritems()])
+        self._signing_state = signing_state
+
+    def all_query_vars(self, query_vars=None):
+        """ The fixed query vars updated with query_vars """
+        if not query_vars:
+            return self.query_vars
+        all_vars = dict(self.query_vars)
+        all_vars.update(query_vars)
+        return all_vars
+
+    def all_post_vars(self, post_vars=None):
+        """ The fixed post vars updated with post_vars """
+        if not post_vars:
+            return self.post_vars
+        all_vars = dict(self.post_vars)
+        all_vars.update(post_vars)
+        return all_vars
+
+    def sign(self, query_vars=None, post_vars=None):
+        """
+        Signs the request with query_vars & post_vars (raw values) merged into the fixed vars
+        Returns a SignedRequest like OAuth1.init_request()
+        """
+        oauth = self.oauth
+        if self._signing_state is not oauth._get_signing_state():
+            self._prepare()  # first use or the credentials changed
+
+        nonce = percent_encode(oauth.nonce_source.token(42))
+        timestamp = str(int(oauth.clock()))
+
+        pairs = self._pairs
+        query = self._query
+        payload = self._payload
+        if query_vars or post_vars:
+            enc_query_vars = percent_encode_dict(query_vars)
+            enc_post_vars = percent_encode_dict(post_vars)
+            if not self._names.isdisjoint(enc_query_vars) or not self._names.isdisjoint(enc_post_vars):
+                # Replaces some fixed vars... drop them (still no re-encoding)
+                replaced = frozenset(enc_query_vars) | frozenset(enc_post_vars)
+                pairs = [pair for pair in pairs if pair[0] not in replaced]
+                query = '&'.join([name + '=' + val for name, val in self._enc_query_vars.iteritems()
+                                  if name not in replaced])
+                payload = '&'.join([name + '=' + val for name, val in self._enc_post_vars.iteritems()
+                                    if name not in replaced])
+            pairs = pairs + _encoded_pairs(enc_query_vars) + _encoded_pairs(enc_post_vars)
+            if enc_query_vars:
+                query = '&'.join(([query] if query else []) +
+                                 [name + '=' + val for name, val in enc_query_vars.iteritems()])
+            if enc_post_vars:
+                payload = '&'.join(([payload] if payload else []) +
+                                   [name + '=' + val for name, val in enc_post_vars.iteritems()])
         else:
-            payload = None
+            pairs = list(pairs)
 
-        return method, url, payload, headers
+        # The fixed pairs are already sorted... timsort merges the few new ones in ~linear time
+        pairs.append(('oauth_nonce', 'oauth_nonce%3D' + nonce))
+        pairs.append(('oauth_timestamp', 'oauth_timestamp%3D' + timestamp))
+        pairs.sort()
+
+        signer = self._signing_state[0].copy()
+        signer.update(self._base_prefix + '%26'.join([pair[1] for pair in pairs]))
+        signature = percent_encode(base64.b64encode(signer.digest()))
+
+        headers = {
+            'Authorization': _auth_header(self._signing_state[3], nonce, signature, timestamp),
+        }
+        url = self.url + '?' + query if query else self.url
+        return SignedRequest(self.method, url, payload or None, headers)
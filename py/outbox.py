@@ -0,0 +1,536 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+A durable outbound queue of tweets... queued tweets are delivered (and retried) by background workers
+and survive process restarts
+
+    outbox = Outbox(tweets, SqliteStore('outbox.db')).start()
+    outbox.put(PublishJob('Just listed... vintage road bike'))  # returns once it's safely stored
+    ...
+    outbox.close()
+
+put()s that arrive within commit_window of each other are stored with a single commit (group commit) so
+concurrent producers share one fsync. A job is only sent once it's stored and its outcome is stored the same
+way. Jobs whose key is already in the store (queued, or delivered/failed within keep_done) aren't queued again.
+
+A job that was sent but whose outcome wasn't stored (the process died) is sent again after a restart...
+twitter answers "Status is a duplicate" if the earlier attempt got through and that counts as delivered.
+
+The stores need a writable filesystem so they're for App Engine's flexible environment/backends or
+anywhere else (not the standard environment's read-only filesystem).
+"""
+
+import base64
+import cPickle as pickle
+import heapq
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from preflight import PreflightError
+from publish import PublishJob, PublishResult
+from transports import not_sent, WorkerPool
+
+__all__ = [
+    'OutboxStore',
+    'SqliteStore',
+    'JournalStore',
+    'Outbox',
+]
+
+
+PENDING = 'pending'
+DELIVERED = 'delivered'
+FAILED = 'failed'
+
+EXPIRE_INTERVAL = 60.0  # the most often finished jobs are expired (seconds)
+
+
+class OutboxStore(object):
+    """
+    Interface for where an Outbox keeps its jobs. Each job is a key, its pickled PublishJob (data), a state
+    ('pending', 'delivered' or 'failed') and the number of attempts so far.
+    Only ever called from one thread at a time.
+    """
+    def load(self):
+        """ Returns the (key, data, attempts) of every pending job, oldest first """
+        raise NotImplementedError
+
+    def commit(self, adds, updates):
+        """
+        Durably stores, in one go:
+            adds = (key, data) of new jobs... keys already in the store (in any state) are ignored
+            updates = (key, state, attempts) of jobs that were attempted
+        Returns the set of keys that were added
+        """
+        raise NotImplementedError
+
+    def expire(self, before):
+        """
+        Removes the delivered & failed jobs whose outcome was stored before the time before (seconds since the
+        epoch) so their keys can be queued again. Returns the number removed
+        """
+        raise NotImplementedError
+
+    def counts(self):
+        """ Returns a dict of state -> the number of jobs in that state """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SqliteStore(OutboxStore):
+    """
+    Keeps jobs in an SQLite database (WAL mode)... each commit() is one transaction
+
+    Initialization requires:
+        path = The database file
+
+    Optional:
+        synchronous = SQLite's synchronous pragma... 'FULL' (every commit survives a power loss) or 'NORMAL'
+                      (faster, the last commits can be lost on a power loss but not on a crash)
+
+    Delivered & failed jobs are kept (without a delivered job's data) until they're expired
+    """
+    def __init__(self, path, synchronous='FULL'):
+        import sqlite3  # not available on App Engine's standard environment
+
+        self._sqlite3 = sqlite3
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=' + synchronous)
+        self._db.execute('CREATE TABLE IF NOT EXISTS outbox ('
+                         'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'key TEXT NOT NULL UNIQUE, '
+                         'state TEXT NOT NULL, '
+                         'attempts INTEGER NOT NULL, '
+                         'data BLOB, '
+                         'done_at REAL)')
+        if 'done_at' not in [column[1] for column in self._db.execute('PRAGMA table_info(outbox)')]:
+            # A database from before jobs expired... its finished jobs expire as if they just finished
+            self._db.execute('ALTER TABLE outbox ADD COLUMN done_at REAL')
+            self._db.execute('UPDATE outbox SET done_at = ? WHERE state != ?', (time.time(), PENDING))
+        self._db.execute('CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state, seq)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS outbox_done ON outbox (done_at)')
+
+    def load(self):
+        rows = self._db.execute('SELECT key, data, attempts FROM outbox WHERE state = ? ORDER BY seq', (PENDING,))
+        return [(key, str(data), attempts) for key, data, attempts in rows]
+
+    def commit(self, adds, updates):
+        added = set()
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            for key, data in adds:
+                cursor = self._db.execute('INSERT OR IGNORE INTO outbox (key, state, attempts, data) '
+                                          'VALUES (?, ?, 0, ?)', (key, PENDING, self._sqlite3.Binary(data)))
+                if cursor.rowcount:
+                    added.add(key)
+            # A delivered job's data is never needed again
+            now = time.time()
+            self._db.executemany('UPDATE outbox SET state = ?, attempts = ?, '
+                                 'data = CASE WHEN ? THEN NULL ELSE data END, done_at = ? WHERE key = ?',
+                                 [(state, attempts, state == DELIVERED, now if state != PENDING else None, key)
+                                  for key, state, attempts in updates])
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        return added
+
+    def expire(self, before):
+        return self._db.execute('DELETE FROM outbox WHERE done_at < ?', (before,)).rowcount
+
+    def counts(self):
+        return dict(self._db.execute('SELECT state, COUNT(*) FROM outbox GROUP BY state'))
+
+    def close(self):
+        self._db.close()
+
+
+class JournalStore(OutboxStore):
+    """
+    Keeps jobs in an append-only journal file... each commit() is one write & one fsync
+    The journal is replayed into memory when opened and compacted (rewritten with one line per job) once
+    it's mostly superseded lines.
+
+    Initialization requires:
+        path = The journal file
+
+    Optional:
+        fsync = False to leave flushing to the OS (faster, the last commits can be lost on a power loss but
+                not on a crash)
+        compact_lines = Don't bother compacting a journal with fewer lines than this
+
+    Delivered & failed jobs are kept (without a delivered job's data) until they're expired... expired jobs
+    leave the journal when it's next compacted
+    """
+    def __init__(self, path, fsync=True, compact_lines=10000):
+        self.path = path
+        self.fsync = fsync
+        self.compact_lines = compact_lines
+        self._jobs = OrderedDict()  # key -> [state, attempts, data, done_at]
+        self._lines = 0
+        if os.path.exists(path):
+            self._replay()
+        self._file = open(path, 'ab')
+        self._compact_if_needed()
+
+    def _replay(self):
+        with open(self.path, 'r+b') as f:
+            while True:
+                end = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.endswith('\n'):
+                    # A torn last line from a crash mid write... that commit never completed
+                    f.truncate(end)
+                    break
+                fields = json.loads(line)
+                key, state, attempts, data = fields[:4]
+                done_at = fields[4] if len(fields) > 4 else None  # None in journals from before jobs expired
+                self._apply(key, state, attempts, base64.b64decode(data) if data is not None else None, done_at)
+                self._lines += 1
+
+    def _apply(self, key, state, attempts, data, done_at):
+        if state != PENDING and done_at is None:
+            done_at = time.time()
+        job = self._jobs.get(key)
+        if job is None:
+            self._jobs[key] = [state, attempts, data, done_at]
+        else:
+            job[0] = state
+            job[1] = attempts
+            job[3] = done_at
+            if state == DELIVERED:
+                job[2] = None
+            elif data is not None:
+                job[2] = data  # queued again after its key expired
+
+    @staticmethod
+    def _line(key, state, attempts, data, done_at):
+        return json.dumps([key, state, attempts, base64.b64encode(data) if data is not None else None,
+                           done_at]) + '\n'
+
+    def _write(self, f, lines):
+        f.write(''.join(lines))
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def load(self):
+        return [(key, job[2], job[1]) for key, job in self._jobs.iteritems() if job[0] == PENDING]
+
+    def commit(self, adds, updates):
+        added = set()
+        lines = []
+        for key, data in adds:
+            if key not in self._jobs:
+                self._jobs[key] = [PENDING, 0, data, None]
+                lines.append(self._line(key, PENDING, 0, data, None))
+                added.add(key)
+        now = time.time()
+        for key, state, attempts in updates:
+            done_at = now if state != PENDING else None
+            self._apply(key, state, attempts, None, done_at)
+            lines.append(self._line(key, state, attempts, None, done_at))
+        if lines:
+            self._write(self._file, lines)
+            self._lines += len(lines)
+            self._compact_if_needed()
+        return added
+
+    def _compact_if_needed(self):
+        if self._lines < self.compact_lines or self._lines < 2 * len(self._jobs):
+            return
+        # Write the compacted journal aside & swap it in... a crash leaves either the old or the new one
+        compacted = self.path + '.compact'
+        with open(compacted, 'wb') as f:
+            self._write(f, [self._line(key, *job) for key, job in self._jobs.iteritems()])
+        self._file.close()
+        os.rename(compacted, self.path)
+        self._file = open(self.path, 'ab')
+        self._lines = len(self._jobs)
+
+    def expire(self, before):
+        expired = [key for key, job in self._jobs.iteritems() if job[3] is not None and job[3] < before]
+        for key in expired:
+            del self._jobs[key]
+        if expired:
+            self._compact_if_needed()
+        return len(expired)
+
+    def counts(self):
+        counts = {}
+        for job in self._jobs.itervalues():
+            counts[job[0]] = counts.get(job[0], 0) + 1
+        return counts
+
+    def close(self):
+        self._file.close()
+
+
+def _check_media(media):
+    """ Raises a TypeError if a job's media can't be stored (pickled) """
+    if media is not None and not isinstance(media.get('data'), (str, bytearray)):
+        raise TypeError('An Outbox stores its jobs so their media data must be a str, not {:}... read it first'
+                        .format(type(media.get('data')).__name__))
+
+
+class _Put(object):
+    """ A job waiting for the next commit """
+    def __init__(self, job):
+        self.job = job
+        self.key = job.key
+        self.data = pickle.dumps(job, pickle.HIGHEST_PROTOCOL)
+        self.committed = threading.Event()
+        self.added = False
+        self.error = None
+
+
+class _Entry(object):
+    """ A stored job waiting to be delivered """
+    def __init__(self, key, job, attempts):
+        self.key = key
+        self.job = job
+        self.attempts = attempts
+
+
+class Outbox(object):
+    """
+    Delivers queued tweets with a pool of worker threads through the tweets' send_request() (so its
+    transport, rate limiter, credential pool etc. all apply)
+
+    Initialization requires:
+        tweets = A Tweets instance
+        store = An OutboxStore e.g. SqliteStore('outbox.db') or JournalStore('outbox.journal')
+
+    Optional:
+        workers = The most tweets being sent at once
+        max_retries = How many times a job that got a 429 response (or whose request failed before it was sent
+                      see transports.not_sent()) is retried before it's marked failed (retries are remembered
+                      across restarts)... a 5xx or a failure after the request was sent marks it failed as the
+                      tweet may have been published
+        backoff_base = The first retry's backoff in seconds... doubled for each retry (with jitter)
+        max_backoff = The longest backoff in seconds
+        on_result = A function(PublishResult) called (from a worker thread) once a job is delivered or failed
+        keep_done = How long (seconds) a delivered or failed job is kept... a job with its key isn't queued
+                    again until then (None keeps them forever)
+        commit_window = How long (seconds) a commit waits for more puts & outcomes to store with it
+    """
+    def __init__(self, tweets, store, workers=4, max_retries=5, backoff_base=1.0, max_backoff=300.0,
+                 on_result=None, keep_done=86400.0, commit_window=0.002):
+        self.tweets = tweets
+        self.store = store
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.on_result = on_result
+        self.keep_done = keep_done
+        self.commit_window = commit_window
+        self.commits = 0
+        self._next_expire = 0
+        self._pool = WorkerPool(workers)
+        self._cond = threading.Condition()
+        self._store_lock = threading.Lock()
+        self._puts = []
+        self._outcomes = []  # (key, state, attempts) waiting for the next commit
+        self._ready = deque()  # stored _Entrys waiting for a worker
+        self._retries = []  # heap of (not_before, seq, _Entry)
+        self._seq = 0
+        self._in_flight = 0
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        """ Loads the jobs a previous run left pending & starts delivering... returns self """
+        with self._cond:
+            if self._thread is not None:
+                return self
+            for key, data, attempts in self.store.load():
+                self._ready.append(_Entry(key, pickle.loads(data), attempts))
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def put(self, job):
+        """
+        Queues job (a PublishJob or a dict of its args)... returns once it's stored
+        Its media data must be a str (a file or chunk iterator raises a TypeError... jobs are stored pickled)
+        Returns False (and doesn't queue it) if a job with the same key is already in the store (pending or
+        finished within keep_done)
+        """
+        return self.put_many([job])[0]
+
+    def put_many(self, jobs):
+        """ Queues every job (stored together)... returns a list of put() results in the same order """
+        puts = []
+        for job in jobs:
+            if isinstance(job, dict):
+                _check_media(job.get('media'))
+                job = PublishJob(**job)
+            else:
+                _check_media(job.media)
+            puts.append(_Put(job))
+        self.start()
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError('The outbox is stopped')
+            self._puts.extend(puts)
+            self._cond.notify_all()
+        for put in puts:
+            put.committed.wait()
+            if put.error is not None:
+                raise put.error
+        return [put.added for put in puts]
+
+    def counts(self):
+        """ Returns a dict of state ('pending', 'delivered', 'failed') -> the number of jobs in the store """
+        with self._store_lock:
+            return self.store.counts()
+
+    def drain(self, timeout=None):
+        """ Waits until every queued job is delivered or failed... returns False if timeout seconds passed first """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            while self._puts or self._outcomes or self._ready or self._retries or self._in_flight:
+                remaining = deadline - time.time() if deadline is not None else 1.0
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 1.0))
+        return True
+
+    def stop(self):
+        """
+        Stops delivering once the tweets being sent are done (their outcomes are stored)... the jobs that are
+        still pending are delivered by the next Outbox started on the store (e.g. after a restart)
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def close(self):
+        """ stop() & closes the store """
+        self.stop()
+        self.store.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._puts or self._outcomes):
+                    if self._stopping:
+                        if not self._in_flight:
+                            self._cond.notify_all()
+                            return
+                    elif self._dispatchable():
+                        break
+                    self._cond.wait(self._wait_time())
+                if self.commit_window and (self._puts or self._outcomes):
+                    # Let more puts & outcomes queue up for this commit
+                    deadline = time.time() + self.commit_window
+                    while not self._stopping:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                puts, self._puts = self._puts, []
+                outcomes, self._outcomes = self._outcomes, []
+
+            if puts or outcomes:
+                # Everything that queued up meanwhile goes in one commit (group commit)... outside of the lock
+                # so puts & outcomes keep queuing up for the next one
+                try:
+                    with self._store_lock:
+                        if puts and self.keep_done is not None and time.time() >= self._next_expire:
+                            # Before the adds... an expired key can be queued again
+                            self.store.expire(time.time() - self.keep_done)
+                            self._next_expire = time.time() + min(self.keep_done, EXPIRE_INTERVAL)
+                        added = self.store.commit([(put.key, put.data) for put in puts], outcomes)
+                    self.commits += 1
+                except Exception as e:
+                    added = set()
+                    for put in puts:
+                        put.error = e
+                    with self._cond:
+                        self._outcomes[:0] = outcomes  # try them again with the next commit
+
+            with self._cond:
+                for put in puts:
+                    if put.key in added:
+                        added.discard(put.key)  # only the first of the same key in this commit
+                        put.added = True
+                        self._ready.append(_Entry(put.key, put.job, 0))
+                    put.committed.set()
+                if not self._stopping:
+                    self._dispatch()
+                self._cond.notify_all()
+
+    def _dispatchable(self):
+        if self._in_flight >= self.workers:
+            return False
+        return bool(self._ready) or bool(self._retries and self._retries[0][0] <= time.time())
+
+    def _wait_time(self):
+        if self._retries and self._in_flight < self.workers and not self._stopping:
+            return max(self._retries[0][0] - time.time(), 0.001)
+        return None
+
+    def _dispatch(self):
+        now = time.time()
+        while self._retries and self._retries[0][0] <= now:
+            self._ready.append(heapq.heappop(self._retries)[2])
+        while self._ready and self._in_flight < self.workers:
+            self._in_flight += 1
+            self._pool.submit(self._deliver, self._ready.popleft())
+
+    def _deliver(self, entry):
+        job = entry.job
+        result = PublishResult(job)
+        result.attempts = entry.attempts + 1
+        try:
+            if job.media is not None:
+                response = self.tweets.update_with_media(job.status, job.media, **job.params)
+            else:
+                response = self.tweets.update(job.status, **job.params)
+        except PreflightError as e:
+            result.error = e
+            retry = False  # it'll never pass... nothing was sent
+        except Exception as e:
+            result.error = e
+            retry = not_sent(e)
+        else:
+            retry = result.record(response)
+
+        if result.ok:
+            state = DELIVERED
+        elif retry and result.attempts <= self.max_retries:
+            state = PENDING
+        else:
+            state = FAILED
+
+        with self._cond:
+            self._in_flight -= 1
+            self._outcomes.append((entry.key, state, result.attempts))
+            if state == PENDING:
+                entry.attempts = result.attempts
+                backoff = min(self.backoff_base * (2 ** (result.attempts - 1)), self.max_backoff)
+                self._seq += 1
+                heapq.heappush(self._retries, (time.time() + backoff / 2 + random.uniform(0, backoff / 2),
+                                               self._seq, entry))
+            self._cond.notify_all()
+
+        if state != PENDING and self.on_result is not None:
+            self.on_result(result)
@@ -0,0 +1,78 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Walks paginated twitter API results one item at a time... the next page is fetched while the caller
+consumes the current one and earlier pages aren't kept
+"""
+
+from twitterapi import TwitterError, twitter_response
+
+__all__ = [
+    'iter_items',
+    'search_next_params',
+    'cursor_next_params',
+]
+
+
+def search_next_params(params, twitter):
+    """ The params of the next (older) search/tweets page... None after the last page """
+    statuses = twitter.get('statuses') if isinstance(twitter, dict) else None
+    if not statuses:
+        return None
+    return dict(params, max_id=str(min(int(status['id_str']) for status in statuses) - 1))
+
+
+def cursor_next_params(params, twitter):
+    """ The params of the next page of a cursored endpoint (e.g. statuses/retweeters/ids)... None after the last """
+    cursor = twitter.get('next_cursor_str') if isinstance(twitter, dict) else None
+    if not cursor or cursor == '0':
+        return None
+    return dict(params, cursor=cursor)
+
+
+def iter_items(fetch, params, items_of, next_params, max_items=None, max_pages=None, prefetch=True):
+    """
+    Yields every item of every page
+        fetch = A TwitterApi request method e.g. tweets.search... called as fetch(async='rpc', **params)
+        params = The first page's params
+        items_of = Returns the list of items in a page's decoded response
+        next_params = Returns the next page's params given (params, decoded response)... None after the last page
+        max_items, max_pages = Stop after this many items / pages (default: no limit)
+        prefetch = False to only request a page once the previous one has been consumed
+
+    Raises TwitterError if a page request fails
+    """
+    pages = 0
+    count = 0
+    rpc = fetch(async='rpc', **params) if max_pages != 0 and max_items != 0 else None
+
+    while rpc is not None:
+        response = twitter_response(rpc.get_result())
+        rpc = None
+        pages += 1
+        if response.status_code != 200:
+            raise TwitterError('page {:d} failed with status {:}'.format(pages, response.status_code), response)
+
+        twitter = response.twitter
+        items = items_of(twitter) or []
+        params = next_params(params, twitter)
+        del response, twitter  # only the items of the current page are kept
+
+        more = (params is not None and (max_pages is None or pages < max_pages) and
+                (max_items is None or count + len(items) < max_items))
+        if more and prefetch:
+            rpc = fetch(async='rpc', **params)
+
+        for item in items:
+            yield item
+            count += 1
+            if max_items is not None and count >= max_items:
+                return
+        del items
+
+        if more and not prefetch:
+            rpc = fetch(async='rpc', **params)
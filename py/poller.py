@@ -0,0 +1,410 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Polls many search terms for new tweets with as few search/tweets requests as possible
+
+    poller = Poller(tweets, store=JsonFileStore('poller.json'))
+    poller.subscribe('road bike', on_tweets, lang='en')  # on_tweets(term, statuses)
+    poller.subscribe('#fixie', on_tweets, lang='en')
+    poller.poll()  # e.g. from a cron handler... polls the queries that are due
+
+Each term keeps a since_id high-water mark (persisted in the store) so only tweets newer than the last ones
+seen are fetched. Terms with the same search params are merged into OR queries (up to 500 chars) and each
+tweet in the results is handed to the terms it matches. Every term's tweet rate is tracked and a query is
+polled about as often as it takes to collect target_per_poll new tweets (between min & max_interval).
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from fanout import Fanout
+from pagination import iter_items, search_next_params
+
+__all__ = [
+    'SinceIdStore',
+    'MemoryStore',
+    'JsonFileStore',
+    'BackendStore',
+    'Poller',
+]
+
+
+MAX_QUERY_LENGTH = 500  # search/tweets q limit (chars, including the ORs)
+TWEPOCH = 1288834974657  # ms... tweet ids (snowflakes) are (ms since this) << 22
+
+# A single word, #hashtag, @mention, $cashtag or "quoted phrase"... the terms that can be ORed with others
+_MERGEABLE = re.compile(r'^(?:[#@$]?\w+|"[^"]+")$', re.UNICODE)
+_SPACES = re.compile(r'\s+', re.UNICODE)
+
+
+class SinceIdStore(object):
+    """
+    Interface for where the poller's marks are persisted... a dict of term key -> [since_id, rate, polled]
+    (all json friendly). Subclass it for e.g. the datastore.
+    """
+    def load(self):
+        """ Returns the saved marks dict ({} if nothing's been saved) """
+        raise NotImplementedError
+
+    def save(self, marks):
+        """ Saves the marks dict (replacing whatever was saved before) """
+        raise NotImplementedError
+
+
+class MemoryStore(SinceIdStore):
+    """ Keeps the marks in the process... they're lost when it stops """
+    def __init__(self):
+        self._marks = {}
+
+    def load(self):
+        return dict(self._marks)
+
+    def save(self, marks):
+        self._marks = dict(marks)
+
+
+class JsonFileStore(SinceIdStore):
+    """
+    Keeps the marks in a json file... replaced atomically (write then rename) on each save
+
+    Initialization requires:
+        path = The file (created by the first save)
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return json.load(f)
+        except IOError:
+            return {}
+
+    def save(self, marks):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            json.dump(marks, f, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.path)
+
+
+class BackendStore(SinceIdStore):
+    """
+    Keeps the marks under one key of a memcache-style client (get & set)... e.g. App Engine's memcache,
+    where an evicted entry just means the terms start over from their newest tweets
+
+    Initialization requires:
+        backend = The client
+
+    Optional:
+        key = The key the marks are stored under
+    """
+    def __init__(self, backend, key='twittergae:poller'):
+        self.backend = backend
+        self.key = key
+
+    def load(self):
+        marks = self.backend.get(self.key)
+        return json.loads(marks) if marks else {}
+
+    def save(self, marks):
+        self.backend.set(self.key, json.dumps(marks, sort_keys=True))
+
+
+def _term_key(term, search_vars):
+    """ The store key of a term & its search params """
+    return json.dumps([term, sorted(search_vars.items())])
+
+
+def _id_time(id):
+    """ When the tweet with id was posted (time.time() seconds) """
+    return ((id >> 22) + TWEPOCH) / 1000.0
+
+
+def _normalize(text):
+    return _SPACES.sub(' ', text).strip().lower()
+
+
+def _searchable(status):
+    """ The (lowercase) text a tweet is matched against... its text, user & expanded urls (retweets' too) """
+    parts = []
+    while status:
+        parts.append(status.get('full_text') or status.get('text') or u'')
+        user = status.get('user') or {}
+        parts.append(user.get('screen_name') or u'')
+        parts.append(user.get('name') or u'')
+        for url in (status.get('entities') or {}).get('urls') or ():
+            parts.append(url.get('expanded_url') or u'')
+        quoted = status.get('quoted_status')
+        if quoted:
+            parts.append(_searchable(quoted))
+        status = status.get('retweeted_status')
+    return _normalize(u' '.join(parts))
+
+
+class _Term(object):
+    """ A subscribed term... its mark & subscribers """
+    __slots__ = ('term', 'search_vars', 'key', 'pattern', 'since_id', 'rate', 'polled', 'callbacks')
+
+    def __init__(self, term, search_vars):
+        self.term = term
+        self.search_vars = search_vars
+        self.key = _term_key(term, search_vars)
+        words = term[1:-1] if term.startswith('"') else term
+        self.pattern = re.compile(r'(?<!\w)' + re.escape(_normalize(words)) + r'(?!\w)', re.UNICODE)
+        self.since_id = None  # the newest tweet id handed to its subscribers (int)
+        self.rate = None  # tweets/second
+        self.polled = None
+        self.callbacks = []
+
+    def matches(self, text):
+        return self.pattern.search(text) is not None
+
+
+class _Query(object):
+    """ Terms merged into one search """
+    __slots__ = ('terms', 'q', 'search_vars')
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.q = u' OR '.join([term.term for term in terms])
+        self.search_vars = terms[0].search_vars
+
+
+def _statuses_of(twitter):
+    return (twitter.get('statuses') if isinstance(twitter, dict) else None) or []
+
+
+def _next_params(params, twitter, paging):
+    """
+    search_next_params() while twitter says there are more (older) results since the mark... paging['more']
+    is whether the last page fetched had more
+    """
+    paging['more'] = bool((twitter.get('search_metadata') or {}).get('next_results')) and bool(_statuses_of(twitter))
+    return search_next_params(params, twitter) if paging['more'] else None
+
+
+class Poller(object):
+    """
+    Polls subscribed search terms for new tweets
+
+    Initialization requires:
+        tweets = A Tweets instance
+
+    Optional:
+        store = A SinceIdStore for the marks (default: a MemoryStore)
+        min_interval, max_interval = Seconds between polls of a query... a term that's never been polled is
+            polled right away, one with no tweets yet every max_interval
+        target_per_poll = New tweets a query should find per poll (the interval follows its terms' rates)
+        count = Tweets per page (up to 100)
+        max_pages = The most pages fetched per query per poll... a busier query skips its oldest new tweets
+        max_in_flight = Queries fetched at once
+        clock = A time.time replacement (for tests)
+
+    A tweet matching none of its query's terms locally (twitter matched something the tweet json doesn't
+    show) is handed to every term of the query. A query whose search (or a subscriber) raises doesn't stop
+    the others... poll() raises the first exception after the marks are saved.
+    """
+    def __init__(self, tweets, store=None, min_interval=60, max_interval=3600, target_per_poll=50, count=100,
+                 max_pages=5, max_in_flight=10, clock=None):
+        self.tweets = tweets
+        self.store = store if store is not None else MemoryStore()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_per_poll = target_per_poll
+        self.count = count
+        self.max_pages = max_pages
+        self.max_in_flight = max_in_flight
+        self.clock = clock or time.time
+        self.requests = 0  # search/tweets requests sent
+        self.skipped = 0  # polls that hit max_pages before reaching the mark
+        self.errors = 0  # queries whose search or subscriber raised
+        self._terms = {}  # key -> _Term
+        self._queries = None  # built on the next poll after the terms change
+        self._marks = None  # loaded on the first subscribe
+        self._lock = threading.Lock()
+
+    def subscribe(self, term, callback, **search_vars):
+        """
+        Calls callback(term, statuses) with the new tweets (oldest first) matching term on every poll
+            search_vars = Other Tweets.search() params for the term e.g. lang, geocode, result_type
+        A term can have any number of subscribers
+        """
+        term = _SPACES.sub(' ', term).strip()
+        with self._lock:
+            if self._marks is None:
+                self._marks = self.store.load()
+            key = _term_key(term, search_vars)
+            sub = self._terms.get(key)
+            if sub is None:
+                sub = self._terms[key] = _Term(term, search_vars)
+                since_id, sub.rate, sub.polled = self._marks.get(key) or (None, None, None)
+                sub.since_id = int(since_id) if since_id is not None else None
+                self._queries = None
+            sub.callbacks.append(callback)
+
+    def unsubscribe(self, term, callback, **search_vars):
+        """ Stops calling callback for term... the term's mark is kept """
+        key = _term_key(_SPACES.sub(' ', term).strip(), search_vars)
+        with self._lock:
+            sub = self._terms.get(key)
+            if sub is not None and callback in sub.callbacks:
+                sub.callbacks.remove(callback)
+                if not sub.callbacks:
+                    del self._terms[key]
+                    self._queries = None
+
+    def queries(self):
+        """ The merged search queries... a list of (q, search_vars) """
+        with self._lock:
+            return [(query.q, query.search_vars) for query in self._merged()]
+
+    def _merged(self):
+        """ The terms packed into queries (first fit, busiest terms first so quiet ones share queries) """
+        if self._queries is None:
+            groups = {}
+            queries = []
+            for sub in sorted(self._terms.values(), key=lambda sub: (-(sub.rate or 0), sub.term)):
+                if not _MERGEABLE.match(sub.term) or sub.term.upper() == 'OR':
+                    queries.append([sub])
+                    continue
+                packed = groups.setdefault(_term_key('', sub.search_vars), [])
+                for terms in packed:
+                    if len(terms[1]) + len(' OR ') + len(sub.term) <= MAX_QUERY_LENGTH:
+                        terms[0].append(sub)
+                        terms[1] += u' OR ' + sub.term
+                        break
+                else:
+                    packed.append([[sub], sub.term])
+            for packed in groups.values():
+                queries.extend([terms for terms, _ in packed])
+            self._queries = [_Query(terms) for terms in queries]
+        return self._queries
+
+    def interval(self, rate):
+        """ Seconds between polls of a query finding rate tweets/second """
+        if not rate:
+            return self.max_interval
+        return min(max(self.target_per_poll / rate, self.min_interval), self.max_interval)
+
+    def due(self, now=None):
+        """ The queries due a poll... a list of (q, search_vars) """
+        now = self.clock() if now is None else now
+        with self._lock:
+            return [(query.q, query.search_vars) for query in self._due(now)]
+
+    def _due(self, now):
+        due = []
+        for query in self._merged():
+            polled = [sub.polled for sub in query.terms]
+            if None in polled:
+                due.append(query)
+            elif min(polled) + self.interval(sum(sub.rate or 0 for sub in query.terms)) <= now:
+                due.append(query)
+        return due
+
+    def poll(self, force=False):
+        """
+        Polls the queries that are due (every query if force), hands their new tweets to the subscribers &
+        saves the marks. Returns how many search/tweets requests were sent.
+        """
+        now = self.clock()
+        with self._lock:
+            queries = self._merged() if force else self._due(now)
+        if not queries:
+            return 0
+
+        fanout = Fanout(max_in_flight=self.max_in_flight)
+        futures = [fanout.submit(self.tweets.search, **self._params(query)) for query in queries]
+        fetched = [0]  # requests for the older pages
+
+        def fetch(**params):
+            fetched[0] += 1
+            return self.tweets.search(**params)
+
+        error = None
+        try:
+            for query, future in zip(queries, futures):
+                try:
+                    response = future.get_result()
+                    if response.status_code != 200 or not isinstance(response.twitter, dict):
+                        continue  # failed... polled again next time
+                    params = self._params(query)
+                    statuses = list(_statuses_of(response.twitter))
+                    paging = {'more': False}
+                    older = _next_params(params, response.twitter, paging)
+                    if older is not None:
+                        # Pages back (max_id) until it reaches the marks or max_pages
+                        statuses.extend(iter_items(fetch, older, _statuses_of,
+                                                   lambda params, twitter: _next_params(params, twitter, paging),
+                                                   max_pages=self.max_pages - 1))
+                    if paging['more']:
+                        self.skipped += 1
+                    self._deliver(query, statuses, self.clock())
+                except Exception:
+                    # The other queries are still polled... the first error is raised once the marks are saved
+                    self.errors += 1
+                    if error is None:
+                        error = sys.exc_info()
+        finally:
+            with self._lock:
+                self.requests += len(futures) + fetched[0]
+                for sub in self._terms.values():
+                    self._marks[sub.key] = [str(sub.since_id) if sub.since_id is not None else None, sub.rate,
+                                            sub.polled]
+                self.store.save(self._marks)
+        if error is not None:
+            raise error[0], error[1], error[2]
+        return len(futures) + fetched[0]
+
+    def _params(self, query):
+        """ The search params of a query's newest page... from the lowest mark of its terms """
+        marks = [sub.since_id for sub in query.terms if sub.since_id is not None]
+        params = dict(query.search_vars, q=query.q, count=self.count)
+        if marks:
+            params['since_id'] = str(min(marks))  # new terms start from there (or the newest page)
+        return params
+
+    def _deliver(self, query, statuses, now):
+        """ Hands each term the tweets newer than its mark that it matches... then moves the marks & rates """
+        found = dict((sub.key, []) for sub in query.terms)
+        seen = set()
+        for status in sorted(statuses, key=lambda status: int(status['id_str'])):
+            id = int(status['id_str'])
+            if id in seen:
+                continue
+            seen.add(id)
+            subs = query.terms
+            if len(subs) > 1:
+                text = _searchable(status)
+                subs = [sub for sub in subs if sub.matches(text)] or subs
+            for sub in subs:
+                if sub.since_id is None or id > sub.since_id:
+                    found[sub.key].append(status)
+
+        for sub in query.terms:
+            new = found[sub.key]
+            rate = None
+            if sub.polled is not None and now > sub.polled:
+                rate = len(new) / float(now - sub.polled)
+            elif sub.polled is None and new:
+                # First poll... the newest page's span (from its ids) gives a rate to start with
+                span = now - _id_time(int(new[0]['id_str']))
+                rate = len(new) / span if span > 0 else None
+            if rate is not None:
+                sub.rate = rate if sub.rate is None else (sub.rate + rate) / 2
+            sub.polled = now
+            if seen:
+                sub.since_id = max(sub.since_id or 0, max(seen))
+            if new:
+                for callback in list(sub.callbacks):
+                    callback(sub.term, new)
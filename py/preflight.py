@@ -0,0 +1,295 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Checks tweets before they're signed & sent... what twitter would reject is caught without a round trip
+(or a media upload)
+
+    tweets = Tweets(..., preflight=Preflight())  # update() & update_with_media() raise PreflightError
+    passed, rejected = Preflight().check_jobs(queued_jobs)  # thousands of PublishJobs at once
+
+The status is counted the way twitter does (twitter-text's weighted length): URLs count as URL_LENGTH
+whatever their length, most scripts' chars (Latin, Cyrillic, Arabic, Hebrew, Devanagari...) count as 1 and
+the rest (CJK, emoji...) as 2. A whole emoji sequence (a flag, an emoji & its skin tone, a ZWJ family...)
+counts as 2 too. The counting is a few precompiled regex passes over the status rather than a python loop
+over its chars.
+"""
+
+import re
+import sys
+import unicodedata
+
+from multipart import _data_size
+from twitterapi import TwitterError
+
+__all__ = [
+    'PreflightError',
+    'weighted_length',
+    'Preflight',
+]
+
+
+MAX_WEIGHTED_LENGTH = 280
+URL_LENGTH = 23  # every URL is sent as a t.co link
+
+PHOTO_SIZE_LIMIT = 3 << 20  # update_with_media
+PHOTO_TYPES = ('image/jpeg', 'image/png', 'image/gif')
+MAX_MEDIA_IDS = 4
+
+# The chars that count as 1 (twitter-text's weight 100 ranges)... everything else counts as 2
+_LIGHT = re.compile(u'[\u0000-\u10ff\u2000-\u200d\u2010-\u201f\u2032-\u2037]+')
+_NON_ASCII = re.compile(u'[^\u0000-\u007f]')
+# A narrow (UCS-2) build stores chars past U+FFFF as 2 surrogates... each pair is one char of weight 2
+_SURROGATE_PAIR = re.compile(u'[\ud800-\udbff][\udc00-\udfff]') if sys.maxunicode == 0xffff else None
+
+# Emoji sequences... twitter-text v3 counts each as 2 however many chars it is. A flag (2 regional indicators),
+# a keycap or a base emoji with its variation selector/skin tone/tags, any of them joined by ZWJs
+if _SURROGATE_PAIR is None:
+    _EMOJI_ASTRAL = u'[\U0001f000-\U0001faff]'
+    _EMOJI_FLAG = u'[\U0001f1e6-\U0001f1ff]{2}'
+    _EMOJI_MODIFIER = u'[\ufe0f\u20e3\U0001f3fb-\U0001f3ff\U000e0020-\U000e007f]'
+else:
+    _EMOJI_ASTRAL = u'(?:[\ud83c\ud83d][\udc00-\udfff]|\ud83e[\udc00-\udeff])'
+    _EMOJI_FLAG = u'(?:\ud83c[\udde6-\uddff]){2}'
+    _EMOJI_MODIFIER = u'(?:[\ufe0f\u20e3]|\ud83c[\udffb-\udfff]|\udb40[\udc20-\udc7f])'
+_EMOJI_ELEMENT = (
+    u'(?:' + _EMOJI_FLAG + u'|[0-9#*]\ufe0f?\u20e3'
+    u'|(?:' + _EMOJI_ASTRAL + u'|[\u203c\u2049\u2122\u2139\u2190-\u21ff\u2300-\u23ff\u24c2\u25a0-\u27bf\u2934'
+    u'\u2935\u2b00-\u2bff\u3030\u303d\u3297\u3299]|[\u00a9\u00ae](?=\ufe0f))' + _EMOJI_MODIFIER + u'*)')
+_EMOJI = re.compile(_EMOJI_ELEMENT + u'(?:\u200d' + _EMOJI_ELEMENT + u')*')
+
+# URLs with a scheme or www. and bare domains with a common TLD (twitter links those too)... an @ or word char
+# right before a bare domain means it's an email address or part of a word. Hosts & paths only take the chars
+# twitter-text's do (ASCII, accented Latin & Cyrillic) so CJK text right after a URL isn't swallowed by it
+_URL_HOST = u'[a-z0-9\u00c0-\u024f\u0400-\u04ff.:_-]'
+_URL_PATH = u'[a-z0-9\u00c0-\u024f\u0400-\u04ff!*\';:=+,.$/%#\\[\\]\u2013_~|&@()?-]'
+_URL = re.compile(u'''
+    (?:https?://|(?<![@\\w.-])www\\.)HOST+(?:[/?#]PATH*)?
+  | (?<![@\\w./-])(?:[a-z0-9][a-z0-9-]*\\.)+
+    (?:com|net|org|edu|gov|info|biz|io|co|me|ly|tv|us|uk|ca|de|fr|es|it|nl|jp|au|app|dev|xyz)
+    (?::\\d+)?(?:/PATH*)?(?!HOST)
+'''.replace(u'HOST', _URL_HOST).replace(u'PATH', _URL_PATH), re.IGNORECASE | re.UNICODE | re.VERBOSE)
+_URL_TRAILING = '.,;:!?\'")]}'
+
+# Leading bytes of the media types twitter takes... (offset, signature, mimetype)
+_SIGNATURES = (
+    (0, '\xff\xd8\xff', 'image/jpeg'),
+    (0, '\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, 'GIF87a', 'image/gif'),
+    (0, 'GIF89a', 'image/gif'),
+    (8, 'WEBP', 'image/webp'),
+    (4, 'ftyp', 'video/mp4'),
+)
+
+_DIGITS = re.compile(r'^[0-9]+$')
+
+
+def _is_id(val):
+    """ True if val is a twitter id (a positive int or a str of digits) """
+    if isinstance(val, (int, long)):
+        return val > 0
+    return isinstance(val, basestring) and _DIGITS.match(val) is not None
+
+
+class PreflightError(TwitterError):
+    """
+    A tweet failed its preflight checks (nothing was sent)
+        problems = A list of what's wrong (strs)
+    """
+    def __init__(self, problems):
+        TwitterError.__init__(self, '; '.join(problems))
+        self.problems = problems
+
+
+def _url_count(text):
+    """ Returns (text without its URLs, the number of URLs) """
+    urls = []
+
+    def drop(match):
+        url = match.group()
+        stripped = url.rstrip(_URL_TRAILING)
+        urls.append(stripped)
+        return url[len(stripped):]  # trailing punctuation isn't part of the link
+
+    return _URL.sub(drop, text), len(urls)
+
+
+def weighted_length(text, url_length=URL_LENGTH):
+    """
+    The length twitter counts for text (a unicode or utf-8 str)... URLs are url_length, emoji sequences are 2
+    & chars outside the light ranges count as 2
+    """
+    if isinstance(text, str):
+        text = text.decode('utf-8')
+    text, urls = _url_count(text)
+    if _NON_ASCII.search(text) is None:
+        return len(text) + urls * url_length
+
+    text = unicodedata.normalize('NFC', text)
+    text, emoji = _EMOJI.subn(u'', text)
+    length = len(text) + len(_LIGHT.sub(u'', text)) + emoji * 2  # each heavy char is counted again
+    if _SURROGATE_PAIR is not None:
+        length -= 2 * len(_SURROGATE_PAIR.findall(text))  # 2 code units, both counted twice
+    return length + urls * url_length
+
+
+def _sniff(data, encoding):
+    """ The mimetype the data's leading bytes say it is (None if they aren't recognized or can't be read) """
+    if encoding not in (None, 'binary'):
+        return None
+    if isinstance(data, (str, bytearray, memoryview)):
+        head = bytes(data[:12])
+    elif hasattr(data, 'read') and hasattr(data, 'seek') and hasattr(data, 'tell'):
+        try:
+            start = data.tell()
+            head = data.read(12)
+            data.seek(start)
+        except (IOError, OSError, ValueError):
+            return None
+    else:
+        return None  # a chunk iterator... reading it would consume it
+    for offset, signature, mimetype in _SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return mimetype
+    return None
+
+
+class Preflight(object):
+    """
+    Checks the params of statuses/update & update_with_media
+
+    Optional:
+        max_length = The most weighted chars in a status
+        url_length = What each URL counts as
+        photo_size_limit = The most bytes of update_with_media media
+        photo_types = The mimetypes update_with_media takes
+        sniff = Check the media's leading bytes match its mimetype
+    """
+    def __init__(self, max_length=MAX_WEIGHTED_LENGTH, url_length=URL_LENGTH, photo_size_limit=PHOTO_SIZE_LIMIT,
+                 photo_types=PHOTO_TYPES, sniff=True):
+        self.max_length = max_length
+        self.url_length = url_length
+        self.photo_size_limit = photo_size_limit
+        self.photo_types = photo_types
+        self.sniff = sniff
+
+    def _measure(self, status):
+        """ Returns (the status's weighted length, whether it's blank)... (None, False) if it isn't utf-8 """
+        if status is None:
+            status = u''
+        elif not isinstance(status, basestring):
+            status = unicode(status)
+        try:
+            if isinstance(status, str):
+                status = status.decode('utf-8')
+        except UnicodeDecodeError:
+            return None, False
+        return weighted_length(status, self.url_length), not status.strip()
+
+    def problems(self, api_vars):
+        """ Returns a list of what's wrong with the request's vars ('status', 'media[]' etc.)... [] if nothing """
+        return self._problems(api_vars, self._measure(api_vars.get('status')))
+
+    def _problems(self, api_vars, measured):
+        problems = []
+        media = api_vars.get('media[]')
+        media_ids = api_vars.get('media_ids')
+
+        length, blank = measured
+        if length is None:
+            problems.append('status isn\'t utf-8')
+        elif length > self.max_length:
+            problems.append('status is {:} chars (the most is {:})'.format(length, self.max_length))
+        elif blank and media is None and not media_ids:
+            problems.append('status is empty')
+
+        reply_to = api_vars.get('in_reply_to_status_id')
+        if reply_to is not None and not _is_id(reply_to):
+            problems.append('in_reply_to_status_id {!r} isn\'t a tweet id'.format(reply_to))
+
+        if media_ids:
+            ids = media_ids.split(',') if isinstance(media_ids, basestring) else list(media_ids)
+            if len(ids) > MAX_MEDIA_IDS:
+                problems.append('{:} media_ids (the most is {:})'.format(len(ids), MAX_MEDIA_IDS))
+            for id in ids:
+                if not _is_id(id):
+                    problems.append('media_id {!r} isn\'t a media id'.format(id))
+
+        for name, limit in (('lat', 90), ('long', 180)):
+            val = api_vars.get(name)
+            if val is not None:
+                try:
+                    ok = -limit <= float(val) <= limit
+                except (TypeError, ValueError):
+                    ok = False
+                if not ok:
+                    problems.append('{:} {!r} isn\'t between -{:} and {:}'.format(name, val, limit, limit))
+
+        if media is not None:
+            problems.extend(self._media_problems(media))
+        return problems
+
+    def _media_problems(self, media):
+        if not isinstance(media, dict) or media.get('data') is None:
+            return ['media has no data']
+        problems = []
+        mimetype = media.get('mimetype', 'image/jpeg')
+        if mimetype not in self.photo_types:
+            problems.append('media type {:} isn\'t one of {:}'.format(mimetype, ', '.join(self.photo_types)))
+        encoding = media.get('encoding')
+        try:
+            size = _data_size(media['data'], media.get('size'))
+        except (ValueError, IOError, OSError):
+            size = None  # a chunk iterator without a size... MultipartEncoder measures it
+        if size is not None:
+            if encoding == 'base64':
+                size = size * 3 // 4
+            if not size:
+                problems.append('media is empty')
+            elif size > self.photo_size_limit:
+                problems.append('media is {:} bytes (the most is {:})'.format(size, self.photo_size_limit))
+        if self.sniff:
+            sniffed = _sniff(media['data'], encoding)
+            if sniffed is not None and sniffed != mimetype:
+                problems.append('media is {:} but its mimetype is {:}'.format(sniffed, mimetype))
+        return problems
+
+    def check(self, api_vars):
+        """ Raises PreflightError if anything's wrong with the request's vars """
+        problems = self.problems(api_vars)
+        if problems:
+            raise PreflightError(problems)
+
+    def check_jobs(self, jobs):
+        """
+        Checks many publish.PublishJobs (or dicts of their args) in one pass... returns (passed, rejected)
+        where passed is a list of the jobs that passed & rejected is a list of (job, PreflightError)
+        Identical statuses are only counted once
+        """
+        passed = []
+        rejected = []
+        measured = {}  # status -> (weighted length, blank)
+        for job in jobs:
+            if isinstance(job, dict):
+                api_vars = dict(job)
+                api_vars.pop('key', None)
+                media = api_vars.pop('media', None)
+            else:
+                api_vars = dict(job.params, status=job.status)
+                media = job.media
+            if media is not None:
+                api_vars['media[]'] = media
+            status = api_vars.get('status')
+            try:
+                measures = measured[status]
+            except KeyError:
+                measures = measured[status] = self._measure(status)
+            problems = self._problems(api_vars, measures)
+            if problems:
+                rejected.append((job, PreflightError(problems)))
+            else:
+                passed.append(job)
+        return passed, rejected
@@ -0,0 +1,262 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Publishes many tweets (with or without media) at once
+
+    publisher = BulkPublisher(tweets, max_in_flight=10)
+    results = publisher.publish([
+        PublishJob('Tweet one'),
+        PublishJob('Tweet two with a photo', media={'filename': 'a.png', 'mimetype': 'image/png', 'data': data}),
+        {'status': 'Tweet three', 'lat': '28.669997', 'long': '-81.208120'},
+    ])
+    for result in results:
+        if result.ok:
+            tweet_id = result.tweet_id
+"""
+
+import hashlib
+import random
+import time
+from collections import deque
+
+from transports import not_sent, WorkerPool
+from twitterapi import twitter_response
+
+__all__ = [
+    'PublishJob',
+    'PublishResult',
+    'BulkPublisher',
+]
+
+
+# Twitter's error code for "Status is a duplicate"... an earlier attempt of the same job got through
+DUPLICATE_STATUS = 187
+
+
+def _media_digest(media):
+    """ A digest of a media dict's data... file-like data is read through & left where it was """
+    data = media.get('data')
+    digest = hashlib.sha1()
+    if isinstance(data, (str, bytearray, memoryview)):
+        digest.update(data)
+    elif hasattr(data, 'read') and hasattr(data, 'seek'):
+        start = data.tell()
+        remaining = media.get('size')
+        while remaining is None or remaining > 0:
+            chunk = data.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+        data.seek(start)
+    else:
+        raise ValueError('A PublishJob whose media data is a chunk iterator needs an explicit key')
+    return digest.hexdigest()
+
+
+class PublishJob(object):
+    """
+    One tweet to publish
+        status = The tweet text
+        media = Optional media dict (see Tweets.update_with_media())
+        key = The job's client key... jobs with the same key are only ever published once (an Outbox forgets
+              a key keep_done after its job finished)
+              (default: derived from the status, params & media bytes... media whose data is a chunk
+              iterator needs an explicit key)
+        params = Any other Tweets.update() / update_with_media() params e.g. in_reply_to_status_id, lat, long
+    """
+    def __init__(self, status, media=None, key=None, **params):
+        self.status = status
+        self.media = media
+        self.params = params
+        if key is None:
+            status_str = status.encode('utf-8') if isinstance(status, unicode) else str(status)
+            key = hashlib.sha1('\n'.join([
+                status_str,
+                repr(sorted(params.items())),
+                _media_digest(media) if media else '',
+            ])).hexdigest()
+        self.key = key
+
+
+class PublishResult(object):
+    """
+    The outcome of a PublishJob
+        ok = True if the tweet was published
+        tweet_id = The new tweet's id_str (None when unknown e.g. for a duplicate)
+        duplicate = True if twitter said an earlier attempt of this job had already been published
+        response = The last twitter_response() (None if the last attempt raised)
+        error = The exception the last attempt raised (None if it didn't)
+        attempts = How many times the job was sent
+    """
+    def __init__(self, job):
+        self.job = job
+        self.ok = False
+        self.tweet_id = None
+        self.duplicate = False
+        self.response = None
+        self.error = None
+        self.attempts = 0
+
+    def record(self, response):
+        """
+        Records the twitter_response() of an attempt... returns True if it's worth retrying (a 429)
+        A 5xx isn't retried: twitter may have published the tweet anyway
+        """
+        self.error, self.response = None, response
+        twitter = response.twitter
+        if response.status_code == 200 and isinstance(twitter, dict):
+            self.ok = True
+            self.tweet_id = twitter.get('id_str')
+            return False
+        errors = twitter.get('errors') if isinstance(twitter, dict) else None
+        if errors and any(error.get('code') == DUPLICATE_STATUS for error in errors):
+            self.ok = True
+            self.duplicate = True
+            return False
+        return response.status_code == 429
+
+
+class _Slot(object):
+    """ A job in the publishing window """
+    def __init__(self, job):
+        self.job = job
+        self.result = PublishResult(job)
+        self.signing = None  # HttpRpc of the signed request
+        self.sending = None  # rpc / ndb Future of the response
+        self.not_before = 0
+
+
+class BulkPublisher(object):
+    """
+    Publishes tweets with max_in_flight requests in flight at once... request bodies are built & signed
+    by a pool of worker threads ahead of the requests that are in flight
+
+    Initialization requires:
+        tweets = A Tweets instance
+
+    Optional:
+        max_in_flight = The most requests in flight at once
+        workers = The number of threads that build & sign requests
+        async = 'rpc' or 'ndb'
+        max_retries = How many times a job that got a 429 response (or whose request failed before it was sent
+            see transports.not_sent()) is retried
+        backoff_base = The first retry's backoff in seconds... doubled for each retry (with jitter)
+
+    Only requests twitter can't have acted on are retried: a 5xx response or a failure after the request was
+    written (e.g. a read timeout) is the job's result (result.response / result.error) as the tweet may have
+    been published. Every retry is signed anew and should one still get "Status is a duplicate" (code 187) an
+    earlier attempt got through... the job is then ok with result.duplicate set. Jobs whose key was already
+    published by this publisher are skipped.
+    """
+    def __init__(self, tweets, max_in_flight=10, workers=4, async='rpc', max_retries=2, backoff_base=1.0):
+        self.tweets = tweets
+        self.max_in_flight = max_in_flight
+        self.async = async
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.published = {}  # job key -> PublishResult of every published job
+        self._workers = WorkerPool(workers)
+
+    def _sign(self, job):
+        if job.media is not None:
+            return self.tweets.update_with_media(job.status, job.media, async='signed', **job.params)
+        return self.tweets.update(job.status, async='signed', **job.params)
+
+    def publish(self, jobs):
+        """ Publishes every job... returns a list of PublishResults in the same order as jobs """
+        return list(self.iter_publish(jobs))
+
+    def iter_publish(self, jobs):
+        """ Publishes every job... yields the PublishResults in the same order as jobs """
+        jobs = iter(jobs)
+        window = deque()
+        in_window = {}  # job key -> the slot publishing it
+        exhausted = False
+
+        while window or not exhausted:
+            # Keep the window full... the worker threads build & sign the bodies
+            while not exhausted and len(window) < self.max_in_flight:
+                try:
+                    job = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if isinstance(job, dict):
+                    job = PublishJob(**job)
+                slot = _Slot(job)
+                if job.key in self.published:
+                    slot.result = self.published[job.key]
+                elif job.key in in_window:
+                    slot.result = in_window[job.key].result  # filled in before this slot reaches the head
+                else:
+                    in_window[job.key] = slot
+                    slot.signing = self._workers.submit(self._sign, job)
+                window.append(slot)
+
+            # Send every request that's been signed
+            now = time.time()
+            for slot in window:
+                if slot.signing is not None and slot.sending is None and slot.signing.done() and \
+                        slot.not_before <= now:
+                    self._send(slot)
+
+            head = window[0]
+            if head.signing is None:
+                window.popleft()
+                yield head.result
+                continue
+
+            if head.sending is None:
+                if head.not_before > now:
+                    time.sleep(head.not_before - now)
+                self._send(head)
+            if self._complete(head):
+                window.popleft()
+                del in_window[head.job.key]
+                if head.result.ok:
+                    self.published[head.job.key] = head.result
+                yield head.result
+
+    def _send(self, slot):
+        try:
+            signed = slot.signing.get_result()
+        except Exception as e:
+            # The request couldn't be built (e.g. unreadable media)... retrying won't help
+            slot.sending = e
+            slot.result.attempts = self.max_retries + 1
+            return
+        slot.result.attempts += 1
+        try:
+            slot.sending = self.tweets.send_signed(signed, async=self.async)
+        except Exception as e:
+            slot.sending = e
+
+    def _complete(self, slot):
+        """ Waits for the slot's response... returns False if the job is going to be retried """
+        result = slot.result
+        unsent = isinstance(slot.sending, Exception)  # send_signed() raised... nothing was sent
+        try:
+            if unsent:
+                raise slot.sending
+            response = twitter_response(slot.sending.get_result())
+        except Exception as e:
+            result.error, result.response = e, None
+            retry = unsent or not_sent(e)
+        else:
+            retry = result.record(response)
+
+        if not retry or result.attempts > self.max_retries:
+            return True
+
+        # Sign again (a new nonce) & resend after a backoff
+        backoff = self.backoff_base * (2 ** (result.attempts - 1))
+        slot.not_before = time.time() + backoff / 2 + random.uniform(0, backoff / 2)
+        slot.sending = None
+        slot.signing = self._workers.submit(self._sign, slot.job)
+        return False
@@ -0,0 +1,202 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Tracks twitter's per-endpoint rate limit windows from the x-rate-limit-* response headers
+
+    tweets = Tweets(..., rate_limiter=RateLimiter())
+    ...
+    tweets.rate_limiter.budget('search/tweets')  # {'limit': 180, 'remaining': 12, 'reset': 1400000000}
+"""
+
+import re
+import threading
+import time
+
+from transports import RpcWrapper
+
+__all__ = [
+    'endpoint_resource',
+    'RateLimiter',
+    'RateLimitedRpc',
+]
+
+
+_RESOURCE_RE = re.compile(r'^/1\.1/(.+?)(?:\.json)?$')
+_ID_RE = re.compile(r'/\d+(?=/|$)')
+
+def endpoint_resource(url):
+    """
+    Returns the rate limited resource of an API url... with numeric path ids replaced by ':id'
+        'https://api.twitter.com/1.1/statuses/show.json?id=1' -> 'statuses/show'
+        'https://api.twitter.com/1.1/statuses/retweets/123.json' -> 'statuses/retweets/:id'
+    """
+    # The path of scheme://netloc/path?query#fragment... without urlparse (it's slow to import & call)
+    path = url.split('?', 1)[0].split('#', 1)[0]
+    scheme_end = path.find('://')
+    if scheme_end >= 0:
+        slash = path.find('/', scheme_end + 3)
+        path = path[slash:] if slash >= 0 else ''
+    match = _RESOURCE_RE.match(path)
+    if match:
+        path = match.group(1)
+    return _ID_RE.sub('/:id', path)
+
+
+class _Budget(object):
+    __slots__ = ('limit', 'remaining', 'reset')
+
+    def __init__(self, limit, remaining, reset):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+
+
+class RateLimiter(object):
+    """
+    Keeps requests within twitter's rate limit windows
+
+    Optional:
+        max_retries = How many times a request that got a 429 or 5xx response is retried
+        retry_5xx_methods = The methods retried after a 5xx... twitter may have done a write (e.g. posted the
+            tweet) before failing so only GETs are retried by default. 429s are always retried (nothing was done)
+        backoff_base = The first retry's backoff in seconds... doubled for each retry (with jitter)
+        backoff_max = The longest backoff (and the longest wait for a window to reset) in seconds
+        clock, sleep = time.time & time.sleep replacements (for tests)
+
+    Each request to a resource uses up one of its remaining requests. Once none remain, requests to the
+    resource are delayed until its window resets. Resources that haven't been seen yet aren't limited.
+    """
+    def __init__(self, max_retries=3, backoff_base=1.0, backoff_max=900.0, retry_5xx_methods=('GET',), clock=None,
+                 sleep=None):
+        self.max_retries = max_retries
+        self.retry_5xx_methods = retry_5xx_methods
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock or time.time
+        self.sleep = sleep or time.sleep
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def delay(self, resource):
+        """
+        Returns how many seconds to wait before sending a request to resource (0 to send now)
+        When 0 the request is counted against the resource's remaining requests
+        """
+        with self._lock:
+            budget = self._budgets.get(resource)
+            if budget is None:
+                return 0
+            now = self.clock()
+            if budget.reset <= now:
+                # A new window... assume the full limit until the next response says otherwise
+                budget.remaining = budget.limit
+                budget.reset = now + 15 * 60
+            if budget.remaining > 0:
+                budget.remaining -= 1
+                return 0
+            return min(budget.reset - now + 1, self.backoff_max)
+
+    def wait(self, resource):
+        """ Sleeps until a request to resource can be sent """
+        while True:
+            delay = self.delay(resource)
+            if not delay:
+                return
+            self.sleep(delay)
+
+    def update(self, resource, response):
+        """ Updates the resource's budget from the response's x-rate-limit-* headers """
+        headers = getattr(response, 'headers', None) or {}
+        try:
+            limit = int(headers['x-rate-limit-limit'])
+            remaining = int(headers['x-rate-limit-remaining'])
+            reset = int(headers['x-rate-limit-reset'])
+        except (KeyError, TypeError, ValueError):
+            if response.status_code == 429:
+                # Out of requests without saying when the window resets... assume a full window
+                with self._lock:
+                    budget = self._budgets.get(resource)
+                    if budget is not None:
+                        budget.remaining = 0
+                        budget.reset = self.clock() + 15 * 60
+            return
+        with self._lock:
+            self._budgets[resource] = _Budget(limit, remaining, reset)
+
+    def should_retry(self, response, attempt, method='GET'):
+        """ True if the response is a 429 (or a 5xx of a method in retry_5xx_methods) and there are retries left """
+        if attempt >= self.max_retries:
+            return False
+        if response.status_code == 429:
+            return True
+        return response.status_code >= 500 and method.upper() in self.retry_5xx_methods
+
+    def backoff(self, resource, response, attempt):
+        """
+        Returns how long to wait before retrying attempt (0 based)
+            429 = Until the resource's window resets (when known)
+            otherwise = Exponential backoff with jitter
+        """
+        if response.status_code == 429:
+            with self._lock:
+                budget = self._budgets.get(resource)
+                if budget is not None and budget.reset > self.clock():
+                    return min(budget.reset - self.clock() + 1, self.backoff_max)
+        backoff = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        import random  # only needed once there's a retry
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+    def budget(self, resource=None):
+        """
+        Returns the budget of resource as {'limit': ..., 'remaining': ..., 'reset': ...} (None if unknown)
+        or a dict of every known resource's budget if resource is None
+        """
+        with self._lock:
+            if resource is not None:
+                budget = self._budgets.get(resource)
+                if budget is None:
+                    return None
+                return {'limit': budget.limit, 'remaining': budget.remaining, 'reset': budget.reset}
+            return dict((name, {'limit': budget.limit, 'remaining': budget.remaining, 'reset': budget.reset})
+                        for name, budget in self._budgets.iteritems())
+
+
+class RateLimitedRpc(RpcWrapper):
+    """
+    Wraps an async='rpc' request... get_result() updates the rate limit budget and retries on 429/5xx
+    (the retries block the caller)
+    """
+    def __init__(self, limiter, resource, rpc, resend, method='GET'):
+        self._limiter = limiter
+        self._resource = resource
+        self._method = method
+        self._rpc = rpc
+        self._resend = resend  # returns a new rpc for the same request (None to never retry)
+        self._response = None
+
+    def done(self):
+        if self._response is not None:
+            return True
+        return RpcWrapper.done(self)
+
+    def wait(self):
+        if self._response is None:
+            self._rpc.wait()
+
+    def get_result(self):
+        attempt = 0
+        while self._response is None:
+            response = self._rpc.get_result()
+            self._limiter.update(self._resource, response)
+            if self._resend is None or not self._limiter.should_retry(response, attempt, self._method):
+                self._response = response
+                break
+            self._limiter.sleep(self._limiter.backoff(self._resource, response, attempt))
+            self._limiter.wait(self._resource)
+            self._rpc = self._resend()
+            attempt += 1
+        return self._response
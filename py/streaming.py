@@ -0,0 +1,329 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Consumes twitter's streaming API (statuses/filter & user streams) instead of polling search
+
+    stream = tweets.filter_stream(track='road bike,fixie')  # connected & read by a background thread
+    for message in stream:
+        if 'text' in message:
+            pass  # a tweet... other messages are delete, limit, warning, friends etc. notices
+    ...
+    stream.stop()
+
+A stream needs a long lived socket so it's read with httplib (urlfetch buffers the whole response). On App
+Engine that means the sockets API... outside of it nothing special is needed.
+"""
+
+import httplib
+import Queue
+import socket
+import threading
+import urlparse
+
+from twitterapi import json_decoder
+
+__all__ = [
+    'FILTER_URL',
+    'USER_URL',
+    'StreamError',
+    'DelimitedParser',
+    'TwitterStream',
+]
+
+
+FILTER_URL = 'https://stream.twitter.com/1.1/statuses/filter.json'
+USER_URL = 'https://userstream.twitter.com/1.1/user.json'
+
+# Statuses that reconnecting won't fix
+_FATAL_STATUSES = frozenset([401, 403, 404, 406, 413, 416])
+
+
+class StreamError(Exception):
+    """
+    A stream failed for good (e.g. a 401)... raised by TwitterStream.get() & iteration
+        status_code = The HTTP status (None if it wasn't an HTTP error)
+    """
+    def __init__(self, message, status_code=None):
+        Exception.__init__(self, message)
+        self.status_code = status_code
+
+
+class DelimitedParser(object):
+    """
+    Splits a delimited=length stream into messages as it arrives
+
+    Each message is preceded by its length in bytes & '\\r\\n'... blank keep-alive lines are skipped.
+    Data is copied into one reusable bytearray. Consumed bytes are reclaimed by moving the unconsumed tail
+    to the front (only when there isn't room at the end) and it only grows for a message bigger than itself.
+    """
+    def __init__(self, capacity=64 << 10):
+        self._buf = bytearray(capacity)
+        self._start = 0
+        self._end = 0
+        self.keep_alives = 0
+
+    def feed(self, data):
+        """ Appends data and returns the (possibly empty) list of messages (str) it completes """
+        size = len(data)
+        if self._end + size > len(self._buf):
+            self._make_room(size)
+        self._buf[self._end:self._end + size] = data
+        self._end += size
+        return self._messages()
+
+    def reset(self):
+        """ Drops any partial message (e.g. after a reconnect)... the buffer is kept """
+        self._start = 0
+        self._end = 0
+
+    def _make_room(self, size):
+        pending = self._end - self._start
+        if pending + size > len(self._buf):
+            buf = bytearray(max(len(self._buf) * 2, pending + size))
+            buf[:pending] = self._buf[self._start:self._end]
+            self._buf = buf
+        else:
+            self._buf[:pending] = self._buf[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    def _messages(self):
+        buf = self._buf
+        start = self._start
+        end = self._end
+        messages = []
+        while start < end:
+            if buf[start] == 10:  # '\n'
+                self.keep_alives += 1
+                start += 1
+                continue
+            if buf[start] == 13:  # '\r'
+                start += 1
+                continue
+            newline = buf.find('\n', start, end)
+            if newline < 0:
+                break
+            try:
+                length = int(buf[start:newline])
+            except ValueError:
+                raise StreamError('Bad length delimiter: {!r}'.format(str(buf[start:newline])))
+            if newline + 1 + length > end:
+                break  # the rest of the message hasn't arrived yet
+            messages.append(str(buf[newline + 1:newline + 1 + length]))
+            start = newline + 1 + length
+        if start == end:
+            start = end = 0  # everything's consumed... reuse the buffer from the front
+        self._start = start
+        self._end = end
+        return messages
+
+
+def _iter_body(response):
+    """ Yields the body of an httplib response piece by piece as it arrives (a chunk or a line at a time) """
+    fp = response.fp
+    if response.chunked:
+        while True:
+            line = fp.readline(1024)
+            if not line:
+                raise httplib.IncompleteRead('')
+            size = int(line.split(';', 1)[0], 16)
+            if size == 0:
+                return  # the stream ended
+            data = fp.read(size)  # only waits for this chunk
+            if len(data) < size:
+                raise httplib.IncompleteRead(data, size - len(data))
+            fp.read(2)  # the chunk's '\r\n'
+            yield data
+    else:
+        while True:
+            line = fp.readline(64 << 10)
+            if not line:
+                return
+            yield line
+
+
+class TwitterStream(object):
+    """
+    A streaming API connection read by a background thread into a bounded queue
+
+    Initialization requires:
+        oauth = The OAuth1 to sign with (e.g. tweets.oauth)
+        url = The endpoint e.g. FILTER_URL or USER_URL
+
+    Optional:
+        method = 'POST' (statuses/filter) or 'GET' (user streams)
+        params = The endpoint's params e.g. {'track': 'bikes'}... delimited=length is always added
+        queue_size = The most messages waiting to be consumed... once full the reader stops reading the socket
+            until there's room (the backpressure reaches twitter through TCP)
+        decode = False to deliver the raw json (str) of each message instead of the decoded dict
+        timeout = Seconds without any data (twitter sends a keep-alive every 30) before reconnecting
+        ssl_context = The ssl.SSLContext for https connections
+        sleep = A time.sleep replacement (for tests)
+
+    Reconnects follow twitter's guidelines:
+        network errors & the stream ending = 0.25s more each time up to 16s
+        HTTP errors = 5s doubling up to 320s
+        420 & 429 = 60s doubling up to 960s
+    Statuses that reconnecting can't fix (401, 403, 404, 406, 413 & 416) stop the stream with a StreamError.
+    """
+    def __init__(self, oauth, url, method='POST', params=None, queue_size=1000, decode=True, timeout=90,
+                 ssl_context=None, sleep=None):
+        self.oauth = oauth
+        self.url = url
+        self.method = method.upper()
+        self.params = dict(params or {}, delimited='length')
+        self.decode = decode
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.sleep = sleep
+        self.connects = 0
+        self._parser = DelimitedParser()
+        self._queue = Queue.Queue(queue_size)
+        self._stopped = threading.Event()
+        self._conn = None
+        self._thread = None
+        self._error = None
+
+    @property
+    def keep_alives(self):
+        """ How many keep-alive newlines have been received """
+        return self._parser.keep_alives
+
+    def start(self):
+        """ Connects & starts reading on a background thread... returns self """
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Disconnects... messages already queued can still be consumed """
+        self._stopped.set()
+        conn = self._conn
+        if conn is not None and conn.sock is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)  # wakes up a blocked read
+            except socket.error:
+                pass
+
+    def get(self, timeout=None):
+        """
+        Returns the next message... waits up to timeout seconds (None = forever) and raises Queue.Empty if
+        none arrived. Raises StopIteration once the stream's stopped & drained or StreamError if it failed.
+        """
+        try:
+            message = self._queue.get(timeout=timeout) if timeout is not None else self._get_forever()
+        except Queue.Empty:
+            if self._stopped.is_set() and (self._thread is None or not self._thread.is_alive()):
+                self._end()
+            raise
+        if message is self._queue:  # the end marker
+            self._end()
+        return message
+
+    def _get_forever(self):
+        while True:
+            try:
+                return self._queue.get(timeout=1)
+            except Queue.Empty:
+                if self._stopped.is_set() and (self._thread is None or not self._thread.is_alive()):
+                    raise
+
+    def _end(self):
+        if self._error is not None:
+            raise self._error
+        raise StopIteration
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.get()
+            except (StopIteration, Queue.Empty):
+                return
+
+    def _put(self, message):
+        """ Queues message... blocks while the queue's full (False if the stream was stopped meanwhile) """
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(message, timeout=0.5)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def _connect(self):
+        parts = urlparse.urlsplit(self.url)
+        if parts.scheme == 'https':
+            conn = httplib.HTTPSConnection(parts.hostname, parts.port, timeout=self.timeout,
+                                           context=self.ssl_context)
+        else:
+            conn = httplib.HTTPConnection(parts.hostname, parts.port, timeout=self.timeout)
+        if self.method == 'POST':
+            method, url, payload, headers = self.oauth.init_request(self.method, self.url, post_vars=self.params)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        else:
+            method, url, payload, headers = self.oauth.init_request(self.method, self.url, query_vars=self.params)
+        path = urlparse.urlunsplit(('', '', parts.path, urlparse.urlsplit(url).query, ''))
+        self._conn = conn
+        conn.request(method, path, payload, headers)
+        return conn.getresponse(buffering=True)
+
+    def _run(self):
+        network_errors = 0
+        http_errors = 0
+        rate_limited = 0
+        loads = json_decoder() if self.decode else None
+        try:
+            while not self._stopped.is_set():
+                delay = 0
+                try:
+                    response = self._connect()
+                    self.connects += 1
+                    if response.status == 200:
+                        network_errors = http_errors = rate_limited = 0
+                        parser = self._parser
+                        parser.reset()
+                        for data in _iter_body(response):
+                            for message in parser.feed(data):
+                                if loads is not None:
+                                    try:
+                                        message = loads(message)
+                                    except ValueError:
+                                        continue  # not json... skip it rather than reconnect
+                                if not self._put(message):
+                                    return
+                        network_errors += 1
+                        delay = min(0.25 * network_errors, 16)  # the stream ended
+                    elif response.status in _FATAL_STATUSES:
+                        self._error = StreamError('{:d} {:}: {:}'.format(response.status, response.reason,
+                                                                         response.read()), response.status)
+                        return
+                    elif response.status in (420, 429):
+                        delay = min(60 * (2 ** rate_limited), 960)
+                        rate_limited += 1
+                    else:
+                        delay = min(5 * (2 ** http_errors), 320)
+                        http_errors += 1
+                except (socket.error, httplib.HTTPException, ValueError, StreamError):
+                    if self._stopped.is_set():
+                        return
+                    network_errors += 1
+                    delay = min(0.25 * network_errors, 16)
+                finally:
+                    if self._conn is not None:
+                        self._conn.close()
+                if delay and not self._stopped.is_set():
+                    if self.sleep is not None:
+                        self.sleep(delay)
+                    else:
+                        self._stopped.wait(delay)  # cut short by stop()
+        finally:
+            self._stopped.set()
+            try:
+                self._queue.put_nowait(self._queue)  # the end marker
+            except Queue.Full:
+                pass  # get() notices the reader is gone once the queue's drained
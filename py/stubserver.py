@@ -0,0 +1,185 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+A local HTTP/1.1 (keep-alive) stub server that serves canned responses... for tests & benchmarks
+(test infrastructure... not exported by the package, import it from this module)
+
+    server = StubServer().start()
+    server.add_response('GET', '/1.1/statuses/show.json', body='{"id_str": "1"}')
+    tweets = Tweets(..., transport=PooledHttpTransport())
+    tweets.api_base_url = server.url + '/1.1/'
+    ...
+    server.stop()
+"""
+
+import BaseHTTPServer
+import SocketServer
+import json
+import threading
+import time
+import urlparse
+
+__all__ = [
+    'StubRequest',
+    'StubServer',
+]
+
+
+class StubRequest(object):
+    """
+    A request received by the StubServer
+    """
+    def __init__(self, method, path, query, headers, body, connection_id):
+        self.method = method
+        self.path = path  # without the query string
+        self.query = query  # a dict of the query string params (first value of each)
+        self.headers = headers  # a dict with lowercase keys
+        self.body = body
+        self.connection_id = connection_id  # the same for requests sent over the same (keep-alive) connection
+
+
+class _StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffer each response into one write... small writes would stall on Nagle & delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.connection_id = self.server.stub.connection_opened()
+
+    def log_message(self, format, *args):
+        pass  # quiet
+
+    def _handle(self):
+        length = int(self.headers.get('content-length') or 0)
+        body = self.rfile.read(length) if length else ''
+        parts = urlparse.urlsplit(self.path)
+        query = dict((name, vals[0]) for name, vals in urlparse.parse_qs(parts.query, True).iteritems())
+        request = StubRequest(self.command, parts.path, query,
+                              dict((name.lower(), val) for name, val in self.headers.items()),
+                              body, self.connection_id)
+
+        status, content, headers = self.server.stub.respond(request)
+
+        self.send_response(status)
+        for name, val in (headers or {}).iteritems():
+            self.send_header(name, val)
+        if isinstance(content, basestring):
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+
+        # An iterable of pieces... streamed as chunks as they're produced
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.wfile.flush()
+        try:
+            for piece in content:
+                if piece:
+                    self.wfile.write('{:x}\r\n{:}\r\n'.format(len(piece), piece))
+                    self.wfile.flush()
+            self.wfile.write('0\r\n\r\n')
+        except Exception:
+            self.close_connection = 1  # the client went away mid stream
+
+    do_GET = _handle
+    do_POST = _handle
+    do_DELETE = _handle
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256  # listen() backlog... the default of 5 refuses connections under a 100+ way fanout
+
+
+class StubServer(object):
+    """
+    Serves canned responses on a local port from a background thread
+
+    Optional:
+        host, port = Where to listen (default: an unused port on 127.0.0.1)
+
+    Responses are registered per (method, path) with add_response()... unmatched requests get a
+    twitter style 404. Every request is recorded in server.requests.
+    """
+    def __init__(self, host='127.0.0.1', port=0):
+        self._httpd = _ThreadingHTTPServer((host, port), _StubHandler)
+        self._httpd.stub = self
+        self._thread = None
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.requests = []
+        self.connections = 0
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://{:}:{:d}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def add_response(self, method, path, status=200, body='', headers=None):
+        """
+        Registers the response for requests to method & path (without the query string)
+            body = The response content... or a function(StubRequest) returning (status, body, headers)
+                   A body that's an iterable of str (rather than a str) is streamed with chunked encoding
+        """
+        if headers is None:
+            headers = {'Content-Type': 'application/json;charset=utf-8'}
+        self._routes[(method.upper(), path)] = (status, body, headers)
+
+    def add_stream(self, method, path, messages, interval=0.0, keep_alive_every=0, status=200, headers=None):
+        """
+        Registers a streaming API style (delimited=length) response for requests to method & path
+            messages = The messages replayed... dicts (json encoded) or str
+            interval = Seconds between messages
+            keep_alive_every = Send a keep-alive newline after every this many messages (0 = never)
+        The stream ends (the client sees a disconnect) once every message has been sent
+        """
+        def replay():
+            for n, message in enumerate(messages):
+                if isinstance(message, unicode):
+                    message = message.encode('utf-8')
+                elif not isinstance(message, str):
+                    message = json.dumps(message)
+                message += '\r\n'
+                yield '{:d}\r\n{:}'.format(len(message), message)
+                if keep_alive_every and (n + 1) % keep_alive_every == 0:
+                    yield '\r\n'
+                if interval:
+                    time.sleep(interval)
+
+        if headers is None:
+            headers = {'Content-Type': 'application/json'}
+        self.add_response(method, path, body=lambda request: (status, replay(), headers))
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+            return self.connections
+
+    def respond(self, request):
+        with self._lock:
+            self.requests.append(request)
+        route = self._routes.get((request.method, request.path))
+        if route is None:
+            return 404, '{"errors":[{"message":"Sorry, that page does not exist","code":34}]}', None
+        status, body, headers = route
+        if callable(body):
+            return body(request)
+        return status, body, headers
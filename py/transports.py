@@ -0,0 +1,396 @@
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Pluggable HTTP transports for TwitterApi
+
+A transport provides:
+    send_request(method, url, payload, headers) = Returns a response object
+    send_request_async(method, url, payload, headers) = Returns an rpc-like object with get_result()
+    send_request_ndb(method, url, payload, headers) = Returns an ndb Future
+    streams = True if the payload may be a MultipartEncoder (streamed) instead of a str
+
+Every response object has the members twitter_response() expects:
+    status_code, content, headers, final_url
+
+httplib, ssl etc. are only imported once a PooledHttpTransport is created... importing this module (as
+twitterapi, cache & publish do) stays cheap for code that never sends over httplib
+"""
+
+import sys
+import threading
+import Queue
+
+from multipart import MultipartEncoder
+
+__all__ = [
+    'UrlfetchTransport',
+    'PooledHttpTransport',
+    'HttpResponse',
+    'HttpRpc',
+    'not_sent',
+    'rpc_done',
+    'RpcWrapper',
+    'WorkerPool',
+]
+
+
+# Methods that can be sent again when a reused connection fails before the response
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+# Set by _import_http() once a PooledHttpTransport is created
+httplib = None
+select = None
+socket = None
+ssl = None
+urlparse = None
+
+
+def _import_http():
+    """ Imports the modules PooledHttpTransport sends with into this module's globals """
+    global httplib, select, socket, ssl, urlparse
+    import httplib, select, socket, ssl, urlparse
+
+
+def not_sent(exception):
+    """
+    True if a transport raised exception before the request was written... twitter can't have acted on it so even
+    a POST can safely be sent again. Only a PooledHttpTransport can tell (urlfetch's errors are always False)
+    """
+    return getattr(exception, 'not_sent', False)
+
+
+def _dropped(conn):
+    """ True if the server has closed an idle connection (its socket reads as ready... EOF) """
+    sock = conn.sock
+    if sock is None:
+        return True
+    try:
+        return bool(select.select([sock], [], [], 0)[0])
+    except (select.error, ValueError):
+        return True
+
+
+class UrlfetchTransport(object):
+    """
+    Sends requests via GAE's urlfetch (the gae_send_request functions)... the default transport
+    gae_send_request is imported on first use so this module can be imported outside of App Engine
+    """
+    streams = False
+
+    def send_request(self, method, url, payload=None, headers=None, **kwargs):
+        import gae_send_request
+        return gae_send_request.send_request(method, url, payload, headers, **kwargs)
+
+    def send_request_async(self, method, url, payload=None, headers=None, **kwargs):
+        import gae_send_request
+        return gae_send_request.send_request_async(method, url, payload, headers, **kwargs)
+
+    def send_request_ndb(self, method, url, payload=None, headers=None, **kwargs):
+        import gae_send_request
+        return gae_send_request.send_request_ndb(method, url, payload, headers, **kwargs)
+
+
+class ResponseHeaders(dict):
+    """
+    Case insensitive response headers (like urlfetch's)... keys are stored lowercase
+    """
+    def __getitem__(self, name):
+        return dict.__getitem__(self, name.lower())
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name.lower())
+
+    def get(self, name, default=None):
+        return dict.get(self, name.lower(), default)
+
+
+class HttpResponse(object):
+    """
+    A urlfetch-like response object
+    """
+    def __init__(self, status_code, content, headers, final_url=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.final_url = final_url
+
+
+class HttpRpc(object):
+    """
+    The result of PooledHttpTransport.send_request_async()... get_result() works like a urlfetch rpc's
+    """
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def _set_result(self, result=None, exc_info=None):
+        with self._lock:
+            self._result = result
+            self._exc_info = exc_info
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        """ Calls callback(rpc) once the request completes (immediately if it already has) """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+
+    def get_result(self):
+        """ Waits for and returns the response... or raises the exception the request raised """
+        self._done.wait()
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+def rpc_done(rpc):
+    """
+    True if an rpc / future has completed, False if it hasn't... None if that can't be told without blocking
+    """
+    done = getattr(rpc, 'done', None)
+    if done is not None:
+        return done()
+    state = getattr(rpc, 'state', None)
+    if state is not None:
+        from google.appengine.api import apiproxy_rpc
+        return state == apiproxy_rpc.RPC.FINISHING  # a urlfetch rpc
+    return None
+
+
+class RpcWrapper(object):
+    """
+    Base of the rpc-like objects that wrap another rpc (self._rpc)... done(), state & add_done_callback() are
+    the wrapped rpc's so a Fanout can wait on a wrapper like on the rpc itself. state & add_done_callback()
+    raise AttributeError (hasattr() is False) when the wrapped rpc has none
+    """
+    _rpc = None
+
+    def done(self):
+        return rpc_done(self._rpc)
+
+    @property
+    def state(self):
+        return self._rpc.state
+
+    @property
+    def add_done_callback(self):
+        add_done_callback = self._rpc.add_done_callback
+
+        def add(callback):
+            """ Calls callback(wrapper) once the wrapped rpc completes """
+            add_done_callback(lambda rpc: callback(self))
+        return add
+
+    @property
+    def unwrapped(self):
+        """ The innermost wrapped rpc (e.g. for UserRPC.wait_any()) """
+        return getattr(self._rpc, 'unwrapped', self._rpc)
+
+
+class WorkerPool(object):
+    """
+    A fixed size pool of daemon threads (started on first use) that run queued functions
+    """
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._tasks = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        """ Runs func(*args) on a worker thread... returns an HttpRpc for the result """
+        rpc = HttpRpc()
+        self._tasks.put((rpc, func, args))
+        if len(self._threads) < self.max_workers:
+            with self._lock:
+                if len(self._threads) < self.max_workers:
+                    thread = threading.Thread(target=self._work)
+                    thread.daemon = True
+                    thread.start()
+                    self._threads.append(thread)
+        return rpc
+
+    def _work(self):
+        while True:
+            rpc, func, args = self._tasks.get()
+            try:
+                result = func(*args)
+            except Exception:
+                rpc._set_result(exc_info=sys.exc_info())
+            else:
+                rpc._set_result(result)
+
+
+class PooledHttpTransport(object):
+    """
+    Sends requests via httplib over keep-alive connections pooled per host... runs anywhere (not just GAE)
+
+    Optional:
+        max_per_host = The most connections open to a single host (requests beyond that wait for a connection)
+        timeout = Socket timeout in seconds
+        ssl_context = The ssl.SSLContext for https connections (default: ssl.create_default_context())
+            One context is shared by every connection. Python 2.7's ssl module has no session resumption API
+            so TLS handshakes are saved by keeping connections alive rather than by resuming sessions.
+        max_workers = The number of threads that run send_request_async() requests
+    """
+    streams = True
+
+    def __init__(self, max_per_host=10, timeout=30, ssl_context=None, max_workers=10):
+        _import_http()
+
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self._pools = {}  # (scheme, host, port) -> (idle connections, connection slots)
+        self._pools_lock = threading.Lock()
+        self._workers = WorkerPool(max_workers)
+
+    def _pool(self, key):
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._pools_lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = self._pools[key] = (Queue.LifoQueue(), threading.BoundedSemaphore(self.max_per_host))
+        return pool
+
+    def _connect(self, key):
+        scheme, host, port = key
+        if scheme == 'https':
+            return httplib.HTTPSConnection(host, port, timeout=self.timeout, context=self.ssl_context)
+        return httplib.HTTPConnection(host, port, timeout=self.timeout)
+
+    def close(self):
+        """ Closes every idle connection """
+        with self._pools_lock:
+            pools, self._pools = self._pools, {}
+        for idle, _ in pools.itervalues():
+            while True:
+                try:
+                    idle.get_nowait().close()
+                except Queue.Empty:
+                    break
+
+    def _write(self, conn, method, path, payload, headers):
+        """ Writes the request to conn """
+        if isinstance(payload, MultipartEncoder):
+            # Stream the body straight from the data parts
+            conn.putrequest(method, path, skip_accept_encoding=True)
+            for name, val in headers.iteritems():
+                conn.putheader(name, val)
+            if 'Content-Length' not in headers:
+                conn.putheader('Content-Length', str(len(payload)))
+            conn.endheaders()
+            # The body follows the headers in separate writes... don't let Nagle hold them for an ACK
+            conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for chunk in payload.iter_chunks():
+                conn.sock.sendall(chunk)
+        else:
+            conn.request(method, path, payload, headers)
+
+    def send_request(self, method, url, payload=None, headers=None, **kwargs):
+        """
+        Sends a request synchronously over a pooled connection
+        Returns an HttpResponse
+        """
+        if headers is None:
+            headers = {}
+        if payload is not None and 'Content-Type' not in headers:
+            # urlfetch's default for a POST body
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        parts = urlparse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        key = (scheme, parts.hostname, parts.port or (443 if scheme == 'https' else 80))
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        idle, slots = self._pool(key)
+        slots.acquire()
+        try:
+            conn, reused = None, True
+            while conn is None:
+                try:
+                    conn = idle.get_nowait()
+                except Queue.Empty:
+                    conn, reused = self._connect(key), False
+                    break
+                if _dropped(conn):
+                    conn.close()
+                    conn = None
+
+            # A reused connection the server has closed fails... it's retried once on a new connection if the
+            # request wasn't written yet or it's safe to send twice (a POST twitter got could be posted twice).
+            # A body streamed from a chunk iterator can't be sent again
+            replayable = getattr(payload, 'replayable', True)
+            try:
+                try:
+                    try:
+                        self._write(conn, method, path, payload, headers)
+                    except (httplib.CannotSendRequest, socket.error) as e:
+                        conn.close()
+                        if not reused or isinstance(e, socket.timeout) or not replayable:
+                            raise
+                        conn, reused = self._connect(key), False
+                        self._write(conn, method, path, payload, headers)
+                except Exception as e:
+                    # The whole request didn't get written (or connected)... see not_sent()
+                    e.not_sent = True
+                    raise
+                try:
+                    response = conn.getresponse()
+                except (httplib.BadStatusLine, socket.error) as e:
+                    conn.close()
+                    if (not reused or isinstance(e, socket.timeout) or method.upper() not in IDEMPOTENT_METHODS
+                            or not replayable):
+                        raise
+                    conn = self._connect(key)
+                    self._write(conn, method, path, payload, headers)
+                    response = conn.getresponse()
+                content = response.read()
+            except Exception:
+                # Whichever connection failed (a retry's new one too) is closed rather than left for the gc
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                idle.put(conn)
+        finally:
+            slots.release()
+
+        return HttpResponse(response.status, content,
+                            ResponseHeaders((name.lower(), val) for name, val in response.getheaders()),
+                            final_url=url)
+
+    def send_request_async(self, method, url, payload=None, headers=None, **kwargs):
+        """
+        Sends a request on a worker thread
+        Returns an HttpRpc
+            To get the HttpResponse object:
+                response = rpc.get_result()
+        """
+        return self._workers.submit(self.send_request, method, url, payload, headers)
+
+    def send_request_ndb(self, method, url, payload=None, headers=None, **kwargs):
+        raise NotImplementedError('PooledHttpTransport doesn\'t support ndb futures... use async=\'rpc\'')
@@ -6,9 +6,12 @@ MIT License
 http://opensource.org/licenses/MIT
 
 Provides access to the twitter API from Google App Engine apps written in python.
+
+streaming (httplib) & media are imported by the methods that use them... not on every cold start
 """
 
 from twitterapi import TwitterApi, tbool
+from pagination import iter_items, search_next_params, cursor_next_params
 
 __all__ = [
     'Tweets',
@@ -22,7 +25,7 @@ class Tweets(TwitterApi):
 
     # Send a tweet
     def update(self,
-               status,  # The tweet text (140 twitter-count chars)
+               status,  # The tweet text (280 weighted chars... see preflight.weighted_length())
                in_reply_to_status_id=None,
                possibly_sensitive=None,
                lat=None,
@@ -30,12 +33,15 @@ class Tweets(TwitterApi):
                place_id=None,
                display_coordinates=None,
                trim_user=None,
+               media_ids=None,  # up to 4 media_id_strings from upload_media()
                async=None):
 
         # Initialize the POST vars for this request
         api_vars = {
             'status': status,
         }
+        if media_ids is not None:
+            api_vars['media_ids'] = media_ids if isinstance(media_ids, basestring) else ','.join(media_ids)
         if in_reply_to_status_id is not None:
             api_vars['in_reply_to_status_id'] = in_reply_to_status_id
         if possibly_sensitive is not None:
@@ -51,14 +57,17 @@ class Tweets(TwitterApi):
         if trim_user is not None:
             api_vars['trim_user'] = tbool(trim_user)
 
+        if self.preflight is not None:
+            self.preflight.check(api_vars)
+
         url = self.api_base_url + 'statuses/update.json'
         return self.send_request('POST', url, post_vars=api_vars, async=async)
 
 
     # Send a tweet and upload a photo
     def update_with_media(self,
-                          status,  # The tweet text (140 twitter-count chars)
-                          media,  # A dict containing 'filename', 'mimetype', 'encoding', 'data'
+                          status,  # The tweet text (280 weighted chars... see preflight.weighted_length())
+                          media,  # A dict containing 'filename', 'mimetype', 'encoding', 'data' (see MultipartEncoder)
                           in_reply_to_status_id=None,
                           possibly_sensitive=None,
                           lat=None,
@@ -85,10 +94,26 @@ class Tweets(TwitterApi):
         if display_coordinates is not None:
             api_vars['display_coordinates'] = tbool(display_coordinates)
 
+        if self.preflight is not None:
+            self.preflight.check(api_vars)
+
         url = self.api_base_url + 'statuses/update_with_media.json'
         return self.send_request('POST', url, post_vars=api_vars, async=async, multipart=True)
 
 
+    # Upload media (video, GIFs, big images) in segments... returns the media_id_string for update(media_ids=...)
+    # uploader_args are MediaUploader options e.g. segment_size, max_in_flight, max_retries
+    def upload_media(self,
+                     media,  # A str, bytearray, memoryview or seekable file-like object (read from its position)
+                     media_type,  # e.g. 'video/mp4'
+                     media_category=None,  # e.g. 'tweet_video'
+                     state=None,  # MediaUploadError.state... resumes a failed upload
+                     **uploader_args):
+
+        from media import MediaUploader
+        return MediaUploader(self, **uploader_args).upload(media, media_type, media_category, state)
+
+
     # retweet
     def retweet(self,
                 id,  # The tweet id
@@ -240,3 +265,84 @@ class Tweets(TwitterApi):
 
         url = self.api_base_url + 'search/tweets.json'
         return self.send_request('GET', url, query_vars=api_vars, async=async)
+
+
+    # Yield every tweet matching a search (newest first) one at a time, walking back through the pages via max_id
+    def iter_search(self,
+                    q,  # search query string (up to 500 chars)
+                    max_items=None,  # stop after this many tweets
+                    max_pages=None,  # stop after this many requests
+                    prefetch=True,  # fetch the next page while the current one is consumed
+                    count=100,  # tweets per page
+                    **search_vars):  # any other Tweets.search() params e.g. lang, result_type, since_id
+
+        params = dict(search_vars, q=q, count=count)
+        return iter_items(self.search, params,
+                          lambda twitter: twitter.get('statuses') if isinstance(twitter, dict) else None,
+                          search_next_params,
+                          max_items=max_items, max_pages=max_pages, prefetch=prefetch)
+
+
+    # Yield the user IDs of every retweeter of a tweet one at a time, walking through the pages via cursor
+    def iter_retweeters(self,
+                        id,  # numeric tweet id
+                        max_items=None,  # stop after this many user IDs
+                        max_pages=None,  # stop after this many requests
+                        prefetch=True,  # fetch the next page while the current one is consumed
+                        stringify_ids=True):
+
+        params = {'id': id, 'stringify_ids': stringify_ids}
+        return iter_items(self.retweeters, params,
+                          lambda twitter: twitter.get('ids') if isinstance(twitter, dict) else None,
+                          cursor_next_params,
+                          max_items=max_items, max_pages=max_pages, prefetch=prefetch)
+
+
+    # Stream the tweets matching the filter predicates as they're posted (statuses/filter)... returns a started
+    # streaming.TwitterStream... stream_args are its options e.g. queue_size, timeout
+    def filter_stream(self,
+                      track=None,  # comma separated phrases
+                      follow=None,  # comma separated user IDs
+                      locations=None,  # comma separated bounding boxes
+                      stall_warnings=None,
+                      url=None,  # default: streaming.FILTER_URL
+                      **stream_args):
+        from streaming import FILTER_URL, TwitterStream
+
+        api_vars = {}
+        if track is not None:
+            api_vars['track'] = track
+        if follow is not None:
+            api_vars['follow'] = follow
+        if locations is not None:
+            api_vars['locations'] = locations
+        if stall_warnings is not None:
+            api_vars['stall_warnings'] = tbool(stall_warnings)
+
+        return TwitterStream(self.oauth, url or FILTER_URL, 'POST', api_vars, **stream_args).start()
+
+
+    # Stream the authenticating user's timeline & events (user stream)... returns a started streaming.TwitterStream
+    def user_stream(self,
+                    with_=None,  # 'user' or 'followings'
+                    replies=None,  # 'all'
+                    track=None,
+                    locations=None,
+                    stall_warnings=None,
+                    url=None,  # default: streaming.USER_URL
+                    **stream_args):
+        from streaming import USER_URL, TwitterStream
+
+        api_vars = {}
+        if with_ is not None:
+            api_vars['with'] = with_
+        if replies is not None:
+            api_vars['replies'] = replies
+        if track is not None:
+            api_vars['track'] = track
+        if locations is not None:
+            api_vars['locations'] = locations
+        if stall_warnings is not None:
+            api_vars['stall_warnings'] = tbool(stall_warnings)
+
+        return TwitterStream(self.oauth, url or USER_URL, 'GET', api_vars, **stream_args).start()
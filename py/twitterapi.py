@@ -8,28 +8,148 @@ http://opensource.org/licenses/MIT
 Base Twitter API class
 """
 
-from gae_send_request import send_request, send_request_async, send_request_ndb
+from multipart import replayable
 from oauth import OAuth1
+from ratelimit import endpoint_resource, RateLimitedRpc
+from timeit import default_timer as timer
 import json
 
 __all__ = [
+    'TwitterError',
+    'TwitterResponse',
+    'set_json_decoder',
+    'json_decoder',
     'tbool',
     'twitter_response',
+    'PreparedCall',
     'TwitterApi',
 ]
 
 
-def twitter_response(urlfetch_response):
+class TwitterError(Exception):
     """
-        Adds a 'twitter' member to the urlfetch_response object
-        The 'twitter' member is a python dict of the decoded twitter json response
+    A twitter API request failed
+        response = The twitter_response() of the failed request (None if there wasn't one)
     """
+    def __init__(self, message, response=None):
+        Exception.__init__(self, message)
+        self.response = response
+
+
+# The function that decodes response content... see set_json_decoder()
+_json_loads = None
+
+def set_json_decoder(loads):
+    """
+    Sets the function twitter responses are decoded with (e.g. ujson.loads)
+    None picks the fastest one available: ujson, simplejson then json
+    """
+    global _json_loads
+    if loads is None:
+        for name in ('ujson', 'simplejson'):
+            try:
+                loads = __import__(name).loads
+                break
+            except ImportError:
+                pass
+        else:
+            loads = json.loads
+    _json_loads = loads
+
+
+def json_decoder():
+    """ Returns the function twitter responses are decoded with (see set_json_decoder()) """
+    if _json_loads is None:
+        set_json_decoder(None)
+    return _json_loads
+
+
+# fields -> object_pairs_hook
+_projection_hooks = {}
+
+def _projection_hook(fields):
+    """
+    Returns a json object_pairs_hook that only keeps the keys named in fields... plus the containers twitter
+    wraps tweets in (search 'statuses', lookup map=true 'id' dicts keyed by id_str and cursors)
+    """
+    fields = tuple(fields)
+    hook = _projection_hooks.get(fields)
+    if hook is None:
+        names = frozenset(name for field in fields for name in field.split('.'))
+        names |= frozenset(['statuses', 'id', 'ids', 'next_cursor_str', 'previous_cursor_str'])
+
+        def hook(pairs):
+            return {name: val for name, val in pairs if name in names or name.isdigit()}
+        hook = _projection_hooks[fields] = hook
+    return hook
+
+
+_UNDECODED = object()
+
+
+def _decode(content, fields=None):
+    """ The decoded twitter json content (None if there's none or it isn't json) """
     # If there's any content... (regardless of the status)
-    if urlfetch_response.content:
+    if not content:
+        return None
+    try:
+        if fields:
+            return json.loads(content, object_pairs_hook=_projection_hook(fields))
+        if _json_loads is None:
+            set_json_decoder(None)
+        return _json_loads(content)
+    except Exception:
+        return None
+
+
+class TwitterResponse(object):
+    """
+    Mixed into a urlfetch response's class by twitter_response()... the response itself gets a 'twitter'
+    member that's decoded on first access. isinstance(response, TwitterResponse) once it has one
+    """
+    @property
+    def twitter(self):
+        twitter = self.__dict__.get('_twitter', _UNDECODED)
+        if twitter is _UNDECODED:
+            stats = self.__dict__.get('_stats')  # (instrument.Instrumentation, resource) to time the decode with
+            if stats is not None:
+                start = timer()
+            twitter = self._twitter = _decode(self.content, self.__dict__.get('_fields'))
+            if stats is not None:
+                stats[0].timing('decode', stats[1], timer() - start)
+        return twitter
+
+    @twitter.setter
+    def twitter(self, twitter):
+        self._twitter = twitter
+
+
+# A response's class -> its subclass with TwitterResponse mixed in
+_twitter_classes = {}
+
+def twitter_response(urlfetch_response, fields=None):
+    """
+        Adds a 'twitter' member to the urlfetch_response object (& returns it)
+        The 'twitter' member is a python dict of the decoded twitter json response... decoded on first access
+            fields = Optional keys to keep e.g. ('id_str', 'user.id_str', 'text')... every other key is dropped
+                     as the json is decoded (a key named in fields is kept at every level it appears)
+    """
+    if isinstance(urlfetch_response, TwitterResponse):
+        if fields is None or fields == urlfetch_response.__dict__.get('_fields'):
+            return urlfetch_response
+    else:
+        cls = urlfetch_response.__class__
+        twitter_cls = _twitter_classes.get(cls)
+        if twitter_cls is None:
+            twitter_cls = _twitter_classes[cls] = type(cls.__name__, (cls, TwitterResponse), {})
         try:
-            urlfetch_response.twitter = json.loads(urlfetch_response.content)
-        except Exception:
-            urlfetch_response.twitter = None
+            urlfetch_response.__class__ = twitter_cls
+        except TypeError:
+            # An old-style or __slots__ class can't take the mixin... it's decoded right away
+            urlfetch_response.twitter = _decode(urlfetch_response.content, fields)
+            return urlfetch_response
+    urlfetch_response._fields = fields
+    urlfetch_response._twitter = _UNDECODED
     return urlfetch_response
 
 
@@ -38,28 +158,272 @@ def tbool(val):
     return str(val).lower()
 
 
+def _replayable(request):
+    """ True if the request can be sent again (its multipart post_vars have no chunk iterator data) """
+    method, url, query_vars, post_vars, multipart, prepared = request
+    return not (multipart and post_vars) or replayable(post_vars)
+
+
+def _updated(fixed_vars, vars):
+    if not vars:
+        return fixed_vars
+    updated = dict(fixed_vars or {})
+    updated.update(vars)
+    return updated
+
+
+class PreparedCall(object):
+    """
+    A twitter API call that's sent over & over with only a few vars changing (polling)
+    Returned by the request methods with async='prepared'... the fixed vars are encoded once (OAuth1.prepare())
+
+        call = tweets.search('sooshi', count=100, async='prepared')
+        response = call.send(query_vars={'since_id': since_id})
+    """
+    def __init__(self, api, method, url, query_vars=None, post_vars=None, multipart=False):
+        self.api = api
+        self.method = method
+        self.url = url
+        self.query_vars = query_vars
+        self.post_vars = post_vars
+        self.multipart = multipart
+        prepare = getattr(api.signer, 'prepare', None)
+        if prepare is not None and not multipart:
+            self.prepared = prepare(method, url, query_vars, post_vars)
+        else:
+            self.prepared = None  # signed from scratch each time
+
+    def send(self, query_vars=None, post_vars=None, async=None):
+        """
+        Sends the call with query_vars & post_vars added to (or replacing) the fixed vars
+        async works like TwitterApi.send_request()'s
+        """
+        if self.prepared is None:
+            return self.api.send_request(self.method, self.url, _updated(self.query_vars, query_vars),
+                                         _updated(self.post_vars, post_vars), async=async, multipart=self.multipart)
+        return self.api.send_request(self.method, self.url, query_vars, post_vars, async=async,
+                                     prepared=self.prepared)
+
+
 class TwitterApi(object):
     """
     Base class for accessing the twitter 1.1 API
+
+    Optional:
+        transport = How requests are sent (default: UrlfetchTransport... GAE's urlfetch)
+            Use transports.PooledHttpTransport() outside of App Engine
+        rate_limiter = A ratelimit.RateLimiter that delays requests to stay within twitter's rate limit windows
+            and retries 429/5xx responses with backoff (default: None... no rate limiting)
+        response_cache = A cache.ResponseCache for GET responses (default: None... no caching)
+        credential_pool = A credentials.CredentialPool that signs each GET with the credentials that have the
+            most requests remaining for its endpoint (replaces the consumer/access keys... oauth is its primary)
+        stats = An instrument.Instrumentation (e.g. instrument.StatsRecorder()) that's given the time spent signing,
+            building bodies, sending & decoding plus per-endpoint request, byte & status counts (default: None)
+        preflight = A preflight.Preflight that checks tweets before they're signed... update() & update_with_media()
+            raise preflight.PreflightError instead of sending what twitter would reject (default: None)
     """
-    def __init__(self, consumer_key=None, consumer_secret_key=None, access_token=None, access_secret_token=None):
-        self.oauth = OAuth1(consumer_key=consumer_key,
-                            consumer_secret_key=consumer_secret_key,
-                            access_token=access_token,
-                            access_secret_token=access_secret_token)
+    def __init__(self, consumer_key=None, consumer_secret_key=None, access_token=None, access_secret_token=None,
+                 transport=None, rate_limiter=None, response_cache=None, credential_pool=None, stats=None,
+                 preflight=None):
+        if transport is None:
+            from transports import UrlfetchTransport  # only imported when it's the transport
+            transport = UrlfetchTransport()
+        self.transport = transport
+        self.credential_pool = credential_pool
+        if credential_pool is not None:
+            self.oauth = credential_pool.primary  # still an OAuth1... tweets.oauth(...) changes the primary
+            self.transport = credential_pool.wrap_transport(self.transport)
+        else:
+            self.oauth = OAuth1(consumer_key=consumer_key,
+                                consumer_secret_key=consumer_secret_key,
+                                access_token=access_token,
+                                access_secret_token=access_secret_token)
+        if stats is not None:
+            self.transport = stats.wrap_transport(self.transport)
+        self.stats = stats
+        self.rate_limiter = rate_limiter
+        self.response_cache = response_cache
+        self.preflight = preflight
         self.api_base_url = 'https://api.twitter.com/1.1/'
+        self.upload_base_url = 'https://upload.twitter.com/1.1/'
+
+    @property
+    def signer(self):
+        """ What requests are signed with... the credential pool if there is one, otherwise oauth """
+        return self.credential_pool if self.credential_pool is not None else self.oauth
 
-    def send_request(self, method, url, query_vars=None, post_vars=None, async=None, multipart=False):
+    def send_request(self, method, url, query_vars=None, post_vars=None, async=None, multipart=False,
+                     prepared=None):
         """
         Sends a twitter API request
+            async = None (blocking... returns a twitter_response())
+                    'rpc' or True (returns an rpc... response = twitter_response(rpc.get_result()))
+                    'ndb' (returns an ndb Future... response = twitter_response(future.get_result()))
+                    'signed' (doesn't send... returns the oauth.SignedRequest for send_signed())
+                    'prepared' (doesn't send... returns a PreparedCall to send it over & over)
+            prepared = An oauth.PreparedRequest with the fixed vars (see PreparedCall)... query_vars & post_vars
+                       are then only the vars that change
+        """
+        if async == 'prepared':
+            return PreparedCall(self, method, url, query_vars, post_vars, multipart)
+
+        request = (method, url, query_vars, post_vars, multipart, prepared)
+        if async == 'signed':
+            signed = self._sign(request)
+            signed.post_vars = prepared.all_post_vars(post_vars) if prepared is not None else post_vars
+            return signed
+
+        cache = self.response_cache
+        if cache is not None:
+            if prepared is not None:
+                query_vars = prepared.all_query_vars(query_vars)
+                post_vars = prepared.all_post_vars(post_vars)
+            signer, token = None, getattr(self.oauth, 'access_token', None)
+            if self.credential_pool is not None and method.upper() == 'GET':
+                # Keyed on the token that signs it... so the pool picks it now
+                signer = self.credential_pool.pin(endpoint_resource(url))
+                token = signer.oauth.access_token
+            key, ttl = cache.key(method, url, query_vars, token)
+            if key is not None:
+                if async is True or async == 'rpc':
+                    return cache.fetch_rpc(key, ttl, lambda: self._send_rpc(request, signer))
+                elif async == 'ndb':
+                    return cache.fetch_ndb(key, ttl, lambda: self._send_ndb(request, signer))
+                else:
+                    return self._response(cache.fetch(key, ttl, lambda: self._send_sync(request, signer)), url)
+            cache.invalidate(method, url, query_vars, post_vars)
+
+        if async is True or async == 'rpc':
+            return self._send_rpc(request)
+        elif async == 'ndb':
+            return self._send_ndb(request)
+        else:
+            return self._response(self._send_sync(request), url)
+
+    def send_signed(self, signed, async=None):
         """
+        Sends a request signed with async='signed' (async works like send_request()'s)
+        The rate limiter's budget is respected & updated but 429/5xx responses aren't retried... a retry
+        needs a new signature (nonce)
+        """
+        method, url, payload, headers = signed
+
+        if self.response_cache is not None:
+            self.response_cache.invalidate(method, url.split('?', 1)[0],
+                                           post_vars=getattr(signed, 'post_vars', None))
 
-        method, url, payload, headers = self.oauth.init_request(method, url, query_vars=query_vars,
-                                                                post_vars=post_vars, multipart=multipart)
+        limiter = self.rate_limiter
+        if limiter is not None:
+            resource = endpoint_resource(url)
+            limiter.wait(resource)
 
         if async is True or async == 'rpc':
-            return send_request_async(method, url, payload, headers)
+            rpc = self.transport.send_request_async(method, url, payload, headers)
+            if limiter is not None:
+                rpc = RateLimitedRpc(limiter, resource, rpc, None)
+            return rpc
         elif async == 'ndb':
-            return send_request_ndb(method, url, payload, headers)
+            future = self.transport.send_request_ndb(method, url, payload, headers)
+            if limiter is not None:
+                def update_budget():
+                    if future.get_exception() is None:
+                        limiter.update(resource, future.get_result())
+                future.add_callback(update_budget)
+            return future
+        else:
+            response = self.transport.send_request(method, url, payload, headers)
+            if limiter is not None:
+                limiter.update(resource, response)
+            return self._response(response, url)
+
+    def _response(self, response, url):
+        """ twitter_response() of a blocking call's response... with its decode timed when instrumented """
+        response = twitter_response(response)
+        if self.stats is not None:
+            response._stats = (self.stats, endpoint_resource(url))
+        return response
+
+    def _sign(self, request, signer=None):
+        """
+        Returns the SignedRequest (method, url, payload, headers) of a request
+            signer = A credential pool's pinned signer (see CredentialPool.pin()) to sign with instead of self.signer
+        """
+        method, url, query_vars, post_vars, multipart, prepared = request
+        pinned = {}
+        if signer is None:
+            signer = self.signer
+        else:
+            pinned['oauth'] = signer.oauth  # a prepared request is the pool's (see CredentialPool.prepare())
+        stream = getattr(self.transport, 'streams', False)
+        stats = self.stats
+        if stats is None:
+            if prepared is not None:
+                return prepared.sign(query_vars, post_vars, **pinned)
+            return signer.init_request(method, url, query_vars=query_vars,
+                                       post_vars=post_vars, multipart=multipart, stream=stream)
+
+        # Instrumented... a multipart body is built after signing so the two are timed separately
+        resource = endpoint_resource(url)
+        start = timer()
+        if prepared is not None:
+            signed = prepared.sign(query_vars, post_vars, **pinned)
         else:
-            return twitter_response(send_request(method, url, payload, headers))
+            signed = signer.init_request(method, url, query_vars=query_vars,
+                                         post_vars=post_vars, multipart=multipart, stream=True)
+        stats.timing('sign', resource, timer() - start)
+        if multipart and signed.payload is not None and not stream:
+            start = timer()
+            signed.payload = signed.payload.getvalue()
+            stats.timing('body', resource, timer() - start)
+            del signed.headers['Content-Length']
+        return signed
+
+    def _send_sync(self, request, signer=None):
+        limiter = self.rate_limiter
+        if limiter is None:
+            return self.transport.send_request(*self._sign(request, signer))
+
+        resource = endpoint_resource(request[1])
+        attempt = 0
+        while True:
+            limiter.wait(resource)
+            response = self.transport.send_request(*self._sign(request, signer))
+            limiter.update(resource, response)
+            if not limiter.should_retry(response, attempt, request[0]) or not _replayable(request):
+                return response
+            limiter.sleep(limiter.backoff(resource, response, attempt))
+            attempt += 1
+
+    def _send_rpc(self, request, signer=None):
+        limiter = self.rate_limiter
+        if limiter is None:
+            return self.transport.send_request_async(*self._sign(request, signer))
+
+        resource = endpoint_resource(request[1])
+        limiter.wait(resource)
+        send = lambda: self.transport.send_request_async(*self._sign(request, signer))
+        return RateLimitedRpc(limiter, resource, send(), send if _replayable(request) else None, request[0])
+
+    def _send_ndb(self, request, signer=None):
+        limiter = self.rate_limiter
+        if limiter is None:
+            return self.transport.send_request_ndb(*self._sign(request, signer))
+
+        from google.appengine.ext import ndb
+
+        @ndb.tasklet
+        def send_limited(resource):
+            attempt = 0
+            while True:
+                delay = limiter.delay(resource)
+                if delay:
+                    yield ndb.sleep(delay)
+                    continue
+                response = yield self.transport.send_request_ndb(*self._sign(request, signer))
+                limiter.update(resource, response)
+                if not limiter.should_retry(response, attempt, request[0]) or not _replayable(request):
+                    raise ndb.Return(response)
+                yield ndb.sleep(limiter.backoff(resource, response, attempt))
+                attempt += 1
+
+        return send_limited(endpoint_resource(request[1]))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+LookupBatcher against a local StubServer... run with python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from batching import LookupBatcher
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+from twitterapi import TwitterError
+
+LOOKUP = '/1.1/statuses/lookup.json'
+
+
+class LookupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.status = 200
+        self.server = StubServer().start()
+        self.server.add_response('GET', LOOKUP, body=self.lookup)
+        self.tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport())
+        self.tweets.api_base_url = self.server.url + '/1.1/'
+
+    def tearDown(self):
+        self.server.stop()
+
+    def lookup(self, request):
+        # Odd ids don't exist (null in the map)
+        ids = request.query['id'].split(',')
+        found = dict((id, {'id_str': id} if int(id) % 2 == 0 else None) for id in ids)
+        return self.status, json.dumps({'id': found}), {}
+
+    def batches(self):
+        return [request.query['id'].split(',') for request in self.server.requests if request.path == LOOKUP]
+
+    def test_coalesced(self):
+        batcher = LookupBatcher(self.tweets)
+        futures = batcher.load_many(range(10))
+        self.assertEqual(self.batches(), [])  # nothing's sent until a result is wanted
+        self.assertEqual(futures[4].get_result(), {'id_str': '4'})
+        self.assertIsNone(futures[3].get_result())
+        self.assertEqual([future.get_result() and future.get_result()['id_str'] for future in futures],
+                         ['0', None, '2', None, '4', None, '6', None, '8', None])
+        self.assertEqual(len(self.batches()), 1)
+        self.assertEqual(self.server.requests[0].query['map'], 'true')
+
+    def test_max_batch(self):
+        batcher = LookupBatcher(self.tweets, max_batch=100)
+        futures = batcher.load_many(range(250))
+        deadline = time.time() + 5
+        while len(self.batches()) < 2 and time.time() < deadline:
+            time.sleep(0.01)  # sent (async) as each one filled up
+        self.assertEqual([len(batch) for batch in self.batches()], [100, 100])
+        self.assertEqual(futures[249].get_result(), None)
+        self.assertEqual([len(batch) for batch in self.batches()], [100, 100, 50])
+
+    def test_same_id_shares_a_future(self):
+        batcher = LookupBatcher(self.tweets)
+        futures = batcher.load_many(['2', 2, '2'])
+        self.assertIs(futures[0], futures[1])
+        self.assertIs(futures[0], futures[2])
+        futures[0].get_result()
+        self.assertEqual(self.batches(), [['2']])
+
+    def test_failed_lookup(self):
+        self.status = 503
+        futures = LookupBatcher(self.tweets).load_many(['2', '4'])
+        for future in futures:
+            with self.assertRaises(TwitterError) as failed:
+                future.get_result()
+            self.assertEqual(failed.exception.response.status_code, 503)
+        self.assertEqual(len(self.batches()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
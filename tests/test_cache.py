@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+ResponseCache invalidation & single-flight against a local StubServer... run with python -m unittest discover tests
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from cache import ResponseCache
+from credentials import CredentialPool
+from oauth import OAuth1
+from stubserver import StubServer
+from transports import HttpResponse, PooledHttpTransport
+from tweets import Tweets
+
+SHOW = '/1.1/statuses/show.json'
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.latency = 0
+        self.server = StubServer().start()
+        self.server.add_response('GET', SHOW, body=self.show)
+        self.server.add_response('POST', '/1.1/statuses/update.json', body='{"id_str": "3"}')
+        self.server.add_response('POST', '/1.1/statuses/retweet/1.json', body='{"id_str": "4"}')
+        self.cache = ResponseCache()
+        self.tweets = self.make_tweets()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def make_tweets(self, **kwargs):
+        tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport(),
+                        response_cache=self.cache, **kwargs)
+        tweets.api_base_url = self.server.url + '/1.1/'
+        return tweets
+
+    def show(self, request):
+        time.sleep(self.latency)
+        return 200, '{"id_str": "%s"}' % request.query['id'], {}
+
+    def sent(self, path=SHOW):
+        return len([request for request in self.server.requests if request.path == path])
+
+
+class InvalidationTest(CacheTestCase):
+    """ Writes orphan the cached reads they affect """
+
+    def test_cached(self):
+        self.assertEqual(self.tweets.show('1').twitter['id_str'], '1')
+        self.assertEqual(self.tweets.show('1').twitter['id_str'], '1')
+        self.assertEqual(self.tweets.show('2').twitter['id_str'], '2')
+        self.assertEqual(self.sent(), 2)
+
+    def test_reply_invalidates_the_replied_to_tweet(self):
+        self.tweets.show('1')
+        self.tweets.show('2')
+        self.tweets.update('@someone hi', in_reply_to_status_id='1')
+        self.tweets.show('1')
+        self.tweets.show('2')
+        self.assertEqual(self.sent(), 3)
+
+    def test_retweet_invalidates_the_tweet(self):
+        self.tweets.show('1')
+        self.tweets.retweet('1')
+        self.tweets.show('1')
+        self.assertEqual(self.sent(), 2)
+
+    def test_hits_are_copies(self):
+        first = self.tweets.show('1')
+        first.twitter['id_str'] = 'changed'
+        self.assertEqual(self.tweets.show('1').twitter['id_str'], '1')
+
+
+class SingleFlightTest(CacheTestCase):
+    """ Identical requests in flight at the same time share one """
+
+    def test_blocking(self):
+        self.latency = 0.2
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.tweets.show('1'))) for _ in xrange(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.sent(), 1)
+        self.assertEqual(len(set(id(response) for response in results)), 5)
+        self.assertEqual([response.twitter['id_str'] for response in results], ['1'] * 5)
+
+    def test_rpc(self):
+        self.latency = 0.2
+        rpcs = [self.tweets.show('1', async='rpc') for _ in xrange(3)]
+        responses = [rpc.get_result() for rpc in rpcs]
+        self.assertEqual(self.sent(), 1)
+        self.assertEqual(len(set(id(response) for response in responses)), 3)
+
+    def test_blocking_joins_rpc_with_a_copy(self):
+        self.latency = 0.2
+        rpc = self.tweets.show('1', async='rpc')
+        response = self.tweets.show('1')
+        self.assertIsNot(response, rpc.get_result())
+        self.assertEqual(self.sent(), 1)
+
+    def test_unread_rpc_lands(self):
+        rpc = self.tweets.show('1', async='rpc')
+        while not rpc.done():  # (wait() would get_result())
+            time.sleep(0.01)
+        time.sleep(0.05)  # the done callbacks run on the transport's worker
+        self.assertEqual(self.cache._flights, {})
+
+    def test_sent_outside_the_lock(self):
+        sending = threading.Event()
+        release = threading.Event()
+        response = HttpResponse(200, '{"id_str": "1"}', {})
+
+        class Rpc(object):
+            def get_result(self):
+                return response
+
+        def send_async():
+            sending.set()
+            release.wait()  # e.g. waiting on the rate limiter
+            return Rpc()
+
+        leader = []
+        thread = threading.Thread(target=lambda: leader.append(self.cache.fetch_rpc('a', 60, send_async)))
+        thread.start()
+        sending.wait()
+
+        # Another key isn't held up... the same key waits for the leader's rpc
+        self.assertIs(self.cache.fetch_rpc('b', 60, Rpc).get_result(), response)
+        follower = []
+        joining = threading.Thread(target=lambda: follower.append(self.cache.fetch_rpc('a', 60, send_async)))
+        joining.start()
+        joining.join(0.1)
+        self.assertEqual(follower, [])
+        release.set()
+        thread.join()
+        joining.join()
+        self.assertIs(leader[0].get_result(), response)
+        self.assertEqual(follower[0].get_result().content, response.content)
+        self.assertIsNot(follower[0].get_result(), response)
+
+    def test_failed_send(self):
+        def send_async():
+            raise IOError('refused')
+
+        with self.assertRaises(IOError):
+            self.cache.fetch_rpc('a', 60, send_async)
+        self.assertEqual(self.cache._flights, {})
+
+
+class PoolKeyTest(CacheTestCase):
+    """ With a credential pool entries are keyed on the token that signed the request """
+
+    def test_signing_token(self):
+        pool = CredentialPool([OAuth1('key', 'secret', 'token' + str(i), 'token_secret') for i in xrange(3)])
+        tweets = self.make_tweets(credential_pool=pool)
+        for _ in xrange(3):
+            tweets.show('1')
+        tokens = [re.search(r'oauth_token="([^"]*)"', request.headers['authorization']).group(1)
+                  for request in self.server.requests]
+        for token in tokens:
+            key, ttl = self.cache.key('GET', tweets.api_base_url + 'statuses/show.json', {'id': '1'}, token)
+            self.assertIsNotNone(self.cache.get(key))
+
+
+if __name__ == '__main__':
+    unittest.main()
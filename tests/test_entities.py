@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+EntityStore (lookup against a local StubServer)... run with python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from entities import EntityStore
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+
+LOOKUP = '/1.1/statuses/lookup.json'
+NOW = 1400000000
+
+
+def tweet(id, user_id='7', in_reply_to=None):
+    return {'id_str': str(id), 'text': 'tweet {}'.format(id), 'in_reply_to_status_id_str': in_reply_to,
+            'user': {'id_str': user_id, 'screen_name': 'user' + user_id}}
+
+
+class EntityStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = NOW
+        self.server = StubServer().start()
+        self.server.add_response('GET', LOOKUP, body=self.lookup)
+        self.tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport())
+        self.tweets.api_base_url = self.server.url + '/1.1/'
+        self.store = EntityStore(max_age=300, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def lookup(self, request):
+        # Odd ids don't exist (null in the map)
+        ids = request.query['id'].split(',')
+        return 200, json.dumps({'id': dict((id, tweet(id) if int(id) % 2 == 0 else None) for id in ids)}), {}
+
+    def looked_up(self):
+        return [request.query['id'].split(',') for request in self.server.requests if request.path == LOOKUP]
+
+    def test_ingest(self):
+        self.assertEqual(self.store.ingest({'statuses': [tweet(10), tweet(11, in_reply_to='10')]}), 4)  # the user twice
+        self.assertEqual(self.store.tweet(10).text, 'tweet 10')
+        self.assertEqual(self.store.user_by_screen_name('USER7').id, '7')
+        self.assertEqual([t.id for t in self.store.replies_to(10)], ['11'])
+        self.assertEqual([t.id for t in self.store.tweets_by_user('7')], ['11', '10'])
+        self.now += 300
+        self.assertIsNone(self.store.tweet(10))  # stale
+        self.assertEqual(self.store.tweet(10, max_age=600).id, '10')
+
+    def test_lookup(self):
+        self.store.ingest([tweet(10)])
+        found = self.store.lookup(self.tweets, [10, 12, 13])
+        self.assertEqual(sorted(found), ['10', '12', '13'])
+        self.assertEqual(found['12'].id, '12')
+        self.assertIsNone(found['13'])
+        self.assertEqual([sorted(ids) for ids in self.looked_up()], [['12', '13']])
+        self.assertEqual((self.store.hits, self.store.misses), (1, 2))
+        self.assertEqual(self.store.tweet(12).id, '12')  # stored for next time
+
+    def test_repeated_ids(self):
+        self.store.ingest([tweet(10)])
+        found = self.store.lookup(self.tweets, ['10', 10, '12', 12, '12'])
+        self.assertEqual(sorted(found), ['10', '12'])
+        self.assertEqual(self.looked_up(), [['12']])
+        self.assertEqual((self.store.hits, self.store.misses), (1, 1))  # once per distinct id
+
+
+if __name__ == '__main__':
+    unittest.main()
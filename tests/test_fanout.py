@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Fanout against a local StubServer with every rpc wrapper the library puts around an async='rpc' request...
+run with python -m unittest discover tests
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from cache import ResponseCache
+from credentials import CredentialPool
+from fanout import Fanout
+from instrument import StatsRecorder
+from oauth import OAuth1
+from ratelimit import RateLimiter
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+
+SLOW = 0.5
+
+
+class WrappedRpcTest(unittest.TestCase):
+    """ A slow call at the head mustn't hold back the calls that complete after it was sent """
+
+    def setUp(self):
+        self.server = StubServer().start()
+        self.server.add_response('GET', '/1.1/statuses/show.json', body=self.show)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def show(self, request):
+        if request.query['id'] == 'slow':
+            time.sleep(SLOW)
+        return 200, '{"id_str": "%s"}' % request.query['id'], {}
+
+    def tweets(self, **kwargs):
+        tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport(), **kwargs)
+        tweets.api_base_url = self.server.url + '/1.1/'
+        return tweets
+
+    def check(self, tweets):
+        fanout = Fanout(max_in_flight=4)
+        futures = [fanout.submit(tweets.show, tweet_id) for tweet_id in ('slow', '1', '2')]
+        start = time.time()
+        self.assertEqual(futures[2].get_result().twitter['id_str'], '2')
+        self.assertEqual(futures[1].get_result().twitter['id_str'], '1')  # either of the two can land first
+        self.assertLess(time.time() - start, SLOW / 2)
+        self.assertFalse(futures[0].done())
+        self.assertEqual(futures[0].get_result().twitter['id_str'], 'slow')
+
+    def test_plain(self):
+        self.check(self.tweets())
+
+    def test_rate_limiter(self):
+        self.check(self.tweets(rate_limiter=RateLimiter()))
+
+    def test_stats(self):
+        self.check(self.tweets(stats=StatsRecorder()))
+
+    def test_credential_pool(self):
+        pool = CredentialPool([OAuth1('key', 'secret', 'token' + str(i), 'token_secret') for i in xrange(2)])
+        self.check(self.tweets(credential_pool=pool))
+
+    def test_response_cache(self):
+        self.check(self.tweets(response_cache=ResponseCache()))
+
+    def test_everything(self):
+        pool = CredentialPool([OAuth1('key', 'secret', 'token' + str(i), 'token_secret') for i in xrange(2)])
+        self.check(self.tweets(rate_limiter=RateLimiter(), stats=StatsRecorder(), credential_pool=pool,
+                               response_cache=ResponseCache()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+MediaUploader against a local StubServer... run with python -m unittest discover tests
+"""
+
+import cgi
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from media import MediaUploadError
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+
+
+class ResumeTest(unittest.TestCase):
+    """ A failed APPEND then a resume from the error's state """
+
+    def setUp(self):
+        self.segments = {}
+        self.failing = set([3])
+        self.lock = threading.Lock()
+        self.server = StubServer().start()
+        self.server.add_response('POST', '/1.1/media/upload.json', body=self.upload)
+        self.tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport())
+        self.tweets.upload_base_url = self.server.url + '/1.1/'
+
+    def tearDown(self):
+        self.server.stop()
+
+    def upload(self, request):
+        content_type = request.headers.get('content-type', '')
+        if not content_type.startswith('multipart'):
+            command = dict(pair.split('=', 1) for pair in request.body.split('&'))['command']
+            if command == 'INIT':
+                return 202, '{"media_id_string": "710511363345354753"}', {}
+            return 200, '{"media_id_string": "710511363345354753"}', {}  # FINALIZE
+        form = cgi.FieldStorage(fp=StringIO(request.body), environ={
+            'REQUEST_METHOD': 'POST',
+            'CONTENT_TYPE': content_type,
+            'CONTENT_LENGTH': str(len(request.body)),
+        })
+        index = int(form.getvalue('segment_index'))
+        with self.lock:
+            if index in self.failing:
+                return 500, '{}', {}
+            self.segments[index] = form['media'].value
+        return 204, '', {}
+
+    def test_resume_file(self):
+        data = os.urandom(5000)
+        media = tempfile.TemporaryFile()
+        media.write('HEAD' + data)
+        media.seek(4)
+
+        with self.assertRaises(MediaUploadError) as failed:
+            self.tweets.upload_media(media, 'video/mp4', segment_size=1000, max_retries=0, sleep=lambda secs: None)
+        state = failed.exception.state
+        self.assertEqual(state.done, set([0, 1, 2, 4]))
+        self.assertEqual(media.tell(), 4)
+
+        self.failing.clear()
+        media.seek(0, os.SEEK_END)  # wherever the caller left it... the resume seeks back to the start
+        media_id = self.tweets.upload_media(media, 'video/mp4', state=state, segment_size=1000)
+        self.assertEqual(media_id, '710511363345354753')
+        self.assertEqual(''.join(self.segments[index] for index in sorted(self.segments)), data)
+        self.assertEqual(media.tell(), 4 + len(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
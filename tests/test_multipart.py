@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+MultipartEncoder bodies (parsed back with cgi)... run with python -m unittest discover tests
+"""
+
+import cgi
+import os
+import sys
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from multipart import MultipartEncoder, replayable
+
+BOUNDARY = 'b0undary'
+PNG = '\x89PNG\r\n\x1a\n' + '\0' * 100
+
+
+def parse(encoder, body):
+    return cgi.FieldStorage(fp=StringIO(body), environ={
+        'REQUEST_METHOD': 'POST',
+        'CONTENT_TYPE': encoder.content_type,
+        'CONTENT_LENGTH': str(len(body)),
+    })
+
+
+class EncoderTest(unittest.TestCase):
+
+    def test_fields(self):
+        encoder = MultipartEncoder({'status': u'caf\xe9', 'count': 5,
+                                    'media[]': {'data': PNG, 'filename': u'\u2603.png', 'mimetype': 'image/png'}},
+                                   BOUNDARY)
+        body = encoder.getvalue()
+        self.assertEqual(len(body), len(encoder))
+        form = parse(encoder, body)
+        self.assertEqual(form.getvalue('status'), 'caf\xc3\xa9')  # unicode params are sent as utf-8
+        self.assertEqual(form.getvalue('count'), '5')
+        self.assertEqual(form['media[]'].value, PNG)
+        self.assertEqual(form['media[]'].filename, '\xe2\x98\x83.png')
+        self.assertEqual(form['media[]'].type, 'image/png')
+
+    def test_file(self):
+        data = StringIO('xx' + PNG)
+        data.seek(2)
+        encoder = MultipartEncoder({'media': {'data': data}}, BOUNDARY)
+        self.assertTrue(encoder.replayable)
+        self.assertEqual(parse(encoder, encoder.getvalue())['media'].value, PNG)
+        self.assertEqual(data.tell(), 2)  # left where it started
+        self.assertEqual(str(encoder.to_buffer()), ''.join(str(bytearray(chunk)) for chunk in encoder.iter_chunks(7)))
+
+    def test_chunks(self):
+        fields = {'media': {'data': iter([PNG[:50], PNG[50:]]), 'size': len(PNG)}}
+        self.assertFalse(replayable(fields))
+        encoder = MultipartEncoder(fields, BOUNDARY)
+        self.assertFalse(encoder.replayable)
+        self.assertEqual(parse(encoder, encoder.getvalue())['media'].value, PNG)
+        with self.assertRaises(ValueError):
+            encoder.getvalue()  # the chunks are consumed
+
+    def test_unicode_data(self):
+        with self.assertRaises(TypeError):
+            MultipartEncoder({'media': {'data': u'\u2603 not bytes'}}, BOUNDARY)
+        encoder = MultipartEncoder({'media': {'data': u'\u2603 not bytes'.encode('utf-8')}}, BOUNDARY)
+        self.assertEqual(parse(encoder, encoder.getvalue())['media'].value, '\xe2\x98\x83 not bytes')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+OAuth1 signing against twitter's documented example & prepared requests... run with
+python -m unittest discover tests
+"""
+
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from oauth import FixedNonce, NoncePool, OAuth1, percent_encode, percent_encode_dict
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+
+# https://developer.twitter.com/en/docs/authentication/oauth-1-0a/creating-a-signature
+CONSUMER_KEY = 'xvz1evFS4wEEPTGEFPHBog'
+CONSUMER_SECRET = 'kAcSOqF21Fu85e7zjz7ZN2U4ZRhfV3WpwPAoE3Z7kBw'
+ACCESS_TOKEN = '370773112-GmHxMAgYyLbNEtIKZeRNFsMKPR9EyMZeS9weJAEb'
+ACCESS_SECRET = 'LswwdoUaIvS8ltyTt5jkRh4J50vUPVVHtR2YPi5kE'
+NONCE = 'kYjzVBB8Y0ZFabxSWbWovY3uYSQ2pTgmZeNu2VS4cg'
+TIMESTAMP = 1318622958
+URL = 'https://api.twitter.com/1/statuses/update.json'
+QUERY_VARS = {'include_entities': 'true'}
+POST_VARS = {'status': 'Hello Ladies + Gentlemen, a signed OAuth request!'}
+SIGNATURE = 'tnnArxj06cWHq44gCs1OSKk%2FjLY%3D'
+
+
+def example_oauth():
+    return OAuth1(CONSUMER_KEY, CONSUMER_SECRET, ACCESS_TOKEN, ACCESS_SECRET, nonce_source=FixedNonce(NONCE),
+                  clock=lambda: TIMESTAMP)
+
+
+def auth_params(authorization):
+    """ The params of an Authorization header """
+    return dict(re.findall(r'(\w+)="([^"]*)"', authorization))
+
+
+class PercentEncodeTest(unittest.TestCase):
+
+    def test_reserved(self):
+        self.assertEqual(percent_encode('Ladies + Gentlemen'), 'Ladies%20%2B%20Gentlemen')
+        self.assertEqual(percent_encode('An encoded string!'), 'An%20encoded%20string%21')
+        self.assertEqual(percent_encode('Dogs, Cats & Mice'), 'Dogs%2C%20Cats%20%26%20Mice')
+        self.assertEqual(percent_encode('-._~azAZ09'), '-._~azAZ09')
+
+    def test_utf8(self):
+        self.assertEqual(percent_encode('\xe2\x98\x83'), '%E2%98%83')
+        self.assertEqual(percent_encode_dict({'q': u'\u2603', 'count': 100}), {'q': '%E2%98%83', 'count': '100'})
+
+
+class SignatureTest(unittest.TestCase):
+    """ twitter's "Creating a signature" example """
+
+    def test_init_request(self):
+        method, url, payload, headers = example_oauth().init_request('POST', URL, query_vars=QUERY_VARS,
+                                                                     post_vars=POST_VARS)
+        self.assertEqual(method, 'POST')
+        self.assertEqual(url, URL + '?include_entities=true')
+        self.assertEqual(payload, 'status=Hello%20Ladies%20%2B%20Gentlemen%2C%20a%20signed%20OAuth%20request%21')
+        self.assertEqual(auth_params(headers['Authorization']), {
+            'oauth_consumer_key': CONSUMER_KEY,
+            'oauth_nonce': NONCE,
+            'oauth_signature': SIGNATURE,
+            'oauth_signature_method': 'HMAC-SHA1',
+            'oauth_timestamp': str(TIMESTAMP),
+            'oauth_token': ACCESS_TOKEN,
+            'oauth_version': '1.0',
+        })
+
+    def test_signed_request(self):
+        signed = example_oauth().init_request('POST', URL, query_vars=QUERY_VARS, post_vars=POST_VARS)
+        self.assertEqual(len(signed), 4)
+        self.assertEqual(signed[0], 'POST')
+        self.assertEqual(tuple(signed), (signed.method, signed.url, signed.payload, signed.headers))
+
+    def test_credentials_change(self):
+        oauth = example_oauth()
+        oauth.init_request('POST', URL, query_vars=QUERY_VARS, post_vars=POST_VARS)
+        oauth(access_token='other')
+        headers = oauth.init_request('POST', URL, query_vars=QUERY_VARS, post_vars=POST_VARS)[3]
+        self.assertEqual(auth_params(headers['Authorization'])['oauth_token'], 'other')
+        self.assertNotEqual(auth_params(headers['Authorization'])['oauth_signature'], SIGNATURE)
+        oauth(access_token=ACCESS_TOKEN)
+        headers = oauth.init_request('POST', URL, query_vars=QUERY_VARS, post_vars=POST_VARS)[3]
+        self.assertEqual(auth_params(headers['Authorization'])['oauth_signature'], SIGNATURE)
+
+    def test_nonce_pool(self):
+        pool = NoncePool(block_size=64)
+        tokens = [pool.token(42) for _ in xrange(10)]
+        self.assertEqual(len(set(tokens)), 10)
+        for token in tokens:
+            self.assertRegexpMatches(token, r'^[0-9A-Za-z]{42}$')
+
+
+class PreparedTest(unittest.TestCase):
+    """ A prepared request signs exactly like init_request() """
+
+    def test_example(self):
+        prepared = example_oauth().prepare('POST', URL, query_vars=QUERY_VARS)
+        signed = prepared.sign(post_vars=POST_VARS)
+        self.assertEqual(auth_params(signed.headers['Authorization'])['oauth_signature'], SIGNATURE)
+        self.assertEqual(signed.url, URL + '?include_entities=true')
+        self.assertEqual(signed.payload,
+                         'status=Hello%20Ladies%20%2B%20Gentlemen%2C%20a%20signed%20OAuth%20request%21')
+
+    def test_fixed_vars(self):
+        prepared = example_oauth().prepare('POST', URL, query_vars=QUERY_VARS, post_vars=POST_VARS)
+        for _ in xrange(2):
+            self.assertEqual(auth_params(prepared.sign().headers['Authorization'])['oauth_signature'], SIGNATURE)
+
+    def test_replaced_var(self):
+        oauth = example_oauth()
+        prepared = oauth.prepare('GET', URL, query_vars={'q': 'bikes', 'count': 100})
+        signed = prepared.sign(query_vars={'count': 5, 'since_id': '12'})
+        expected = oauth.init_request('GET', URL, query_vars={'q': 'bikes', 'count': 5, 'since_id': '12'})
+        self.assertEqual(signed.headers, expected.headers)
+        self.assertEqual(sorted(signed.url.split('?')[1].split('&')), sorted(expected.url.split('?')[1].split('&')))
+
+
+class PreparedCallTest(unittest.TestCase):
+    """ async='prepared' calls sent over & over """
+
+    def setUp(self):
+        self.server = StubServer().start()
+        self.server.add_response('GET', '/1.1/search/tweets.json', body='{"statuses": []}')
+        self.tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport())
+        self.tweets.api_base_url = self.server.url + '/1.1/'
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_send(self):
+        call = self.tweets.search(u'caf\xe9', count=100, async='prepared')
+        self.assertEqual(call.send().status_code, 200)
+        self.assertEqual(call.send(query_vars={'since_id': '5'}).twitter, {'statuses': []})
+        first, second = self.server.requests
+        self.assertEqual(first.query, {'q': 'caf\xc3\xa9', 'count': '100'})
+        self.assertEqual(second.query, {'q': 'caf\xc3\xa9', 'count': '100', 'since_id': '5'})
+        nonces = [auth_params(request.headers['authorization'])['oauth_nonce'] for request in (first, second)]
+        self.assertNotEqual(nonces[0], nonces[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
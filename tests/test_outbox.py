@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Outbox delivery against a local StubServer... run with python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from outbox import JournalStore, Outbox, SqliteStore
+from publish import PublishJob
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+
+UPDATE = '/1.1/statuses/update.json'
+
+
+class OutboxTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.replies = []
+        self.results = []
+        self.dir = tempfile.mkdtemp()
+        self.server = StubServer().start()
+        self.server.add_response('POST', UPDATE, body=self.update)
+        self.tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport())
+        self.tweets.api_base_url = self.server.url + '/1.1/'
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def update(self, request):
+        status, body = self.replies.pop(0) if self.replies else (200, '{"id_str": "1"}')
+        return status, body, {}
+
+    def outbox(self, store=None, **kwargs):
+        store = store or SqliteStore(os.path.join(self.dir, 'outbox.db'))
+        return Outbox(self.tweets, store, backoff_base=0.01, on_result=self.results.append, **kwargs)
+
+    def sent(self):
+        return len([request for request in self.server.requests if request.path == UPDATE])
+
+
+class DeliveryTest(OutboxTestCase):
+    """ Only a request twitter can't have acted on is sent again """
+
+    def test_429_retried(self):
+        self.replies = [(429, '{"errors": [{"code": 88}]}')]
+        outbox = self.outbox().start()
+        self.assertTrue(outbox.put(PublishJob('hello')))
+        self.assertTrue(outbox.drain(5))
+        outbox.close()
+        self.assertEqual(self.sent(), 2)
+        self.assertTrue(self.results[0].ok)
+
+    def test_5xx_fails(self):
+        self.replies = [(500, '{"errors": [{"code": 131}]}')]
+        outbox = self.outbox().start()
+        outbox.put(PublishJob('hello'))
+        self.assertTrue(outbox.drain(5))
+        self.assertEqual(outbox.counts().get('failed'), 1)
+        outbox.close()
+        self.assertEqual(self.sent(), 1)
+        self.assertEqual(self.results[0].response.status_code, 500)
+
+    def test_journal(self):
+        outbox = self.outbox(JournalStore(os.path.join(self.dir, 'outbox.journal'))).start()
+        self.assertEqual(outbox.put_many([PublishJob('one'), PublishJob('two'), PublishJob('one')]),
+                         [True, True, False])
+        self.assertTrue(outbox.drain(5))
+        self.assertEqual(outbox.counts().get('delivered'), 2)
+        outbox.close()
+
+
+class MediaTest(OutboxTestCase):
+    """ Jobs are stored pickled so media data has to be a str """
+
+    def test_file_media_rejected(self):
+        outbox = self.outbox()
+        media = {'filename': 'a.png', 'mimetype': 'image/png', 'data': StringIO('png')}
+        with self.assertRaises(TypeError):
+            outbox.put(PublishJob('photo', media=media))
+        with self.assertRaises(TypeError):
+            outbox.put({'status': 'photo', 'media': {'mimetype': 'image/png', 'data': iter(['png'])}})
+        self.assertEqual(outbox.counts(), {})
+        outbox.close()
+
+    def test_str_media(self):
+        self.server.add_response('POST', '/1.1/statuses/update_with_media.json', body='{"id_str": "2"}')
+        outbox = self.outbox().start()
+        outbox.put(PublishJob('photo', media={'filename': 'a.png', 'mimetype': 'image/png', 'data': 'png'}))
+        self.assertTrue(outbox.drain(5))
+        outbox.close()
+        self.assertEqual(self.results[0].tweet_id, '2')
+
+
+class RestartTest(OutboxTestCase):
+    """ Pending jobs (and their attempts) are picked up by the next Outbox on the store """
+
+    def test_pending_delivered_after_restart(self):
+        self.replies = [(429, '{"errors": [{"code": 88}]}')]
+        path = os.path.join(self.dir, 'outbox.db')
+        outbox = Outbox(self.tweets, SqliteStore(path), backoff_base=60, max_backoff=60).start()
+        outbox.put(PublishJob('hello'))
+        self.assertFalse(outbox.drain(0.5))  # waiting out the 429's backoff
+        outbox.close()
+        self.assertEqual(self.sent(), 1)
+
+        outbox = self.outbox(SqliteStore(path), max_retries=1).start()
+        self.assertTrue(outbox.drain(5))
+        self.assertEqual(outbox.counts(), {'delivered': 1})
+        outbox.close()
+        self.assertEqual(self.sent(), 2)
+        self.assertEqual(self.results[0].attempts, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Paginated iterators (iter_search & iter_retweeters) against a local StubServer... run with
+python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+from twitterapi import TwitterError
+
+SEARCH = '/1.1/search/tweets.json'
+RETWEETERS = '/1.1/statuses/retweeters/ids.json'
+NEWEST = 1000
+
+
+class PaginationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.failing = None
+        self.server = StubServer().start()
+        self.server.add_response('GET', SEARCH, body=self.search)
+        self.server.add_response('GET', RETWEETERS, body=self.retweeters)
+        self.tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport())
+        self.tweets.api_base_url = self.server.url + '/1.1/'
+
+    def tearDown(self):
+        self.server.stop()
+
+    def search(self, request):
+        # 25 tweets with ids NEWEST down to NEWEST - 24
+        if self.failing is not None and self.failing == request.query.get('max_id'):
+            return 500, '{}', {}
+        max_id = int(request.query.get('max_id', NEWEST))
+        ids = range(max_id, max(max_id - int(request.query['count']), NEWEST - 25), -1)
+        return 200, json.dumps({'statuses': [{'id_str': str(id)} for id in ids]}), {}
+
+    def retweeters(self, request):
+        pages = {'-1': (['1', '2'], '7'), '7': (['3', '4'], '9'), '9': (['5'], '0')}
+        ids, cursor = pages[request.query.get('cursor', '-1')]
+        return 200, json.dumps({'ids': ids, 'next_cursor_str': cursor}), {}
+
+    def requests(self, path):
+        return [request.query for request in self.server.requests if request.path == path]
+
+    def test_search(self):
+        ids = [int(status['id_str']) for status in self.tweets.iter_search('bikes', count=10)]
+        self.assertEqual(ids, range(NEWEST, NEWEST - 25, -1))
+        self.assertEqual([query.get('max_id') for query in self.requests(SEARCH)],
+                         [None, str(NEWEST - 10), str(NEWEST - 20), str(NEWEST - 25)])
+
+    def test_max_items(self):
+        ids = [status['id_str'] for status in self.tweets.iter_search('bikes', count=10, max_items=15)]
+        self.assertEqual(len(ids), 15)
+        self.assertEqual(len(self.requests(SEARCH)), 2)
+
+    def test_max_pages(self):
+        ids = list(self.tweets.iter_search('bikes', count=10, max_pages=1))
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(len(self.requests(SEARCH)), 1)
+
+    def test_no_prefetch(self):
+        items = self.tweets.iter_search('bikes', count=10, prefetch=False)
+        next(items)
+        self.assertEqual(len(self.requests(SEARCH)), 1)
+        for _ in xrange(10):
+            next(items)
+        self.assertEqual(len(self.requests(SEARCH)), 2)
+
+    def test_prefetch(self):
+        items = self.tweets.iter_search('bikes', count=10)
+        next(items)
+        deadline = time.time() + 5
+        while len(self.requests(SEARCH)) < 2 and time.time() < deadline:
+            time.sleep(0.01)  # the next page is requested while the first is consumed
+        self.assertEqual(len(self.requests(SEARCH)), 2)
+        self.assertEqual(len(list(items)), 24)
+
+    def test_failed_page(self):
+        self.failing = str(NEWEST - 10)
+        items = self.tweets.iter_search('bikes', count=10)
+        self.assertEqual(len([next(items) for _ in xrange(10)]), 10)
+        with self.assertRaises(TwitterError):
+            next(items)
+
+    def test_retweeters(self):
+        self.assertEqual(list(self.tweets.iter_retweeters('12')), ['1', '2', '3', '4', '5'])
+        self.assertEqual([query.get('cursor') for query in self.requests(RETWEETERS)], [None, '7', '9'])
+        self.assertEqual(self.requests(RETWEETERS)[0]['stringify_ids'], 'true')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Poller merged queries & since_id marks against a local StubServer... run with python -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from poller import JsonFileStore, Poller
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+
+SEARCH = '/1.1/search/tweets.json'
+NOW = 1400000000
+
+
+class PollerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.statuses = []
+        self.delivered = []
+        self.now = NOW
+        self.dir = tempfile.mkdtemp()
+        self.server = StubServer().start()
+        self.server.add_response('GET', SEARCH, body=self.search)
+        self.tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport())
+        self.tweets.api_base_url = self.server.url + '/1.1/'
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def tweet(self, id, text):
+        self.statuses.append({'id_str': str(id), 'text': text})
+
+    def search(self, request):
+        # Newest first, like twitter... a status matches if its text has any of the ORed terms
+        terms = request.query['q'].lower().split(' or ')
+        since_id = int(request.query.get('since_id', 0))
+        max_id = int(request.query.get('max_id', 1 << 62))
+        matches = sorted([status for status in self.statuses if since_id < int(status['id_str']) <= max_id and
+                          any(term in status['text'].lower() for term in terms)],
+                         key=lambda status: -int(status['id_str']))
+        count = int(request.query['count'])
+        metadata = {'next_results': '?max_id=...'} if len(matches) > count else {}
+        return 200, json.dumps({'statuses': matches[:count], 'search_metadata': metadata}), {}
+
+    def searches(self):
+        return [request.query for request in self.server.requests if request.path == SEARCH]
+
+    def on_tweets(self, term, statuses):
+        self.delivered.append((term, [int(status['id_str']) for status in statuses]))
+
+    def poller(self, **kwargs):
+        return Poller(self.tweets, clock=lambda: self.now, **kwargs)
+
+    def test_queries(self):
+        poller = self.poller()
+        for term in ('bikes', '#fixie', 'road bike'):
+            poller.subscribe(term, self.on_tweets)
+        poller.subscribe('bikes', self.on_tweets, lang='en')
+        self.assertEqual(sorted(poller.queries()),
+                         [(u'#fixie OR bikes', {}), (u'bikes', {'lang': 'en'}), (u'road bike', {})])
+        poller.unsubscribe('#fixie', self.on_tweets)
+        self.assertIn((u'bikes', {}), poller.queries())
+
+    def test_poll(self):
+        self.tweet(1, 'i like bikes')
+        self.tweet(2, 'a new #fixie')
+        self.tweet(3, 'bikes & a #fixie')
+        poller = self.poller()
+        poller.subscribe('bikes', self.on_tweets)
+        poller.subscribe('#fixie', self.on_tweets)
+        self.assertEqual(poller.poll(), 1)
+        self.assertEqual(sorted(self.delivered), [('#fixie', [2, 3]), ('bikes', [1, 3])])
+        self.assertNotIn('since_id', self.searches()[0])
+
+        self.delivered[:] = []
+        self.tweet(4, 'more bikes')
+        self.assertEqual(poller.due(), [])  # just polled
+        self.assertEqual(poller.poll(), 0)
+        self.assertEqual(poller.poll(force=True), 1)
+        self.assertEqual(self.delivered, [('bikes', [4])])
+        self.assertEqual(self.searches()[-1]['since_id'], '3')
+
+        self.now += poller.max_interval
+        self.assertEqual(len(poller.due()), 1)
+
+    def test_pages(self):
+        for id in xrange(1, 6):
+            self.tweet(id, 'bikes')
+        poller = self.poller(count=2)
+        poller.subscribe('bikes', self.on_tweets)
+        self.assertEqual(poller.poll(), 3)
+        self.assertEqual(self.delivered, [('bikes', [1, 2, 3, 4, 5])])  # oldest first
+        self.assertEqual([query.get('max_id') for query in self.searches()], [None, '3', '1'])
+        self.assertEqual(poller.skipped, 0)
+
+    def test_max_pages(self):
+        for id in xrange(1, 6):
+            self.tweet(id, 'bikes')
+        poller = self.poller(count=2, max_pages=2)
+        poller.subscribe('bikes', self.on_tweets)
+        self.assertEqual(poller.poll(), 2)
+        self.assertEqual(self.delivered, [('bikes', [2, 3, 4, 5])])  # the oldest is skipped
+        self.assertEqual(poller.skipped, 1)
+
+    def test_store(self):
+        self.tweet(7, 'bikes')
+        store = JsonFileStore(os.path.join(self.dir, 'poller.json'))
+        poller = self.poller(store=store)
+        poller.subscribe('bikes', self.on_tweets)
+        poller.poll()
+        poller = self.poller(store=JsonFileStore(os.path.join(self.dir, 'poller.json')))
+        poller.subscribe('bikes', self.on_tweets)
+        self.assertEqual(poller.due(), [])  # the last poll's time was kept too
+        poller.poll(force=True)
+        self.assertEqual(self.searches()[-1]['since_id'], '7')
+        self.assertEqual(self.delivered, [('bikes', [7])])
+
+    def test_failed_subscriber(self):
+        self.tweet(1, 'bikes')
+        self.tweet(2, 'road bike')
+
+        def fail(term, statuses):
+            raise ValueError(term)
+
+        poller = self.poller()
+        poller.subscribe('bikes', fail)
+        poller.subscribe('road bike', self.on_tweets)
+        with self.assertRaises(ValueError):
+            poller.poll()
+        self.assertEqual(self.delivered, [('road bike', [2])])  # the other query was still polled
+        self.assertEqual(poller.errors, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
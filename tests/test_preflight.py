@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+Preflight checks & twitter's weighted tweet length... run with python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from preflight import Preflight, PreflightError, weighted_length
+from publish import PublishJob
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+
+PNG = '\x89PNG\r\n\x1a\n' + '\0' * 100
+
+
+class WeightedLengthTest(unittest.TestCase):
+
+    def test_ascii(self):
+        self.assertEqual(weighted_length('a' * 280), 280)
+        self.assertEqual(weighted_length(u'\u201chi\u201d'), 4)  # curly quotes are light
+
+    def test_heavy(self):
+        self.assertEqual(weighted_length(u'\u3053' * 10), 20)
+        self.assertEqual(weighted_length(u'\u3053\u3093\u306b\u3061\u306f'.encode('utf-8')), 10)
+
+    def test_nfc(self):
+        self.assertEqual(weighted_length(u'cafe\u0301'), 4)
+        self.assertEqual(weighted_length('caf\xc3\xa9'), 4)
+
+    def test_emoji(self):
+        self.assertEqual(weighted_length(u'\U0001f44d'), 2)
+        self.assertEqual(weighted_length(u'\U0001f44d\U0001f3fd hi'), 5)  # a skin tone
+        self.assertEqual(weighted_length(u'\U0001f468\u200d\U0001f469\u200d\U0001f467'), 2)  # a ZWJ family
+        self.assertEqual(weighted_length(u'\U0001f1fa\U0001f1f8'), 2)  # a flag
+        self.assertEqual(weighted_length(u'\u2764\ufe0f'), 2)
+        self.assertEqual(weighted_length(u'1\ufe0f\u20e3'), 2)  # a keycap
+
+    def test_urls(self):
+        self.assertEqual(weighted_length('see http://example.com/a?b=1. ok'), 23 + len('see . ok'))
+        self.assertEqual(weighted_length('example.com'), 23)
+        self.assertEqual(weighted_length('mail a@example.com'), 18)  # an email address isn't linked
+        self.assertEqual(weighted_length(u'http://example.com/\u3053\u3093'), 27)
+        self.assertEqual(weighted_length('http://example.com', url_length=10), 10)
+
+
+class PreflightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.preflight = Preflight()
+
+    def test_ok(self):
+        self.assertEqual(self.preflight.problems({'status': u'\u3053' * 140, 'in_reply_to_status_id': '12'}), [])
+        self.preflight.check({'status': 'hi', 'lat': '28.669997', 'long': '-81.208120'})
+
+    def test_problems(self):
+        self.assertEqual(len(self.preflight.problems({'status': u'\u3053' * 141})), 1)
+        self.assertEqual(len(self.preflight.problems({'status': '  '})), 1)
+        self.assertEqual(len(self.preflight.problems({'status': '\xff'})), 1)  # not utf-8
+        self.assertEqual(len(self.preflight.problems({'status': 'hi', 'in_reply_to_status_id': 'abc'})), 1)
+        self.assertEqual(len(self.preflight.problems({'status': 'hi', 'lat': '91'})), 1)
+        self.assertEqual(len(self.preflight.problems({'status': 'hi', 'media_ids': '1,2,3,4,5'})), 1)
+        with self.assertRaises(PreflightError) as failed:
+            self.preflight.check({'status': '', 'long': 'west'})
+        self.assertEqual(len(failed.exception.problems), 2)
+
+    def test_media(self):
+        media = {'data': PNG, 'mimetype': 'image/png'}
+        self.assertEqual(self.preflight.problems({'status': '', 'media[]': media}), [])
+        self.assertEqual(len(self.preflight.problems({'status': '', 'media[]': dict(media, mimetype='image/jpeg')})),
+                         1)  # the bytes say png
+        self.assertEqual(len(self.preflight.problems({'status': '', 'media[]': dict(media, data='')})), 1)
+        self.assertEqual(len(Preflight(photo_size_limit=10).problems({'status': '', 'media[]': media})), 1)
+
+    def test_check_jobs(self):
+        jobs = [PublishJob('ok'), {'status': u'\u3053' * 141}, PublishJob(''), {'status': 'ok too'}]
+        passed, rejected = self.preflight.check_jobs(jobs)
+        self.assertEqual(passed, [jobs[0], jobs[3]])
+        self.assertEqual([job for job, _ in rejected], [jobs[1], jobs[2]])
+
+
+class TweetsTest(unittest.TestCase):
+    """ A Tweets with a preflight doesn't send what twitter would reject """
+
+    def setUp(self):
+        self.server = StubServer().start()
+        self.server.add_response('POST', '/1.1/statuses/update.json', body='{"id_str": "1"}')
+        self.tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport(),
+                             preflight=Preflight())
+        self.tweets.api_base_url = self.server.url + '/1.1/'
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_rejected(self):
+        with self.assertRaises(PreflightError):
+            self.tweets.update('a' * 281)
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(self.tweets.update('a' * 280).twitter['id_str'], '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
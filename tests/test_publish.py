@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+BulkPublisher retries against a local StubServer... run with python -m unittest discover tests
+"""
+
+import os
+import socket
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from publish import BulkPublisher, PublishJob
+from stubserver import StubServer
+from transports import PooledHttpTransport
+from tweets import Tweets
+
+UPDATE = '/1.1/statuses/update.json'
+
+
+class RetryTest(unittest.TestCase):
+    """ Only a request twitter can't have acted on is sent again """
+
+    def setUp(self):
+        self.replies = []
+        self.server = StubServer().start()
+        self.server.add_response('POST', UPDATE, body=self.update)
+        self.tweets = self.make_tweets(self.server.url)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def make_tweets(self, url):
+        tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport(timeout=0.3))
+        tweets.api_base_url = url + '/1.1/'
+        return tweets
+
+    def update(self, request):
+        reply = self.replies.pop(0) if self.replies else (200, '{"id_str": "1"}')
+        if reply == 'hang':
+            time.sleep(0.6)  # past the transport's timeout
+            reply = (200, '{"id_str": "1"}')
+        return reply[0], reply[1], {}
+
+    def publish(self, tweets=None):
+        publisher = BulkPublisher(tweets or self.tweets, max_retries=2, backoff_base=0.01)
+        return publisher.publish([PublishJob('hello')])[0]
+
+    def sent(self):
+        return len([request for request in self.server.requests if request.path == UPDATE])
+
+    def test_429_retried(self):
+        self.replies = [(429, '{"errors": [{"code": 88}]}')]
+        result = self.publish()
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual(self.sent(), 2)
+
+    def test_5xx_not_retried(self):
+        self.replies = [(503, '{"errors": [{"code": 130}]}')]
+        result = self.publish()
+        self.assertFalse(result.ok)
+        self.assertEqual(result.response.status_code, 503)
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(self.sent(), 1)
+
+    def test_read_timeout_not_retried(self):
+        self.replies = ['hang']
+        result = self.publish()
+        self.assertFalse(result.ok)
+        self.assertIsInstance(result.error, socket.timeout)
+        self.assertEqual(result.attempts, 1)
+
+    def test_refused_retried(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()  # nothing listens there
+        result = self.publish(self.make_tweets('http://127.0.0.1:{:d}'.format(port)))
+        self.assertFalse(result.ok)
+        self.assertIsInstance(result.error, socket.error)
+        self.assertEqual(result.attempts, 3)
+
+    def test_duplicate_is_published(self):
+        self.replies = [(403, '{"errors": [{"code": 187, "message": "Status is a duplicate."}]}')]
+        result = self.publish()
+        self.assertTrue(result.ok)
+        self.assertTrue(result.duplicate)
+        self.assertIsNone(result.tweet_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+RateLimiter budgets & retries (against a local StubServer)... run with python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from ratelimit import RateLimiter, endpoint_resource
+from stubserver import StubServer
+from transports import HttpResponse, PooledHttpTransport, ResponseHeaders
+from tweets import Tweets
+
+NOW = 1400000000
+
+
+def response(status_code, limit=None, remaining=None, reset=None):
+    headers = ResponseHeaders()
+    if limit is not None:
+        headers.update({'x-rate-limit-limit': str(limit), 'x-rate-limit-remaining': str(remaining),
+                        'x-rate-limit-reset': str(reset)})
+    return HttpResponse(status_code, '{}', headers)
+
+
+class Clock(object):
+    """ A clock that only moves when something sleeps """
+    def __init__(self):
+        self.now = NOW
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class BudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.limiter = RateLimiter(clock=self.clock, sleep=self.clock.sleep)
+
+    def test_endpoint_resource(self):
+        self.assertEqual(endpoint_resource('https://api.twitter.com/1.1/statuses/show.json?id=1'), 'statuses/show')
+        self.assertEqual(endpoint_resource('https://api.twitter.com/1.1/statuses/retweets/123.json'),
+                         'statuses/retweets/:id')
+        self.assertEqual(endpoint_resource('https://api.twitter.com/1.1/search/tweets.json'), 'search/tweets')
+
+    def test_unknown_resource(self):
+        self.assertEqual(self.limiter.delay('search/tweets'), 0)
+        self.assertIsNone(self.limiter.budget('search/tweets'))
+
+    def test_exhausted(self):
+        self.limiter.update('search/tweets', response(200, 180, 2, NOW + 100))
+        self.assertEqual(self.limiter.delay('search/tweets'), 0)
+        self.assertEqual(self.limiter.delay('search/tweets'), 0)
+        self.assertEqual(self.limiter.budget('search/tweets'), {'limit': 180, 'remaining': 0, 'reset': NOW + 100})
+        self.assertEqual(self.limiter.delay('search/tweets'), 101)
+        self.limiter.wait('search/tweets')
+        self.assertEqual(self.clock.slept, [101])
+        self.assertEqual(self.limiter.budget('search/tweets')['remaining'], 179)  # a new window
+
+    def test_429_without_headers(self):
+        self.limiter.update('search/tweets', response(200, 180, 5, NOW + 100))
+        self.limiter.update('search/tweets', response(429))
+        self.assertEqual(self.limiter.budget('search/tweets')['remaining'], 0)
+        self.assertEqual(self.limiter.budget('search/tweets')['reset'], NOW + 15 * 60)
+
+    def test_should_retry(self):
+        self.assertTrue(self.limiter.should_retry(response(429), 0, 'POST'))
+        self.assertTrue(self.limiter.should_retry(response(503), 0, 'GET'))
+        self.assertFalse(self.limiter.should_retry(response(503), 0, 'POST'))  # it may have been posted
+        self.assertFalse(self.limiter.should_retry(response(404), 0, 'GET'))
+        self.assertFalse(self.limiter.should_retry(response(429), self.limiter.max_retries))
+
+    def test_429_backoff_waits_for_the_reset(self):
+        self.limiter.update('search/tweets', response(429, 180, 0, NOW + 30))
+        self.assertEqual(self.limiter.backoff('search/tweets', response(429), 0), 31)
+        backoff = self.limiter.backoff('search/tweets', response(500), 2)
+        self.assertTrue(2 <= backoff <= 4)
+
+
+class RetryTest(unittest.TestCase):
+    """ Requests through a Tweets with a rate_limiter """
+
+    def setUp(self):
+        self.replies = []
+        self.clock = Clock()
+        self.server = StubServer().start()
+        self.server.add_response('GET', '/1.1/statuses/show.json', body=self.reply)
+        self.server.add_response('POST', '/1.1/statuses/update.json', body=self.reply)
+        self.tweets = Tweets('key', 'secret', 'token', 'token_secret', transport=PooledHttpTransport(),
+                             rate_limiter=RateLimiter(clock=self.clock, sleep=self.clock.sleep))
+        self.tweets.api_base_url = self.server.url + '/1.1/'
+
+    def tearDown(self):
+        self.server.stop()
+
+    def reply(self, request):
+        status, headers = self.replies.pop(0) if self.replies else (200, {})
+        return status, '{"id_str": "1"}', headers
+
+    def test_429_retried_after_the_reset(self):
+        for async in (None, 'rpc'):
+            self.server.requests[:] = []
+            self.clock.slept[:] = []
+            self.replies = [(429, {'x-rate-limit-limit': '900', 'x-rate-limit-remaining': '0',
+                                   'x-rate-limit-reset': str(self.clock.now + 60)})]
+            result = self.tweets.show('1', async=async)
+            if async is not None:
+                result = result.get_result()
+            self.assertEqual(result.status_code, 200)
+            self.assertEqual(len(self.server.requests), 2)
+            self.assertEqual(self.clock.slept, [61])
+
+    def test_post_5xx_not_retried(self):
+        self.replies = [(503, {})]
+        self.assertEqual(self.tweets.update('hello').status_code, 503)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_get_5xx_retried(self):
+        self.replies = [(503, {}), (502, {})]
+        self.assertEqual(self.tweets.show('1').status_code, 200)
+        self.assertEqual(len(self.server.requests), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
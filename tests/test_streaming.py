@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+The delimited=length parser & TwitterStream against a local StubServer... run with
+python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from oauth import OAuth1
+from streaming import DelimitedParser, StreamError, TwitterStream
+from stubserver import StubServer
+
+FILTER = '/1.1/statuses/filter.json'
+
+
+def delimited(message):
+    return '{:d}\r\n{:}'.format(len(message), message)
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_messages(self):
+        parser = DelimitedParser()
+        self.assertEqual(parser.feed(delimited('{"a": 1}\r\n') + delimited('{"b": 2}\r\n')),
+                         ['{"a": 1}\r\n', '{"b": 2}\r\n'])
+        self.assertEqual(parser.feed(''), [])
+
+    def test_split(self):
+        data = delimited('{"text": "hello"}\r\n') * 3
+        parser = DelimitedParser()
+        messages = []
+        for n in xrange(len(data)):  # a byte at a time
+            messages.extend(parser.feed(data[n]))
+        self.assertEqual(messages, ['{"text": "hello"}\r\n'] * 3)
+
+    def test_keep_alives(self):
+        parser = DelimitedParser()
+        self.assertEqual(parser.feed('\r\n\r\n' + delimited('{}') + '\r\n'), ['{}'])
+        self.assertEqual(parser.keep_alives, 3)
+
+    def test_grows(self):
+        parser = DelimitedParser(capacity=16)
+        message = '{"text": "' + 'x' * 100 + '"}'
+        self.assertEqual(parser.feed(delimited(message)[:50]), [])
+        self.assertEqual(parser.feed(delimited(message)[50:] + delimited('{}')), [message, '{}'])
+
+    def test_reset(self):
+        parser = DelimitedParser()
+        self.assertEqual(parser.feed(delimited('{"a": 1}')[:5]), [])
+        parser.reset()
+        self.assertEqual(parser.feed(delimited('{}')), ['{}'])
+
+    def test_bad_length(self):
+        with self.assertRaises(StreamError):
+            DelimitedParser().feed('abc\r\n{}')
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer().start()
+        self.oauth = OAuth1('key', 'secret', 'token', 'token_secret')
+
+    def tearDown(self):
+        self.server.stop()
+
+    def stream(self, **kwargs):
+        # Stops instead of reconnecting once the stub's stream ends
+        stream = TwitterStream(self.oauth, self.server.url + FILTER, params={'track': 'bikes'},
+                               sleep=lambda delay: stream.stop(), **kwargs)
+        return stream
+
+    def test_messages(self):
+        self.server.add_stream('POST', FILTER, [{'id_str': str(id)} for id in xrange(5)], keep_alive_every=2)
+        stream = self.stream().start()
+        self.assertEqual([message['id_str'] for message in stream], ['0', '1', '2', '3', '4'])
+        self.assertEqual(stream.keep_alives, 2)
+        self.assertEqual(stream.connects, 1)
+        request = self.server.requests[0]
+        self.assertEqual(sorted(request.body.split('&')), ['delimited=length', 'track=bikes'])
+        self.assertIn('oauth_signature=', request.headers['authorization'])
+
+    def test_raw(self):
+        self.server.add_stream('POST', FILTER, ['{"id_str": "1"}', 'not json'])
+        stream = self.stream(decode=False).start()
+        self.assertEqual(list(stream), ['{"id_str": "1"}\r\n', 'not json\r\n'])
+
+    def test_fatal(self):
+        self.server.add_response('POST', FILTER, status=401, body='Unauthorized')
+        stream = self.stream().start()
+        with self.assertRaises(StreamError) as failed:
+            stream.get(5)
+        self.assertEqual(failed.exception.status_code, 401)
+        self.assertEqual(stream.connects, 1)
+
+    def test_backpressure(self):
+        self.server.add_stream('POST', FILTER, [{'id_str': str(id)} for id in xrange(20)])
+        stream = self.stream(queue_size=2).start()
+        self.assertEqual(len(list(stream)), 20)  # nothing is dropped while the queue's full
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2014 Clay Street Online LLC
+http://www.claystreet.com
+
+MIT License
+http://opensource.org/licenses/MIT
+
+PooledHttpTransport's connection handling (with fake connections)... run with python -m unittest discover tests
+"""
+
+import httplib
+import os
+import socket
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+
+from transports import PooledHttpTransport, not_sent
+
+URL = 'http://api.example.com/1.1/statuses/show.json?id=1'
+KEY = ('http', 'api.example.com', 80)
+
+
+class FakeResponse(object):
+    status = 200
+    will_close = False
+
+    def read(self):
+        return '{}'
+
+    def getheaders(self):
+        return []
+
+
+class FakeConnection(object):
+    """ Fails its write or its response with the exception given """
+    def __init__(self, write_error=None, response_error=None):
+        self.write_error = write_error
+        self.response_error = response_error
+        self.sock, self._peer = socket.socketpair()  # an idle socket (the server hasn't dropped it)
+        self.closed = False
+
+    def request(self, method, path, payload, headers):
+        if self.write_error is not None:
+            raise self.write_error
+
+    def getresponse(self):
+        if self.response_error is not None:
+            raise self.response_error
+        return FakeResponse()
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+        self._peer.close()
+
+
+class ConnectionTest(unittest.TestCase):
+    """ A connection that fails is closed... including the new one a retry opens """
+
+    def setUp(self):
+        self.transport = PooledHttpTransport()
+        self.new = []  # the connections _connect() hands out, in order
+        self.transport._connect = lambda key: self.new.pop(0)
+
+    def idle(self, conn):
+        self.transport._pool(KEY)[0].put(conn)
+        return conn
+
+    def test_reused(self):
+        conn = self.idle(FakeConnection())
+        self.assertEqual(self.transport.send_request('GET', URL).status_code, 200)
+        self.assertFalse(conn.closed)
+        self.assertIs(self.transport._pool(KEY)[0].get_nowait(), conn)
+
+    def test_write_retry_fails(self):
+        reused = self.idle(FakeConnection(write_error=socket.error('reset')))
+        retry = FakeConnection(write_error=socket.error('refused'))
+        self.new.append(retry)
+        with self.assertRaises(socket.error) as failed:
+            self.transport.send_request('POST', URL, 'status=hi')
+        self.assertTrue(not_sent(failed.exception))
+        self.assertTrue(reused.closed)
+        self.assertTrue(retry.closed)
+
+    def test_response_retry_fails(self):
+        reused = self.idle(FakeConnection(response_error=httplib.BadStatusLine('')))
+        retry = FakeConnection(response_error=socket.timeout('timed out'))
+        self.new.append(retry)
+        with self.assertRaises(socket.timeout):
+            self.transport.send_request('GET', URL)
+        self.assertTrue(reused.closed)
+        self.assertTrue(retry.closed)
+
+    def test_response_retried(self):
+        self.idle(FakeConnection(response_error=httplib.BadStatusLine('')))
+        retry = FakeConnection()
+        self.new.append(retry)
+        self.assertEqual(self.transport.send_request('GET', URL).status_code, 200)
+        self.assertFalse(retry.closed)
+
+    def test_other_errors(self):
+        conn = FakeConnection(write_error=ValueError('bad header'))
+        self.new.append(conn)
+        with self.assertRaises(ValueError):
+            self.transport.send_request('GET', URL)
+        self.assertTrue(conn.closed)
+        conn = FakeConnection(response_error=httplib.LineTooLong('header line'))
+        self.new.append(conn)
+        with self.assertRaises(httplib.HTTPException):
+            self.transport.send_request('GET', URL)
+        self.assertTrue(conn.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()